@@ -48,12 +48,12 @@ async def get_quiz(quiz_id: int, request: Request):
     
             users_data = users_info_response.json()
 
+            # Puntos por estudiante para unir en O(n + m) en lugar de recorrer los resultados por cada usuario
+            points_by_student = {result["id_student"]: result["points_obtained"] for result in quiz_results_data}
             combined_results = []
             for user in users_data:
-                for quiz_result_item in quiz_results_data:
-                    if user["id"] == quiz_result_item["id_student"]:
-                        user["points_obtained"] = quiz_result_item["points_obtained"]
-                        break
+                if user["id"] in points_by_student:
+                    user["points_obtained"] = points_by_student[user["id"]]
                 combined_results.append(user)
             return combined_results
         except httpx.HTTPStatusError as e:
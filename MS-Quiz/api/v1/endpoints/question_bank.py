@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import logging
+
+from db.database import get_db
+from schemas.question_bank import QuestionBankPageOutput, QuestionSimilarOutput
+from core.quiz.question_bank_service import QuestionBankService
+from config.settings import get_settings
+
+settings = get_settings()
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+@router.get(
+    "/search",
+    response_model=QuestionBankPageOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Buscar preguntas existentes en el banco de preguntas",
+    description="Búsqueda de texto completo sobre el enunciado y la respuesta correcta, con filtros por aula y competencias, ordenada por relevancia y paginada por cursor."
+)
+async def search_question_bank_endpoint(
+    q: Optional[str] = Query(None, max_length=500, description="Texto a buscar (admite \"frase exacta\", -excluir y or)."),
+    classroom_id: Optional[int] = Query(None, description="Solo preguntas de quizzes de esta aula."),
+    competences_id: Optional[List[int]] = Query(None, description="Solo preguntas con al menos una de estas competencias."),
+    limit: int = Query(settings.QUESTION_BANK_PAGE_SIZE, ge=1, le=settings.QUESTION_BANK_MAX_PAGE_SIZE, description="Tamaño de la página."),
+    cursor: Optional[str] = Query(None, description="'next_cursor' de la página anterior."),
+    db: AsyncSession = Depends(get_db)
+) -> QuestionBankPageOutput:
+    try:
+        return await QuestionBankService.search(db, q, classroom_id, competences_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error interno del servidor al buscar en el banco de preguntas: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al buscar en el banco de preguntas."
+        )
+
+
+@router.get(
+    "/similar",
+    response_model=QuestionSimilarOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Buscar preguntas casi idénticas a un enunciado",
+    description="Preguntas existentes cuyo enunciado es casi idéntico al texto enviado o al de una pregunta existente, según un índice MinHash/LSH que no compara contra todo el banco."
+)
+async def similar_questions_endpoint(
+    text: Optional[str] = Query(None, max_length=2000, description="Enunciado a comparar."),
+    question_id: Optional[int] = Query(None, description="Comparar con el enunciado de esta pregunta (se excluye del resultado)."),
+    threshold: float = Query(settings.NEAR_DUPLICATE_THRESHOLD, ge=0.5, le=1.0, description="Similitud mínima (Jaccard estimada sobre n-gramas de caracteres)."),
+    limit: int = Query(10, ge=1, le=settings.QUESTION_BANK_MAX_PAGE_SIZE, description="Máximo de preguntas a retornar."),
+    db: AsyncSession = Depends(get_db)
+) -> QuestionSimilarOutput:
+    try:
+        similar = await QuestionBankService.similar(db, text, question_id, threshold, limit)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error interno del servidor al buscar preguntas similares: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al buscar preguntas similares."
+        )
+    if similar is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Pregunta con ID {question_id} no encontrada."
+        )
+    return similar
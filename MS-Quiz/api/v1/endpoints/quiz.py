@@ -1,12 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Body, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 import datetime
 
 from db.database import get_db
 from schemas.quiz import *  # Usaremos un schema nuevo para la entrada
 from core.quiz.quiz_service import QuizService
 from core.quiz.quiz_generator import QuizGenerator
+from core.quiz.regrade import RegradeService
+from core.quiz.results_export import ResultsExporter, EXPORT_MEDIA_TYPES
+from core.quiz.bulk_import import QuizImporter
+from core.quiz.submission_intake import SubmissionIntakeService
+from core.quiz.general_feedback import GeneralFeedbackService
+from core.quiz.answer_distribution import AnswerDistributionService
+from core.quiz.item_analysis import ItemAnalysisService, SCOPE_QUIZ, SCOPE_CLASSROOM
+from core.quiz.leaderboard import LeaderboardService
 import json
 import logging
 from config.settings import get_settings
@@ -14,8 +23,24 @@ from config.settings import get_settings
 
 router = APIRouter()
 
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+async def _encode_generation_events(events: AsyncIterator[Dict[str, Any]], stream_format: str) -> AsyncIterator[str]:
+    """Serializa los eventos de generación como NDJSON o Server-Sent Events"""
+    async for event in events:
+        payload = json.dumps(event, ensure_ascii=False, default=str)
+        if stream_format == "sse":
+            yield f"event: {event['event']}\ndata: {payload}\n\n"
+        else:
+            yield payload + "\n"
+
 
 @router.post("/create", response_model=QuizCreateOutput, status_code=status.HTTP_201_CREATED)
 async def create_quiz_with_questions(
@@ -29,6 +54,8 @@ async def create_quiz_with_questions(
         # El servicio maneja toda la lógica de creación y validación
         created_quiz_output = await QuizService.create_full_quiz(db, quiz_data)
         await db.commit()
+        QuizService.index_created_quiz(created_quiz_output, quiz_data)
+        QuizService.invalidate_quiz_cache(classroom_id=quiz_data.classroom_id)
         return created_quiz_output
     except ValueError as e:
         await db.rollback()
@@ -38,6 +65,30 @@ async def create_quiz_with_questions(
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
 
+@router.post(
+    "/import",
+    response_model=QuizImportOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Importación masiva de quizzes",
+    description="Carga quizzes desde un archivo NDJSON (un quiz por línea, con el formato de /create y un 'key' opcional) o CSV (una pregunta por fila). Los quizzes válidos se crean por lotes y los inválidos se reportan con su línea."
+)
+async def import_quizzes_endpoint(
+    file: UploadFile = File(..., description="Archivo .ndjson/.jsonl o .csv."),
+    format: Optional[str] = Form(None, description="ndjson o csv; si no se envía se deduce de la extensión."),
+    db: AsyncSession = Depends(get_db)
+) -> QuizImportOutput:
+    import_format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    try:
+        return await QuizImporter.import_file(db, file.file, import_format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error interno del servidor en la importación masiva de quizzes: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al importar los quizzes."
+        )
+
 @router.post("/submit_answers", response_model=QuizSubmissionOutput, status_code=status.HTTP_201_CREATED)
 async def submit_quiz_answers(
     submission_data: QuizSubmissionInput,
@@ -54,14 +105,58 @@ async def submit_quiz_answers(
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
-@router.post("/generate-from-pdf", response_model=QuizGenerationOutput, status_code=status.HTTP_200_OK)
+@router.post("/submissions", response_model=SubmissionAcceptedOutput, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_quiz_submission(
+    submission_data: QuizSubmissionInput,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Recibe las respuestas de un estudiante y las deja en la cola de calificación.
+    Responde 202 con el ID de la entrega apenas queda guardada; el resultado se
+    consulta en GET /submissions/{submission_id}. /submit_answers sigue
+    calificando en la misma petición.
+    """
+    try:
+        intake = await SubmissionIntakeService.enqueue(db, submission_data)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error al encolar la entrega del quiz {submission_data.quiz_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+    if intake is None:
+        raise HTTPException(status_code=404, detail=f"Quiz con ID {submission_data.quiz_id} no encontrado.")
+    return SubmissionAcceptedOutput(
+        submission_id=intake.id,
+        status=intake.status,
+        status_url=f"/api/v1/quiz/submissions/{intake.id}",
+    )
+
+@router.get("/submissions/{submission_id}", response_model=SubmissionStatusOutput, status_code=status.HTTP_200_OK)
+async def get_quiz_submission_status(
+    submission_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Estado de una entrega asíncrona y, si ya se calificó, su resultado"""
+    try:
+        submission = await SubmissionIntakeService.get_status(db, submission_id)
+    except Exception as e:
+        logger.error(f"Error al consultar la entrega {submission_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+    if submission is None:
+        raise HTTPException(status_code=404, detail=f"Entrega con ID {submission_id} no encontrada.")
+    return submission
+
+@router.post("/generate-from-pdf", response_model=QuizVariantsGenerationOutput, status_code=status.HTTP_200_OK)
 async def generate_quiz_from_pdf_endpoint(
     pdf_file: UploadFile = File(..., description="Archivo PDF para generar el quiz."),
-    input_data_json: str = File(..., description="JSON con los parámetros de generación del quiz (classroom_id, num_question, competences, type_question).")
+    input_data_json: str = File(..., description="JSON con los parámetros de generación del quiz (classroom_id, num_question, competences, type_question)."),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera un quiz en formato JSON a partir de un archivo PDF y parámetros de configuración,
     utilizando la API de Google Gemini. No almacena datos en la base de datos.
+    Con "variants" > 1 se generan varias versiones del quiz con los mismos puntos
+    y competencias por posición (en 'variants'; 'questions' es la primera).
+    Con "bank_first": true se reutilizan preguntas del banco y solo se generan las que faltan.
     """
     try:
         input_data = json.loads(input_data_json)
@@ -74,7 +169,8 @@ async def generate_quiz_from_pdf_endpoint(
         # El servicio maneja toda la lógica de procesamiento y validación
         result = await QuizGenerator.create_quiz_from_pdf(
             pdf_content=pdf_content,
-            input_data=input_data
+            input_data=input_data,
+            db=db
         )
         return result
     except json.JSONDecodeError:
@@ -84,13 +180,17 @@ async def generate_quiz_from_pdf_endpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
     
-@router.post("/generate-from-text", response_model=QuizGenerationOutput, status_code=status.HTTP_200_OK)
+@router.post("/generate-from-text", response_model=QuizVariantsGenerationOutput, status_code=status.HTTP_200_OK)
 async def generate_quiz_from_text_endpoint(
-    input_data_json: str = File(..., description="JSON con los parámetros de generación del quiz (classroom_id, num_question, competences, type_question).")
+    input_data_json: str = File(..., description="JSON con los parámetros de generación del quiz (classroom_id, num_question, competences, type_question)."),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera un quiz en formato JSON a partir de un archivo PDF y parámetros de configuración,
     utilizando la API de Google Gemini. No almacena datos en la base de datos.
+    Con "variants" > 1 se generan varias versiones del quiz con los mismos puntos
+    y competencias por posición (en 'variants'; 'questions' es la primera).
+    Con "bank_first": true se reutilizan preguntas del banco y solo se generan las que faltan.
     """
     try:
         input_data = json.loads(input_data_json)
@@ -98,7 +198,8 @@ async def generate_quiz_from_text_endpoint(
 
         # El servicio maneja toda la lógica de procesamiento y validación
         result = await QuizGenerator.create_quiz_from_text(
-            input_data=input_data
+            input_data=input_data,
+            db=db
         )
         return result
     except json.JSONDecodeError:
@@ -109,6 +210,59 @@ async def generate_quiz_from_text_endpoint(
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
 
+@router.post("/generate-from-pdf/stream", status_code=status.HTTP_200_OK)
+async def stream_quiz_from_pdf_endpoint(
+    pdf_file: UploadFile = File(..., description="Archivo PDF para generar el quiz."),
+    input_data_json: str = File(..., description="JSON con los parámetros de generación del quiz (classroom_id, num_question, competences, type_question)."),
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$", description="Formato del stream: 'ndjson' o 'sse'.")
+):
+    """
+    Igual que /generate-from-pdf, pero emite cada pregunta apenas Gemini la completa.
+    Eventos: 'question' por pregunta válida, 'discarded' por pregunta inválida y un
+    evento final 'quiz' con el quiz post-procesado (o 'error').
+    """
+    try:
+        input_data = json.loads(input_data_json)
+        if pdf_file.content_type != "application/pdf":
+            raise ValueError("El archivo debe ser un PDF.")
+
+        pdf_content = await pdf_file.read()
+        events = await QuizGenerator.stream_quiz_from_pdf(pdf_content=pdf_content, input_data=input_data)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="El 'input_data_json' no es un JSON válido.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+    return StreamingResponse(
+        _encode_generation_events(events, stream_format),
+        media_type=STREAM_MEDIA_TYPES[stream_format]
+    )
+
+@router.post("/generate-from-text/stream", status_code=status.HTTP_200_OK)
+async def stream_quiz_from_text_endpoint(
+    input_data_json: str = File(..., description="JSON con los parámetros de generación del quiz (classroom_id, num_question, competences, type_question)."),
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$", description="Formato del stream: 'ndjson' o 'sse'.")
+):
+    """
+    Igual que /generate-from-text, pero emite cada pregunta apenas Gemini la completa.
+    """
+    try:
+        input_data = json.loads(input_data_json)
+        events = await QuizGenerator.stream_quiz_from_text(input_data=input_data)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="El 'input_data_json' no es un JSON válido.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+    return StreamingResponse(
+        _encode_generation_events(events, stream_format),
+        media_type=STREAM_MEDIA_TYPES[stream_format]
+    )
+
 @router.post(
     "/get-by-ids",
     response_model=List[QuizBasicOutput],
@@ -146,13 +300,14 @@ async def get_quiz_details_by_id_endpoint(
     db: AsyncSession = Depends(get_db)
 ) -> QuizDetailOutput:
     try:
-        quiz = await QuizService.get_quiz_with_details_by_id(db, quiz_id)
-        if not quiz:
+        # JSON ya serializado desde la caché de lectura (mismo formato que QuizDetailOutput)
+        quiz_json = await QuizService.get_quiz_detail_json(db, quiz_id)
+        if not quiz_json:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Quiz con ID {quiz_id} no encontrado."
             )
-        return quiz
+        return Response(content=quiz_json, media_type="application/json")
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -184,6 +339,9 @@ async def get_quiz_student_result_endpoint(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Resultados no encontrados para el Quiz ID {quiz_id} y Estudiante ID {student_id}."
             )
+        if quiz_result.feedback_automated is None:
+            # Con FEEDBACK_LAZY el feedback general se genera en la primera consulta
+            quiz_result.feedback_automated = await GeneralFeedbackService.ensure(db, quiz_id, student_id)
         return quiz_result
     except ValueError as e:
         raise HTTPException(
@@ -260,6 +418,274 @@ async def get_quizzes_by_classroom_with_attempt_status_endpoint(
             detail="Ocurrió un error inesperado al recuperar los quizzes."
         )
 
+@router.patch(
+    "/questions/{question_id}",
+    response_model=QuestionAnswerKeyUpdateOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Corregir la respuesta correcta o los puntos de una pregunta",
+    description="Actualiza la pregunta y el total del quiz y recalifica en segundo plano las respuestas ya guardadas. El progreso se consulta en /regrade-jobs/{job_id}."
+)
+async def update_question_answer_key_endpoint(
+    question_id: int,
+    data: QuestionAnswerKeyUpdateInput,
+    db: AsyncSession = Depends(get_db)
+) -> QuestionAnswerKeyUpdateOutput:
+    try:
+        result = await RegradeService.update_answer_key(db, question_id, data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error interno del servidor al actualizar la pregunta {question_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al actualizar la pregunta."
+        )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Pregunta con ID {question_id} no encontrada."
+        )
+    return result
+
+@router.get(
+    "/regrade-jobs/{job_id}",
+    response_model=RegradeJobOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Progreso de una recalificación"
+)
+async def get_regrade_job_endpoint(job_id: str) -> RegradeJobOutput:
+    job = RegradeService.get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Recalificación con ID {job_id} no encontrada."
+        )
+    return RegradeJobOutput(**job.as_dict())
+
+@router.post(
+    "/{quiz_id}/regrade",
+    response_model=RegradeJobOutput,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Recalificar las respuestas de un quiz",
+    description="Vuelve a calificar en segundo plano las respuestas guardadas de las preguntas indicadas (todas si no se indican) con su respuesta correcta actual."
+)
+async def regrade_quiz_endpoint(
+    quiz_id: int,
+    data: Optional[RegradeInput] = Body(None),
+    db: AsyncSession = Depends(get_db)
+) -> RegradeJobOutput:
+    try:
+        job = await RegradeService.regrade_quiz(db, quiz_id, data.question_ids if data else None)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error interno del servidor al recalificar el quiz {quiz_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al iniciar la recalificación."
+        )
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Quiz con ID {quiz_id} no encontrado."
+        )
+    return RegradeJobOutput(**job.as_dict())
+
+@router.get(
+    "/{quiz_id}/answer-distribution",
+    response_model=QuizAnswerDistributionOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Distribución de respuestas por opción",
+    description="Cuántos estudiantes eligieron cada opción en cada pregunta de opción múltiple del quiz, leído de los contadores que se actualizan con cada entrega."
+)
+async def get_quiz_answer_distribution_endpoint(
+    quiz_id: int,
+    db: AsyncSession = Depends(get_db)
+) -> QuizAnswerDistributionOutput:
+    try:
+        distribution = await AnswerDistributionService.get_quiz_distribution(db, quiz_id)
+    except Exception as e:
+        logger.error(f"Error interno del servidor al obtener la distribución de respuestas del quiz {quiz_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al obtener la distribución de respuestas."
+        )
+    if distribution is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Quiz con ID {quiz_id} no encontrado."
+        )
+    return distribution
+
+@router.get(
+    "/{quiz_id}/grading-stats",
+    response_model=QuizGradingStatsOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Origen de las calificaciones de un quiz",
+    description="Cuántas respuestas se calificaron localmente con la pre-calificación léxica, con el LLM o con el fallback, y la proporción local junto con los umbrales configurados."
+)
+async def get_quiz_grading_stats_endpoint(
+    quiz_id: int,
+    db: AsyncSession = Depends(get_db)
+) -> QuizGradingStatsOutput:
+    try:
+        stats = await QuizService.get_quiz_grading_stats(db, quiz_id)
+    except Exception as e:
+        logger.error(f"Error interno del servidor al obtener el origen de las calificaciones del quiz {quiz_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al obtener el origen de las calificaciones."
+        )
+    if stats is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Quiz con ID {quiz_id} no encontrado."
+        )
+    return stats
+
+async def _export_results_response(
+    db: AsyncSession,
+    export_format: str,
+    filename: str,
+    quiz_id: Optional[int] = None,
+    classroom_id: Optional[int] = None,
+) -> StreamingResponse:
+    try:
+        found = await ResultsExporter.validate(db, export_format, quiz_id=quiz_id, classroom_id=classroom_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error interno del servidor al preparar la exportación de resultados: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al exportar los resultados."
+        )
+    if not found:
+        detail = f"Quiz con ID {quiz_id} no encontrado." if quiz_id is not None else f"No se encontraron quizzes para el Classroom ID {classroom_id}."
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+    return StreamingResponse(
+        ResultsExporter.stream(export_format, quiz_id=quiz_id, classroom_id=classroom_id),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
+
+async def _item_analysis_response(db: AsyncSession, scope: str, scope_id: int, not_found_detail: str) -> Dict[str, Any]:
+    try:
+        analysis = await ItemAnalysisService.analyze(db, scope, scope_id)
+    except Exception as e:
+        logger.error(f"Error interno del servidor en el análisis de ítems ({scope} {scope_id}): {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al calcular el análisis de ítems."
+        )
+    if analysis is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found_detail)
+    return analysis
+
+@router.get(
+    "/classroom/{classroom_id}/item-analysis",
+    response_model=ItemAnalysisOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Análisis de ítems de un aula",
+    description="Dificultad, discriminación punto-biserial y distractores de cada pregunta de los quizzes del aula, y el alfa de Cronbach de cada quiz."
+)
+async def get_classroom_item_analysis_endpoint(
+    classroom_id: int,
+    db: AsyncSession = Depends(get_db)
+) -> ItemAnalysisOutput:
+    return await _item_analysis_response(db, SCOPE_CLASSROOM, classroom_id, f"El aula con ID {classroom_id} no tiene quizzes.")
+
+@router.get(
+    "/{quiz_id}/item-analysis",
+    response_model=ItemAnalysisOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Análisis de ítems de un quiz",
+    description="Dificultad, discriminación punto-biserial y distractores de cada pregunta del quiz, y su alfa de Cronbach."
+)
+async def get_quiz_item_analysis_endpoint(
+    quiz_id: int,
+    db: AsyncSession = Depends(get_db)
+) -> ItemAnalysisOutput:
+    return await _item_analysis_response(db, SCOPE_QUIZ, quiz_id, f"Quiz con ID {quiz_id} no encontrado.")
+
+@router.get(
+    "/{quiz_id}/leaderboard",
+    response_model=LeaderboardOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Ranking de un quiz",
+    description="Los primeros estudiantes del quiz por puntaje con RANK(), DENSE_RANK() y percentil, calculados en la base y guardados en caché hasta la siguiente entrega."
+)
+async def get_quiz_leaderboard_endpoint(
+    quiz_id: int,
+    limit: int = Query(10, ge=1, le=settings.LEADERBOARD_MAX_LIMIT, description="Cantidad de filas desde el primer puesto."),
+    db: AsyncSession = Depends(get_db)
+) -> LeaderboardOutput:
+    try:
+        leaderboard = await LeaderboardService.get_top(db, quiz_id, limit)
+    except Exception as e:
+        logger.error(f"Error interno del servidor al obtener el ranking del quiz {quiz_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al obtener el ranking."
+        )
+    if leaderboard is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Quiz con ID {quiz_id} no encontrado.")
+    return leaderboard
+
+@router.get(
+    "/{quiz_id}/leaderboard/student/{student_id}",
+    response_model=LeaderboardOutput,
+    status_code=status.HTTP_200_OK,
+    summary="Posición de un estudiante en el ranking",
+    description="La posición del estudiante en el quiz y los estudiantes inmediatamente por encima y por debajo."
+)
+async def get_student_leaderboard_endpoint(
+    quiz_id: int,
+    student_id: int,
+    around: int = Query(2, ge=0, le=settings.LEADERBOARD_MAX_LIMIT // 2, description="Filas por encima y por debajo del estudiante."),
+    db: AsyncSession = Depends(get_db)
+) -> LeaderboardOutput:
+    try:
+        leaderboard = await LeaderboardService.get_around(db, quiz_id, student_id, around)
+    except Exception as e:
+        logger.error(f"Error interno del servidor al obtener el ranking del quiz {quiz_id} para el estudiante {student_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ocurrió un error inesperado al obtener el ranking."
+        )
+    if leaderboard is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"El estudiante {student_id} no tiene entrega en el quiz {quiz_id} (o el quiz no existe)."
+        )
+    return leaderboard
+
+@router.get(
+    "/classroom/{classroom_id}/results/export",
+    status_code=status.HTTP_200_OK,
+    summary="Exportar los resultados de un aula",
+    description="Descarga en CSV o Parquet una fila por quiz, estudiante y pregunta de todos los quizzes del aula. El archivo se envía por fragmentos mientras se lee la base."
+)
+async def export_classroom_results_endpoint(
+    classroom_id: int,
+    format: str = Query("csv", description="csv o parquet"),
+    db: AsyncSession = Depends(get_db)
+):
+    return await _export_results_response(db, format, f"classroom_{classroom_id}_results", classroom_id=classroom_id)
+
+@router.get(
+    "/{quiz_id}/results/export",
+    status_code=status.HTTP_200_OK,
+    summary="Exportar los resultados de un quiz",
+    description="Descarga en CSV o Parquet una fila por estudiante y pregunta del quiz. El archivo se envía por fragmentos mientras se lee la base."
+)
+async def export_quiz_results_endpoint(
+    quiz_id: int,
+    format: str = Query("csv", description="csv o parquet"),
+    db: AsyncSession = Depends(get_db)
+):
+    return await _export_results_response(db, format, f"quiz_{quiz_id}_results", quiz_id=quiz_id)
+
 @router.get("/{quiz_id}/results", response_model=List[StudentQuizResultOutput])
 async def get_quiz_student_results(
     quiz_id: int,
@@ -1,9 +1,10 @@
 from fastapi import APIRouter
 
-from api.v1.endpoints import quiz, question
+from api.v1.endpoints import quiz, question, question_bank
 
 api_router = APIRouter()
 
 # # # Rutas de los endpoints (TODO decirles en el grupo de wsp que usen los prefijos)
 api_router.include_router(quiz.router, prefix="/quiz", tags=["Quiz"])
+api_router.include_router(question_bank.router, prefix="/questions", tags=["Question Bank"])
 # api_router.include_router(question.router, prefix="/question", tags=["Question"])
\ No newline at end of file
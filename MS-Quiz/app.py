@@ -1,9 +1,17 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from api.v1.router import api_router
 from db.database import init_db, drop_db
+from core.pdf.pdf_extractor import shutdown_process_pool
+from core.metrics import metrics
+from core.ai.llm_metrics import llm_metrics
+from core.quiz.question_index import question_index
+from core.quiz.prewarm import quiz_prewarmer
+from core.quiz.submission_intake import submission_workers
+from core.quiz.general_feedback import feedback_backfiller
 from db.models.quiz import *
 
 app = FastAPI(
@@ -30,11 +38,37 @@ async def startup_event():
     """Inicializa la base de datos al arrancar la aplicación"""
     #await drop_db()
     await init_db()
+    # El índice de casi duplicados se carga en segundo plano para no demorar el arranque
+    question_index.start_build()
+    # Pre-carga en la caché de lectura los quizzes que están por empezar
+    quiz_prewarmer.start()
+    # Workers que califican las entregas recibidas por /quiz/submissions
+    submission_workers.start()
+    # Feedback general pendiente, solo si FEEDBACK_BACKFILL_ENABLED
+    feedback_backfiller.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Libera los recursos compartidos al apagar la aplicación"""
+    await feedback_backfiller.stop()
+    await submission_workers.stop()
+    await quiz_prewarmer.stop()
+    shutdown_process_pool()
 
 @app.get("/health", tags=["Health"])
 def health_check():
     """Endpoint para verificar que la API está funcionando"""
     return {"status": "healthy"}
 
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Métricas del servicio en formato de texto de Prometheus"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/llm/summary", tags=["Health"])
+def llm_metrics_summary(window_s: int = Query(None, gt=0, description="Ventana en segundos (por defecto LLM_METRICS_WINDOW_S)")):
+    """Resumen de las llamadas al LLM en la ventana móvil (latencias, tokens, costo y concurrencia)"""
+    return llm_metrics.summary(window_s)
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8001, reload=True)
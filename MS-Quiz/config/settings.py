@@ -21,7 +21,135 @@ class Settings(BaseSettings):
     DEFAULT_NUM_QUESTIONS: int = 5
     MAX_NUM_QUESTIONS: int = 15
     MIN_NUM_QUESTIONS: int = 2
-    
+    MAX_QUIZ_VARIANTS: int = 5
+    QUESTION_BANK_PAGE_SIZE: int = 20
+    QUESTION_BANK_MAX_PAGE_SIZE: int = 100
+
+    # Generación desde PDF: "raw" envía el PDF a Gemini, "text" envía el texto extraído localmente
+    PDF_GENERATION_MODE: str = os.getenv("PDF_GENERATION_MODE", "raw")
+    PDF_EXTRACTION_WORKERS: int = int(os.getenv("PDF_EXTRACTION_WORKERS", "0")) # 0 = número de CPUs
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+    # Proveedor de LLM: "gemini" o "stub" (local, determinista y sin red, para pruebas de carga)
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "gemini")
+    STUB_LATENCY_MS: float = float(os.getenv("STUB_LATENCY_MS", "300"))
+    STUB_LATENCY_JITTER_MS: float = float(os.getenv("STUB_LATENCY_JITTER_MS", "50"))
+    STUB_MS_PER_ITEM: float = float(os.getenv("STUB_MS_PER_ITEM", "150")) # Por pregunta generada o evaluada
+    STUB_STREAM_CHUNK_CHARS: int = int(os.getenv("STUB_STREAM_CHUNK_CHARS", "200"))
+    STUB_MULTIPLE_OPTION_RATIO: float = float(os.getenv("STUB_MULTIPLE_OPTION_RATIO", "0.5"))
+    STUB_INVALID_RATE: float = float(os.getenv("STUB_INVALID_RATE", "0"))
+    STUB_FAILURE_RATE: float = float(os.getenv("STUB_FAILURE_RATE", "0"))
+
+    # Codificación de prompts: "compact" (system instruction + datos compactos) o "legacy" (prompts originales)
+    PROMPT_ENCODING: str = os.getenv("PROMPT_ENCODING", "compact")
+
+    # Cassettes de llamadas al LLM: "off", "record", "replay" (con la latencia original) o "replay_fast"
+    LLM_CASSETTE_MODE: str = os.getenv("LLM_CASSETTE_MODE", "off")
+    LLM_CASSETTE_DIR: str = os.getenv("LLM_CASSETTE_DIR", "cassettes")
+
+    # Llamadas simultáneas máximas al LLM y reintentos ante errores transitorios
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BASE_DELAY_S: float = float(os.getenv("LLM_RETRY_BASE_DELAY_S", "1"))
+
+    # Instrumentación de llamadas al LLM: ventana del resumen y costo en USD por millón de tokens
+    LLM_METRICS_WINDOW_S: int = int(os.getenv("LLM_METRICS_WINDOW_S", "900"))
+    LLM_METRICS_MAX_RECORDS: int = int(os.getenv("LLM_METRICS_MAX_RECORDS", "10000"))
+    LLM_COST_INPUT_PER_MTOK: float = float(os.getenv("LLM_COST_INPUT_PER_MTOK", "0.10"))
+    LLM_COST_OUTPUT_PER_MTOK: float = float(os.getenv("LLM_COST_OUTPUT_PER_MTOK", "0.40"))
+    LLM_COST_CACHED_INPUT_PER_MTOK: float = float(os.getenv("LLM_COST_CACHED_INPUT_PER_MTOK", "0.025"))
+
+    # Reutilización de documentos (PDF o texto grande) registrados en el proveedor entre generaciones
+    DOCUMENT_CACHE_ENABLED: bool = os.getenv("DOCUMENT_CACHE_ENABLED", "True") == "True"
+    DOCUMENT_CACHE_MIN_BYTES: int = int(os.getenv("DOCUMENT_CACHE_MIN_BYTES", "262144"))
+    DOCUMENT_CACHE_TTL_S: int = int(os.getenv("DOCUMENT_CACHE_TTL_S", "3600"))
+    DOCUMENT_CACHE_REFRESH_MARGIN_S: int = int(os.getenv("DOCUMENT_CACHE_REFRESH_MARGIN_S", "120")) # No usar handles a punto de vencer
+    DOCUMENT_CACHE_MAX_ENTRIES: int = int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "64"))
+    GEMINI_CACHE_MODEL: str = os.getenv("GEMINI_CACHE_MODEL", "") # Versión fija del modelo para la caché (vacío = GEMINI_MODEL)
+
+    # Generación por fragmentos (map-reduce) para documentos y textos largos
+    CHUNKED_GENERATION_MIN_CHARS: int = int(os.getenv("CHUNKED_GENERATION_MIN_CHARS", "40000"))
+    CHUNK_MAX_CHARS: int = int(os.getenv("CHUNK_MAX_CHARS", "15000"))
+    CHUNK_MAX_SECTIONS: int = int(os.getenv("CHUNK_MAX_SECTIONS", "8"))
+    CHUNK_CANDIDATE_FACTOR: float = float(os.getenv("CHUNK_CANDIDATE_FACTOR", "1.5"))
+
+    # Generación en paralelo por tipo de pregunta y formato de respuesta (fan-out)
+    FANOUT_MIN_QUESTIONS: int = int(os.getenv("FANOUT_MIN_QUESTIONS", "6"))
+    FANOUT_MIN_PER_REQUEST: int = int(os.getenv("FANOUT_MIN_PER_REQUEST", "2"))
+    FANOUT_EXTRA_QUESTIONS: int = int(os.getenv("FANOUT_EXTRA_QUESTIONS", "1")) # Preguntas de reserva por sub-petición
+
+    # Variantes de un mismo quiz: preguntas (variantes x num_question) máximas por llamada al modelo
+    VARIANTS_MAX_QUESTIONS_PER_CALL: int = int(os.getenv("VARIANTS_MAX_QUESTIONS_PER_CALL", "30"))
+
+    # Generación desde el banco de preguntas: se reutilizan preguntas existentes y el LLM genera solo lo que falta
+    BANK_FIRST_GENERATION: bool = os.getenv("BANK_FIRST_GENERATION", "False") == "True" # Por defecto; se elige por petición con "bank_first"
+    BANK_FIRST_MAX_RATIO: float = float(os.getenv("BANK_FIRST_MAX_RATIO", "1.0")) # Proporción máxima de preguntas reutilizadas
+    BANK_TOPIC_TERMS: int = int(os.getenv("BANK_TOPIC_TERMS", "12"))
+    BANK_CANDIDATE_FACTOR: int = int(os.getenv("BANK_CANDIDATE_FACTOR", "4"))
+
+    # Pre-calificación léxica de respuestas de texto: solo el rango ambiguo entre umbrales va al LLM
+    PREGRADE_ENABLED: bool = os.getenv("PREGRADE_ENABLED", "True") == "True"
+    PREGRADE_HIGH_THRESHOLD: float = float(os.getenv("PREGRADE_HIGH_THRESHOLD", "0.9")) # Puntaje >= umbral: correcta (100%)
+    PREGRADE_LOW_THRESHOLD: float = float(os.getenv("PREGRADE_LOW_THRESHOLD", "0.05")) # Puntaje <= umbral: incorrecta (0%)
+    PREGRADE_MAX_LOCAL_RATE: float = float(os.getenv("PREGRADE_MAX_LOCAL_RATE", "1.0")) # Proporción máxima de respuestas de texto calificadas localmente por entrega
+
+    # Detección de preguntas casi duplicadas: MinHash sobre n-gramas de caracteres del enunciado e índice LSH por bandas
+    MINHASH_NUM_PERM: int = int(os.getenv("MINHASH_NUM_PERM", "64"))
+    MINHASH_BANDS: int = int(os.getenv("MINHASH_BANDS", "16")) # Debe dividir a MINHASH_NUM_PERM
+    MINHASH_SHINGLE_CHARS: int = int(os.getenv("MINHASH_SHINGLE_CHARS", "5"))
+    NEAR_DUPLICATE_THRESHOLD: float = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.7")) # Similitud de Jaccard estimada
+    QUESTION_INDEX_BUILD_BATCH: int = int(os.getenv("QUESTION_INDEX_BUILD_BATCH", "2000"))
+
+    # Recalificación en lote al cambiar la respuesta correcta o los puntos de una pregunta
+    REGRADE_LLM_BATCH_SIZE: int = int(os.getenv("REGRADE_LLM_BATCH_SIZE", "20")) # Respuestas de texto ambiguas por llamada al LLM
+    REGRADE_MAX_JOBS: int = int(os.getenv("REGRADE_MAX_JOBS", "200")) # Trabajos terminados que se conservan para consultar su estado
+
+    # Exportación de resultados: filas por lote leídas del cursor y enviadas (un row group en Parquet)
+    EXPORT_BATCH_ROWS: int = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+
+    # Importación masiva de quizzes (COPY a tablas de staging)
+    IMPORT_BATCH_ROWS: int = int(os.getenv("IMPORT_BATCH_ROWS", "5000")) # Preguntas por lote (cada lote es una transacción)
+    IMPORT_MAX_ERRORS: int = int(os.getenv("IMPORT_MAX_ERRORS", "1000")) # Errores por línea que se reportan como máximo
+
+    # Caché de lectura (TTL + single-flight) de los quizzes y su pre-carga antes de start_time
+    READ_CACHE_ENABLED: bool = os.getenv("READ_CACHE_ENABLED", "True") == "True"
+    READ_CACHE_TTL_S: int = int(os.getenv("READ_CACHE_TTL_S", "60"))
+    READ_CACHE_MAX_ENTRIES: int = int(os.getenv("READ_CACHE_MAX_ENTRIES", "5000"))
+    PREWARM_ENABLED: bool = os.getenv("PREWARM_ENABLED", "True") == "True"
+    PREWARM_LEAD_S: int = int(os.getenv("PREWARM_LEAD_S", "120")) # Antelación con la que se pre-carga un quiz
+    PREWARM_INTERVAL_S: int = int(os.getenv("PREWARM_INTERVAL_S", "30"))
+
+    # Entregas asíncronas: journal de entrada y pool de workers que las califican
+    SUBMISSION_WORKERS: int = int(os.getenv("SUBMISSION_WORKERS", "4"))
+    SUBMISSION_MAX_ATTEMPTS: int = int(os.getenv("SUBMISSION_MAX_ATTEMPTS", "5"))
+    SUBMISSION_RETRY_BASE_S: float = float(os.getenv("SUBMISSION_RETRY_BASE_S", "2")) # Espera antes del reintento n: base * 2^(n-1)
+    SUBMISSION_RETRY_MAX_S: float = float(os.getenv("SUBMISSION_RETRY_MAX_S", "300"))
+    SUBMISSION_POLL_INTERVAL_S: float = float(os.getenv("SUBMISSION_POLL_INTERVAL_S", "1.0"))
+    SUBMISSION_LOCK_TIMEOUT_S: int = int(os.getenv("SUBMISSION_LOCK_TIMEOUT_S", "600")) # Entregas "processing" más antiguas vuelven a la cola
+
+    # Planificador de calificación: equidad por aula, prioridad y plazo (end_time)
+    SCHEDULER_SHORT_TEXT_CHARS: int = int(os.getenv("SCHEDULER_SHORT_TEXT_CHARS", "400")) # Hasta cuántos caracteres de texto cuenta como entrega corta
+    SCHEDULER_URGENT_WINDOW_S: int = int(os.getenv("SCHEDULER_URGENT_WINDOW_S", "300")) # Urgente si el quiz cierra dentro de esta ventana o ya cerró
+    SCHEDULER_METRICS_INTERVAL_S: float = float(os.getenv("SCHEDULER_METRICS_INTERVAL_S", "5"))
+
+    # Feedback general bajo demanda: al calificar solo se calculan los puntos
+    FEEDBACK_LAZY: bool = os.getenv("FEEDBACK_LAZY", "True") == "True"
+    FEEDBACK_BACKFILL_ENABLED: bool = os.getenv("FEEDBACK_BACKFILL_ENABLED", "False") == "True" # Pasada en segundo plano para el feedback pendiente
+    FEEDBACK_BACKFILL_INTERVAL_S: float = float(os.getenv("FEEDBACK_BACKFILL_INTERVAL_S", "60"))
+    FEEDBACK_BACKFILL_BATCH: int = int(os.getenv("FEEDBACK_BACKFILL_BATCH", "20"))
+
+    # Análisis de ítems (dificultad, discriminación, distractores y alfa de Cronbach)
+    ITEM_ANALYSIS_CACHE_TTL_S: int = int(os.getenv("ITEM_ANALYSIS_CACHE_TTL_S", "3600")) # Además se descarta con cada entrega
+    ITEM_ANALYSIS_GROUP_FRACTION: float = float(os.getenv("ITEM_ANALYSIS_GROUP_FRACTION", "0.27")) # Tamaño de los grupos superior e inferior
+    ITEM_ANALYSIS_DISTRACTOR_MIN_RATE: float = float(os.getenv("ITEM_ANALYSIS_DISTRACTOR_MIN_RATE", "0.05")) # Elección mínima de un distractor funcional
+
+    # Ranking de estudiantes por quiz
+    LEADERBOARD_CACHE_TTL_S: int = int(os.getenv("LEADERBOARD_CACHE_TTL_S", "3600")) # Además se descarta con cada entrega
+    LEADERBOARD_MAX_LIMIT: int = int(os.getenv("LEADERBOARD_MAX_LIMIT", "100")) # Máximo de filas por consulta (top-k o alrededor de un estudiante)
+
+    # Rondas de regeneración de preguntas inválidas (0 = descartarlas sin reintentar)
+    GENERATION_REPAIR_ATTEMPTS: int = int(os.getenv("GENERATION_REPAIR_ATTEMPTS", "1"))
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config.settings import get_settings
+from core.ai.context_cache import DocumentHandle, document_hash, document_size
+from core.ai.llm_provider import LLMProvider, LLMRequest, LLMResponse
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODE_OFF = "off"
+CASSETTE_MODE_RECORD = "record"             # Llama al proveedor real y guarda cada respuesta
+CASSETTE_MODE_REPLAY = "replay"             # Reproduce respetando la latencia original
+CASSETTE_MODE_REPLAY_FAST = "replay_fast"   # Reproduce sin esperar (solo nuestro costo de CPU)
+CASSETTE_MODES = (CASSETTE_MODE_OFF, CASSETTE_MODE_RECORD, CASSETTE_MODE_REPLAY, CASSETTE_MODE_REPLAY_FAST)
+
+# Marcas de tiempo ISO 8601 que cambian en cada petición (p. ej. start_time del prompt)
+_ISO_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?")
+_SPACES_RE = re.compile(r"\s+")
+
+
+class CassetteMissError(LookupError):
+    """No existe un cassette grabado para la petición en modo replay"""
+
+
+def normalize_contents(contents: List[Any]) -> List[str]:
+    """
+    Normaliza el contenido de una petición para calcular su clave: elimina las
+    marcas de tiempo, colapsa espacios y reemplaza las partes binarias (PDF)
+    por su hash.
+    """
+    normalized = []
+    for part in contents:
+        if isinstance(part, dict):
+            digest = hashlib.sha256(part.get("data", b"")).hexdigest()
+            normalized.append(f"<{part.get('mime_type', 'binary')}:{digest}>")
+        else:
+            text = _ISO_TIMESTAMP_RE.sub("<ts>", str(part))
+            normalized.append(_SPACES_RE.sub(" ", text).strip())
+    return normalized
+
+
+def cassette_key(request: LLMRequest) -> str:
+    payload = json.dumps(
+        {
+            "operation": request.operation,
+            "temperature": request.temperature,
+            "response_schema": request.response_schema,
+            "system_instruction": request.system_instruction,
+            "contents": normalize_contents(request.contents),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CassetteProvider(LLMProvider):
+    """
+    Envuelve a otro proveedor para grabar y reproducir sus respuestas.
+
+    Cada respuesta se guarda en LLM_CASSETTE_DIR/<operación>/<clave>.json con el
+    texto, los tokens y los tiempos (latencia total y, en streaming, el instante
+    de cada fragmento). La clave es el hash del prompt normalizado, por lo que
+    una misma generación hecha en otro momento reproduce el mismo cassette.
+    """
+
+    def __init__(self, inner: LLMProvider, mode: str, directory: str):
+        super().__init__()
+        if mode not in CASSETTE_MODES or mode == CASSETTE_MODE_OFF:
+            raise ValueError(f"Modo de cassette inválido: {mode}")
+        self.inner = inner
+        self.mode = mode
+        self.directory = directory
+        self.name = f"cassette:{inner.name}"
+        # Estadísticas de la sesión (útiles en benchmarks)
+        self.stats = {"recorded": 0, "replayed": 0, "model_seconds": 0.0}
+
+    def _path(self, operation: str, key: str) -> str:
+        return os.path.join(self.directory, operation, f"{key}.json")
+
+    def _load(self, operation: str, key: str) -> Dict[str, Any]:
+        path = self._path(operation, key)
+        if not os.path.exists(path):
+            raise CassetteMissError(f"No hay cassette grabado para '{operation}' ({key[:12]}). Graba con LLM_CASSETTE_MODE=record.")
+        with open(path, "r", encoding="utf-8") as f:
+            cassette = json.load(f)
+        self.stats["replayed"] += 1
+        self.stats["model_seconds"] += cassette["latency_s"]
+        return cassette
+
+    def _save(self, operation: str, key: str, contents: List[Any], cassette: Dict[str, Any]) -> None:
+        path = self._path(operation, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        preview = next((part for part in normalize_contents(contents) if not part.startswith("<")), "")
+        cassette = {
+            "key": key,
+            "operation": operation,
+            "recorded_at": datetime.now().isoformat(),
+            "provider": self.inner.name,
+            "prompt_preview": preview[:300],
+            **cassette,
+        }
+        # Escritura atómica: un replay concurrente nunca lee un archivo a medias
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        self.stats["recorded"] += 1
+        self.stats["model_seconds"] += cassette["latency_s"]
+
+    async def _generate(self, request: LLMRequest) -> LLMResponse:
+        key = cassette_key(request)
+        operation, contents = request.operation, request.contents
+
+        if self.mode == CASSETTE_MODE_RECORD:
+            start = time.perf_counter()
+            response = await self.inner._generate(request)
+            self._save(operation, key, contents, {
+                "latency_s": round(time.perf_counter() - start, 4),
+                "text": response.text,
+                "input_tokens": response.input_tokens,
+                "output_tokens": response.output_tokens,
+                "cached_tokens": response.cached_tokens,
+            })
+            return response
+
+        cassette = self._load(operation, key)
+        if self.mode == CASSETTE_MODE_REPLAY:
+            await asyncio.sleep(cassette["latency_s"])
+        return LLMResponse(
+            text=cassette["text"],
+            input_tokens=cassette.get("input_tokens"),
+            output_tokens=cassette.get("output_tokens"),
+            cached_tokens=cassette.get("cached_tokens"),
+        )
+
+    async def _generate_stream(self, request: LLMRequest, usage: LLMResponse) -> AsyncIterator[str]:
+        key = cassette_key(request)
+        operation, contents = request.operation, request.contents
+
+        if self.mode == CASSETTE_MODE_RECORD:
+            start = time.perf_counter()
+            chunks = []
+            async for chunk in self.inner._generate_stream(request, usage):
+                chunks.append([round(time.perf_counter() - start, 4), chunk])
+                yield chunk
+            self._save(operation, key, contents, {
+                "latency_s": round(time.perf_counter() - start, 4),
+                "text": "".join(chunk for _, chunk in chunks),
+                "input_tokens": usage.input_tokens,
+                "output_tokens": usage.output_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "chunks": chunks,
+            })
+            return
+
+        cassette = self._load(operation, key)
+        usage.input_tokens, usage.output_tokens = cassette.get("input_tokens"), cassette.get("output_tokens")
+        usage.cached_tokens = cassette.get("cached_tokens")
+        # Un cassette grabado sin streaming se reproduce como un único fragmento
+        chunks = cassette.get("chunks") or [[cassette["latency_s"], cassette["text"]]]
+        elapsed = 0.0
+        for offset, chunk in chunks:
+            if self.mode == CASSETTE_MODE_REPLAY and offset > elapsed:
+                await asyncio.sleep(offset - elapsed)
+                elapsed = offset
+            yield chunk
+
+    async def register_document(self, part: Any, system_instruction: Optional[str], ttl_s: int) -> Optional[DocumentHandle]:
+        # La clave del cassette usa el contenido completo, así que el handle no la afecta
+        if self.mode == CASSETTE_MODE_RECORD:
+            return await self.inner.register_document(part, system_instruction, ttl_s)
+        content_hash = document_hash(part)
+        return DocumentHandle(
+            kind="cassette",
+            name=f"cassette/{content_hash[:16]}",
+            content_hash=content_hash,
+            size_bytes=document_size(part),
+            expires_at=time.time() + ttl_s,
+        )
+
+    async def release_document(self, handle: DocumentHandle) -> None:
+        if self.mode == CASSETTE_MODE_RECORD:
+            await self.inner.release_document(handle)
+
+    def _is_retryable(self, error: Exception) -> bool:
+        return self.inner._is_retryable(error)
+
+    def _is_stale_document_error(self, error: Exception) -> bool:
+        return self.inner._is_stale_document_error(error)
+
+    async def count_tokens(self, contents: List[Any]) -> int:
+        return await self.inner.count_tokens(contents)
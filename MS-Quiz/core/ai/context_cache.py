@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from config.settings import get_settings
+from core.metrics import metrics
+
+if TYPE_CHECKING:
+    from core.ai.llm_provider import LLMProvider
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_document_cache_total", "Búsquedas de documentos registrados en el proveedor por resultado")
+metrics.describe("llm_document_cache_bytes_saved_total", "Bytes de documento que no se volvieron a enviar gracias a un handle")
+metrics.describe("llm_document_cache_entries", "Documentos registrados vigentes")
+
+
+@dataclass
+class DocumentHandle:
+    """
+    Referencia a un documento ya registrado en el proveedor.
+
+    kind: "cached_content" (contexto en caché con la system instruction incluida)
+    o "file" (archivo subido que se referencia por URI). 'resource' guarda el
+    objeto del proveedor para no tener que volver a consultarlo.
+    """
+    kind: str
+    name: str
+    content_hash: str
+    size_bytes: int
+    expires_at: float
+    mime_type: Optional[str] = None
+    uri: Optional[str] = None
+    token_count: Optional[int] = None
+    resource: Any = None
+
+
+def document_size(part: Any) -> int:
+    if isinstance(part, dict):
+        return len(part.get("data", b""))
+    return len(str(part).encode("utf-8"))
+
+
+def document_hash(part: Any) -> str:
+    if isinstance(part, dict):
+        return hashlib.sha256(part.get("data", b"")).hexdigest()
+    return hashlib.sha256(str(part).encode("utf-8")).hexdigest()
+
+
+def find_document_part(contents: List[Any]) -> Optional[int]:
+    """
+    Posición de la parte de documento que conviene registrar: la más grande
+    después del prompt (PDF o texto extraído) si supera DOCUMENT_CACHE_MIN_BYTES.
+    """
+    best_index, best_size = None, settings.DOCUMENT_CACHE_MIN_BYTES - 1
+    for index, part in enumerate(contents[1:], start=1):
+        size = document_size(part)
+        if size > best_size:
+            best_index, best_size = index, size
+    return best_index
+
+
+class DocumentCache:
+    """
+    Handles de documentos registrados en el proveedor, por hash de contenido.
+
+    Cuando varios quizzes se generan del mismo PDF (otra selección de
+    competencias, una versión de recuperación, las sub-peticiones de un
+    fan-out...) el documento se registra una sola vez y las llamadas siguientes
+    lo referencian, sin volver a subir los bytes ni pagar todos los tokens de
+    entrada. Los handles vencen según su TTL (con un margen para no usar uno a
+    punto de expirar), los registros simultáneos del mismo documento se
+    comparten y, al superar DOCUMENT_CACHE_MAX_ENTRIES, se libera el menos usado.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple[str, ...], DocumentHandle]" = OrderedDict()
+        self._pending: Dict[Tuple[str, ...], asyncio.Future] = {}
+        # Liberaciones en curso: se guardan para que no las recoja el recolector de basura
+        self._releases: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _key(provider: "LLMProvider", part: Any, system_instruction: Optional[str]) -> Tuple[str, ...]:
+        system_hash = hashlib.sha256((system_instruction or "").encode("utf-8")).hexdigest()
+        return provider.name, document_hash(part), system_hash
+
+    async def get_handle(self, provider: "LLMProvider", part: Any, system_instruction: Optional[str]) -> Optional[DocumentHandle]:
+        """Retorna un handle vigente para el documento, registrándolo si hace falta (None si no se puede)"""
+        key = self._key(provider, part, system_instruction)
+
+        handle = self._entries.get(key)
+        if handle is not None:
+            if handle.expires_at - settings.DOCUMENT_CACHE_REFRESH_MARGIN_S > time.time():
+                self._entries.move_to_end(key)
+                metrics.inc("llm_document_cache_total", result="hit")
+                metrics.inc("llm_document_cache_bytes_saved_total", handle.size_bytes)
+                return handle
+            metrics.inc("llm_document_cache_total", result="expired")
+            self._drop(key)
+
+        # Un solo registro por documento aunque lleguen varias llamadas a la vez
+        pending = self._pending.get(key)
+        if pending is not None:
+            handle = await asyncio.shield(pending)
+            if handle is not None:
+                metrics.inc("llm_document_cache_total", result="hit")
+                metrics.inc("llm_document_cache_bytes_saved_total", handle.size_bytes)
+            return handle
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        handle = None
+        try:
+            handle = await provider.register_document(part, system_instruction, settings.DOCUMENT_CACHE_TTL_S)
+            metrics.inc("llm_document_cache_total", result="miss" if handle else "unsupported")
+        except Exception as e:
+            logger.warning(f"No se pudo registrar el documento en el proveedor: {e}")
+            metrics.inc("llm_document_cache_total", result="error")
+        finally:
+            # Las llamadas en espera siguen sin handle aunque este registro se cancele
+            self._pending.pop(key, None)
+            future.set_result(handle)
+
+        if handle is not None:
+            self._entries[key] = handle
+            while len(self._entries) > settings.DOCUMENT_CACHE_MAX_ENTRIES:
+                self._drop(next(iter(self._entries)), provider)
+            metrics.set("llm_document_cache_entries", len(self._entries))
+        return handle
+
+    def invalidate(self, handle: DocumentHandle) -> None:
+        """Descarta un handle que el proveedor ya no reconoce (expiró o fue eliminado)"""
+        for key, entry in list(self._entries.items()):
+            if entry is handle:
+                self._drop(key)
+
+    def _drop(self, key: Tuple[str, ...], provider: Optional["LLMProvider"] = None) -> None:
+        handle = self._entries.pop(key, None)
+        metrics.set("llm_document_cache_entries", len(self._entries))
+        if handle is not None and provider is not None:
+            # Liberar en segundo plano lo que se saca por capacidad (el TTL lo borraría igual)
+            task = asyncio.get_running_loop().create_task(provider.release_document(handle))
+            self._releases.add(task)
+            task.add_done_callback(self._release_done)
+
+    def _release_done(self, task: asyncio.Task) -> None:
+        self._releases.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"No se pudo liberar un documento registrado: {task.exception()}")
+
+
+document_cache = DocumentCache()
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config.settings import get_settings
+from core.metrics import metrics
+
+settings = get_settings()
+
+_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120, 300)
+_QUEUE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+metrics.describe("llm_calls_total", "Llamadas al LLM por operación, aula y resultado (ok/error)")
+metrics.describe("llm_retries_total", "Reintentos de llamadas al LLM")
+metrics.describe("llm_fallbacks_total", "Veces que una operación usó su camino alternativo sin LLM")
+metrics.describe("llm_input_tokens_total", "Tokens de entrada consumidos")
+metrics.describe("llm_cached_input_tokens_total", "Tokens de entrada servidos desde un documento registrado en el proveedor")
+metrics.describe("llm_output_tokens_total", "Tokens de salida generados")
+metrics.describe("llm_cost_usd_total", "Costo estimado en USD según LLM_COST_*_PER_MTOK")
+metrics.describe("llm_in_flight", "Llamadas al LLM en curso")
+metrics.describe("llm_queue_wait_seconds", "Espera por el límite de concurrencia antes de llamar al LLM", _QUEUE_BUCKETS)
+metrics.describe("llm_time_to_first_byte_seconds", "Tiempo hasta el primer fragmento de la respuesta", _LATENCY_BUCKETS)
+metrics.describe("llm_latency_seconds", "Duración total de la llamada al LLM", _LATENCY_BUCKETS)
+
+
+@dataclass
+class LLMCallRecord:
+    """Datos de una llamada al LLM"""
+    operation: str
+    classroom_id: Optional[Any]
+    finished_at: float
+    queue_wait_s: float
+    ttfb_s: Optional[float]
+    latency_s: float
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    retries: int = 0
+    error: Optional[str] = None
+
+
+def estimate_cost(input_tokens: Optional[int], output_tokens: Optional[int], cached_tokens: Optional[int] = None) -> float:
+    # Los tokens en caché vienen incluidos en input_tokens pero se cobran a otra tarifa
+    cached_tokens = min(cached_tokens or 0, input_tokens or 0)
+    return (
+        ((input_tokens or 0) - cached_tokens) * settings.LLM_COST_INPUT_PER_MTOK
+        + cached_tokens * settings.LLM_COST_CACHED_INPUT_PER_MTOK
+        + (output_tokens or 0) * settings.LLM_COST_OUTPUT_PER_MTOK
+    ) / 1_000_000
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return round(ordered[index], 4)
+
+
+class LLMMetrics:
+    """
+    Instrumentación de las llamadas al LLM.
+
+    Cada llamada se exporta al registro de Prometheus (contadores por operación y
+    aula; histogramas solo por operación para acotar la cardinalidad) y se guarda
+    en una ventana móvil en memoria de la que se obtiene el resumen para
+    planificación de capacidad.
+    """
+
+    def __init__(self, window_s: int, max_records: int):
+        self.window_s = window_s
+        self._records = deque(maxlen=max_records)
+        self._fallbacks = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record_call(self, record: LLMCallRecord) -> None:
+        status = "error" if record.error else "ok"
+        metrics.inc("llm_calls_total", operation=record.operation, classroom=record.classroom_id, status=status)
+        metrics.observe("llm_queue_wait_seconds", record.queue_wait_s, operation=record.operation)
+        metrics.observe("llm_latency_seconds", record.latency_s, operation=record.operation)
+        if record.ttfb_s is not None:
+            metrics.observe("llm_time_to_first_byte_seconds", record.ttfb_s, operation=record.operation)
+        if record.input_tokens:
+            metrics.inc("llm_input_tokens_total", record.input_tokens, operation=record.operation, classroom=record.classroom_id)
+        if record.cached_tokens:
+            metrics.inc("llm_cached_input_tokens_total", record.cached_tokens, operation=record.operation, classroom=record.classroom_id)
+        if record.output_tokens:
+            metrics.inc("llm_output_tokens_total", record.output_tokens, operation=record.operation, classroom=record.classroom_id)
+        cost = estimate_cost(record.input_tokens, record.output_tokens, record.cached_tokens)
+        if cost:
+            metrics.inc("llm_cost_usd_total", cost, operation=record.operation, classroom=record.classroom_id)
+
+        with self._lock:
+            self._records.append(record)
+
+    def record_retry(self, operation: str, classroom_id: Optional[Any] = None) -> None:
+        metrics.inc("llm_retries_total", operation=operation, classroom=classroom_id)
+
+    def record_fallback(self, operation: str, classroom_id: Optional[Any] = None, reason: str = "") -> None:
+        metrics.inc("llm_fallbacks_total", operation=operation, classroom=classroom_id)
+        with self._lock:
+            self._fallbacks.append((time.time(), operation, reason))
+
+    def summary(self, window_s: Optional[int] = None) -> Dict[str, Any]:
+        """Resumen de la ventana móvil por operación y las aulas con más consumo"""
+        window_s = window_s or self.window_s
+        since = time.time() - window_s
+        with self._lock:
+            records = [r for r in self._records if r.finished_at >= since]
+            fallbacks = [f for f in self._fallbacks if f[0] >= since]
+
+        by_operation: Dict[str, List[LLMCallRecord]] = defaultdict(list)
+        by_classroom: Dict[str, Dict[str, float]] = defaultdict(lambda: {"calls": 0, "tokens": 0, "cost_usd": 0.0})
+        for r in records:
+            by_operation[r.operation].append(r)
+            classroom = by_classroom[str(r.classroom_id)]
+            classroom["calls"] += 1
+            classroom["tokens"] += (r.input_tokens or 0) + (r.output_tokens or 0)
+            classroom["cost_usd"] += estimate_cost(r.input_tokens, r.output_tokens, r.cached_tokens)
+
+        operations = {}
+        for operation, calls in sorted(by_operation.items()):
+            latencies = [r.latency_s for r in calls]
+            input_tokens = sum(r.input_tokens or 0 for r in calls)
+            output_tokens = sum(r.output_tokens or 0 for r in calls)
+            cached_tokens = sum(r.cached_tokens or 0 for r in calls)
+            operations[operation] = {
+                "calls": len(calls),
+                "calls_per_min": round(len(calls) * 60 / window_s, 3),
+                "errors": sum(1 for r in calls if r.error),
+                "retries": sum(r.retries for r in calls),
+                "fallbacks": sum(1 for f in fallbacks if f[1] == operation),
+                "latency_p50_s": _percentile(latencies, 0.5),
+                "latency_p95_s": _percentile(latencies, 0.95),
+                "latency_p99_s": _percentile(latencies, 0.99),
+                "ttfb_p50_s": _percentile([r.ttfb_s for r in calls if r.ttfb_s is not None], 0.5),
+                "queue_wait_p95_s": _percentile([r.queue_wait_s for r in calls], 0.95),
+                "input_tokens": input_tokens,
+                "cached_input_tokens": cached_tokens,
+                "output_tokens": output_tokens,
+                "output_tokens_per_s": round(output_tokens / sum(latencies), 2) if sum(latencies) else None,
+                "cost_usd": round(estimate_cost(input_tokens, output_tokens, cached_tokens), 6),
+                # Concurrencia media sostenida (ley de Little): llamadas/s x latencia media
+                "avg_concurrency": round(sum(latencies) / window_s, 3),
+            }
+
+        top_classrooms = sorted(by_classroom.items(), key=lambda item: -item[1]["tokens"])[:10]
+        return {
+            "window_s": window_s,
+            "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+            "in_flight": metrics.get("llm_in_flight"),
+            "operations": operations,
+            "top_classrooms": [
+                {"classroom_id": classroom_id, **{k: round(v, 6) for k, v in data.items()}}
+                for classroom_id, data in top_classrooms
+            ],
+        }
+
+
+llm_metrics = LLMMetrics(settings.LLM_METRICS_WINDOW_S, settings.LLM_METRICS_MAX_RECORDS)
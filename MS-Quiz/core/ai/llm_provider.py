@@ -0,0 +1,623 @@
+import abc
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import random
+import re
+import time
+from datetime import timedelta
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from config.settings import get_settings
+from core.ai.context_cache import DocumentHandle, document_cache, document_hash, document_size, find_document_part
+from core.ai.llm_metrics import llm_metrics, LLMCallRecord
+from core.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+LLM_PROVIDER_GEMINI = "gemini"
+LLM_PROVIDER_STUB = "stub"
+
+# Operaciones conocidas: etiquetan las métricas y el stub decide con ellas la forma de la respuesta
+OPERATION_GENERATE_PDF = "generate_pdf"
+OPERATION_GENERATE_TEXT = "generate_text"
+OPERATION_REPAIR = "repair"
+OPERATION_GRADE = "grade"
+OPERATION_FEEDBACK = "feedback"
+
+
+@dataclass
+class LLMResponse:
+    """Respuesta de un proveedor de LLM"""
+    text: str
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None  # Parte de input_tokens servida desde un documento registrado
+
+
+@dataclass
+class LLMRequest:
+    """Parámetros de una llamada al LLM"""
+    contents: List[Any]
+    operation: str
+    temperature: float = 0.7
+    response_schema: Optional[Dict[str, Any]] = None
+    system_instruction: Optional[str] = None
+    timeout: float = 600
+    tags: Dict[str, Any] = field(default_factory=dict)
+    # Documento ya registrado en el proveedor que reemplaza a contents[document_index]
+    document: Optional[DocumentHandle] = None
+    document_index: Optional[int] = None
+
+    def contents_without_document(self) -> List[Any]:
+        if self.document is None:
+            return self.contents
+        return [part for i, part in enumerate(self.contents) if i != self.document_index]
+
+
+class LLMProvider(abc.ABC):
+    """
+    Interfaz común para los modelos de lenguaje usados en generación y calificación.
+
+    'contents' sigue el formato de Gemini: una lista con strings y partes binarias
+    ({"mime_type": ..., "data": bytes}). 'operation' identifica el caso de uso y
+    'tags' lleva datos de contexto (classroom_id, num_question...). Las reglas
+    fijas del caso de uso van en 'system_instruction'. Todas las llamadas
+    comparten el límite de concurrencia LLM_MAX_CONCURRENCY.
+
+    Si el proveedor soporta registrar documentos (register_document), el PDF o
+    texto grande de la petición se registra una vez y las llamadas siguientes
+    con el mismo documento lo referencian por su handle (ver context_cache).
+    """
+
+    name: str = ""
+
+    def __init__(self):
+        self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
+    def _is_retryable(self, error: Exception) -> bool:
+        """Indica si un error es transitorio y vale la pena reintentar"""
+        return isinstance(error, asyncio.TimeoutError)
+
+    def _is_stale_document_error(self, error: Exception) -> bool:
+        """Indica si el error se debe a un documento registrado que el proveedor ya no tiene"""
+        return False
+
+    async def register_document(self, part: Any, system_instruction: Optional[str], ttl_s: int) -> Optional[DocumentHandle]:
+        """Registra un documento para reutilizarlo entre llamadas; None si el proveedor no lo soporta"""
+        return None
+
+    async def release_document(self, handle: DocumentHandle) -> None:
+        """Libera un documento registrado (por defecto no hace nada: vence solo por su TTL)"""
+        return None
+
+    async def _attach_document(self, request: LLMRequest) -> None:
+        """Asocia a la petición el handle de su documento grande, registrándolo si hace falta"""
+        if not settings.DOCUMENT_CACHE_ENABLED:
+            return
+        index = find_document_part(request.contents)
+        if index is None:
+            return
+        request.document = await document_cache.get_handle(self, request.contents[index], request.system_instruction)
+        request.document_index = index if request.document else None
+
+    def _detach_stale_document(self, request: LLMRequest, error: Exception) -> bool:
+        """Si el handle ya no es válido lo descarta para repetir la llamada con el documento completo"""
+        if request.document is None or not self._is_stale_document_error(error):
+            return False
+        logger.warning(f"Documento registrado no disponible ({request.document.name}), se envía completo: {error}")
+        document_cache.invalidate(request.document)
+        request.document = None
+        request.document_index = None
+        return True
+
+    async def generate(
+        self,
+        contents: List[Any],
+        operation: str,
+        temperature: float = 0.7,
+        response_schema: Optional[Dict[str, Any]] = None,
+        timeout: float = 600,
+        tags: Optional[Dict[str, Any]] = None,
+        system_instruction: Optional[str] = None,
+    ) -> LLMResponse:
+        """
+        Genera una respuesta JSON completa. Los errores transitorios se reintentan
+        hasta LLM_MAX_RETRIES veces con espera exponencial (fuera del semáforo).
+        """
+        tags = tags or {}
+        request = LLMRequest(contents, operation, temperature, response_schema, system_instruction, timeout, tags)
+        await self._attach_document(request)
+        retries = 0
+        queue_wait = 0.0
+        while True:
+            queued_at = time.perf_counter()
+            async with self._semaphore:
+                started_at = time.perf_counter()
+                queue_wait += started_at - queued_at
+                metrics.add("llm_in_flight", 1)
+                try:
+                    response = await self._generate(request)
+                    error = None
+                except Exception as e:
+                    error = e
+                finally:
+                    metrics.add("llm_in_flight", -1)
+                latency = time.perf_counter() - started_at
+
+            if error is None:
+                self._record(operation, tags, queue_wait, latency, latency, response, retries)
+                return response
+            if self._detach_stale_document(request, error):
+                continue
+            if retries < settings.LLM_MAX_RETRIES and self._is_retryable(error):
+                retries += 1
+                llm_metrics.record_retry(operation, tags.get("classroom_id"))
+                await asyncio.sleep(settings.LLM_RETRY_BASE_DELAY_S * 2 ** (retries - 1))
+                continue
+            self._record(operation, tags, queue_wait, latency, None, None, retries, error)
+            raise error
+
+    async def generate_stream(
+        self,
+        contents: List[Any],
+        operation: str,
+        temperature: float = 0.7,
+        response_schema: Optional[Dict[str, Any]] = None,
+        timeout: float = 600,
+        tags: Optional[Dict[str, Any]] = None,
+        system_instruction: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Genera la respuesta en fragmentos de texto a medida que llegan (sin reintentos)"""
+        tags = tags or {}
+        request = LLMRequest(contents, operation, temperature, response_schema, system_instruction, timeout, tags)
+        await self._attach_document(request)
+        usage = LLMResponse(text="")
+        queued_at = time.perf_counter()
+        async with self._semaphore:
+            started_at = time.perf_counter()
+            ttfb = None
+            metrics.add("llm_in_flight", 1)
+            try:
+                while True:
+                    try:
+                        async for chunk in self._generate_stream(request, usage):
+                            if ttfb is None:
+                                ttfb = time.perf_counter() - started_at
+                            yield chunk
+                        break
+                    except Exception as e:
+                        # Sin handle solo se puede repetir si todavía no se emitió ningún fragmento
+                        if ttfb is None and self._detach_stale_document(request, e):
+                            continue
+                        raise
+            except Exception as e:
+                self._record(operation, tags, started_at - queued_at, time.perf_counter() - started_at, ttfb, None, 0, e)
+                raise
+            finally:
+                metrics.add("llm_in_flight", -1)
+        self._record(operation, tags, started_at - queued_at, time.perf_counter() - started_at, ttfb, usage, 0)
+
+    @staticmethod
+    def _record(operation, tags, queue_wait, latency, ttfb, response, retries, error=None) -> None:
+        llm_metrics.record_call(LLMCallRecord(
+            operation=operation,
+            classroom_id=tags.get("classroom_id"),
+            finished_at=time.time(),
+            queue_wait_s=queue_wait,
+            ttfb_s=ttfb,
+            latency_s=latency,
+            input_tokens=response.input_tokens if response else None,
+            output_tokens=response.output_tokens if response else None,
+            cached_tokens=response.cached_tokens if response else None,
+            retries=retries,
+            error=type(error).__name__ if error else None,
+        ))
+
+    @abc.abstractmethod
+    async def _generate(self, request: LLMRequest) -> LLMResponse:
+        ...
+
+    @abc.abstractmethod
+    def _generate_stream(self, request: LLMRequest, usage: LLMResponse) -> AsyncIterator[str]:
+        """Emite los fragmentos y deja en 'usage' los tokens si el proveedor los informa"""
+        ...
+
+    @abc.abstractmethod
+    async def count_tokens(self, contents: List[Any]) -> int:
+        """Cuenta los tokens de entrada de 'contents'"""
+        ...
+
+
+# Cuota agotada, sobrecarga o timeouts del lado de Gemini
+_GEMINI_RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+# Los archivos subidos a Gemini se eliminan a las 48 horas
+_GEMINI_FILE_TTL_S = 48 * 3600
+
+
+class GeminiProvider(LLMProvider):
+    """Proveedor respaldado por Google Gemini (google.generativeai)"""
+
+    name = LLM_PROVIDER_GEMINI
+
+    def __init__(self):
+        super().__init__()
+        self._configured = False
+        self._models: Dict[Any, genai.GenerativeModel] = {}
+
+    def _configure(self) -> None:
+        # La API key se configura en el primer uso y no al importar el módulo
+        if not self._configured:
+            genai.configure(api_key=settings.GOOGLE_API_KEY)
+            self._configured = True
+
+    @staticmethod
+    def _generation_config(request: LLMRequest) -> Dict[str, Any]:
+        generation_config = {"temperature": request.temperature, "response_mime_type": "application/json"}
+        if request.response_schema:
+            generation_config["response_schema"] = request.response_schema
+        return generation_config
+
+    def _model(self, request: Optional[LLMRequest] = None) -> genai.GenerativeModel:
+        self._configure()
+
+        # El contexto en caché ya trae el documento y la system instruction
+        if request is not None and request.document is not None and request.document.kind == "cached_content":
+            return genai.GenerativeModel.from_cached_content(
+                request.document.resource, generation_config=self._generation_config(request)
+            )
+
+        if request is None:
+            key = None
+        else:
+            schema_key = json.dumps(request.response_schema, sort_keys=True) if request.response_schema else None
+            key = (request.temperature, schema_key, request.system_instruction)
+
+        # Los modelos se reutilizan: la configuración y la system instruction se arman una sola vez
+        if key not in self._models:
+            if request is None:
+                self._models[key] = genai.GenerativeModel(settings.GEMINI_MODEL)
+            else:
+                self._models[key] = genai.GenerativeModel(
+                    settings.GEMINI_MODEL,
+                    generation_config=self._generation_config(request),
+                    system_instruction=request.system_instruction,
+                )
+        return self._models[key]
+
+    @staticmethod
+    def _contents(request: LLMRequest) -> List[Any]:
+        """Contenido a enviar: sin el documento si está en caché, o referenciado por URI si se subió como archivo"""
+        document = request.document
+        if document is None:
+            return request.contents
+        contents = request.contents_without_document()
+        if document.kind == "file":
+            contents.insert(request.document_index, {"file_data": {"mime_type": document.mime_type, "file_uri": document.uri}})
+        return contents
+
+    @staticmethod
+    def _read_usage(usage_metadata: Any, response: LLMResponse) -> None:
+        if usage_metadata is None:
+            return
+        response.input_tokens = getattr(usage_metadata, "prompt_token_count", None) or response.input_tokens
+        response.output_tokens = getattr(usage_metadata, "candidates_token_count", None) or response.output_tokens
+        response.cached_tokens = getattr(usage_metadata, "cached_content_token_count", None) or response.cached_tokens
+
+    async def register_document(self, part: Any, system_instruction: Optional[str], ttl_s: int) -> Optional[DocumentHandle]:
+        """
+        Registra el documento como contexto en caché junto con la system instruction.
+        Si Gemini lo rechaza (p. ej. por no alcanzar el mínimo de tokens de la
+        caché) y es un PDF, se sube con la API de archivos para al menos no
+        reenviar los bytes en cada llamada.
+        """
+        self._configure()
+        content_hash = document_hash(part)
+        size_bytes = document_size(part)
+        try:
+            cached = await asyncio.to_thread(
+                genai.caching.CachedContent.create,
+                model=settings.GEMINI_CACHE_MODEL or settings.GEMINI_MODEL,
+                display_name=f"quiz-{content_hash[:16]}",
+                system_instruction=system_instruction,
+                contents=[part],
+                ttl=timedelta(seconds=ttl_s),
+            )
+            return DocumentHandle(
+                kind="cached_content",
+                name=cached.name,
+                content_hash=content_hash,
+                size_bytes=size_bytes,
+                expires_at=time.time() + ttl_s,
+                token_count=getattr(getattr(cached, "usage_metadata", None), "total_token_count", None),
+                resource=cached,
+            )
+        except google_exceptions.InvalidArgument as e:
+            if not isinstance(part, dict):
+                logger.info(f"Gemini no aceptó el documento en la caché de contexto: {e}")
+                return None
+            logger.info(f"Gemini no aceptó el documento en la caché de contexto, se sube como archivo: {e}")
+
+        uploaded = await asyncio.to_thread(
+            genai.upload_file,
+            io.BytesIO(part["data"]),
+            mime_type=part["mime_type"],
+            display_name=f"quiz-{content_hash[:16]}",
+        )
+        expiration = getattr(uploaded, "expiration_time", None)
+        return DocumentHandle(
+            kind="file",
+            name=uploaded.name,
+            content_hash=content_hash,
+            size_bytes=size_bytes,
+            expires_at=expiration.timestamp() if expiration else time.time() + _GEMINI_FILE_TTL_S,
+            mime_type=part["mime_type"],
+            uri=uploaded.uri,
+            resource=uploaded,
+        )
+
+    async def release_document(self, handle: DocumentHandle) -> None:
+        try:
+            if handle.kind == "cached_content":
+                await asyncio.to_thread(handle.resource.delete)
+            elif handle.kind == "file":
+                await asyncio.to_thread(genai.delete_file, handle.name)
+        except Exception as e:
+            logger.warning(f"No se pudo liberar el documento registrado {handle.name}: {e}")
+
+    def _is_stale_document_error(self, error: Exception) -> bool:
+        return isinstance(error, (google_exceptions.NotFound, google_exceptions.PermissionDenied))
+
+    async def _generate(self, request: LLMRequest) -> LLMResponse:
+        response = await self._model(request).generate_content_async(
+            self._contents(request), request_options={"timeout": request.timeout}
+        )
+        result = LLMResponse(text=response.text)
+        self._read_usage(getattr(response, "usage_metadata", None), result)
+        return result
+
+    async def _generate_stream(self, request: LLMRequest, usage: LLMResponse) -> AsyncIterator[str]:
+        response = await self._model(request).generate_content_async(
+            self._contents(request), stream=True, request_options={"timeout": request.timeout}
+        )
+        async for chunk in response:
+            # El último fragmento trae el uso acumulado de tokens
+            self._read_usage(getattr(chunk, "usage_metadata", None), usage)
+            yield chunk.text or ""
+
+    def _is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, _GEMINI_RETRYABLE_ERRORS) or super()._is_retryable(error)
+
+    async def count_tokens(self, contents: List[Any]) -> int:
+        return (await self._model().count_tokens_async(contents)).total_tokens
+
+
+_COMPETENCE_ID_RE = re.compile(r'"id"\s*:\s*(\d+)')
+_QUESTION_ID_RE = re.compile(r'"(?:question_)?id"\s*:\s*(\d+)')
+# Estructura por posición de las variantes: líneas {"p":..,"f":..,"c":[..]} al generar y
+# "formato ... que evalúe las competencias [..]" en los motivos de la reparación
+_BLUEPRINT_SLOT_RE = re.compile(r'^\{"p":\d+,"f":"(mc|txt)","c":\[([\d,]*)\]\}$', re.MULTILINE)
+_REPAIR_SLOT_RE = re.compile(r'formato (base_multiple_option|base_text) que evalúe las competencias \[([\d, ]*)\]')
+
+
+class StubProvider(LLMProvider):
+    """
+    Proveedor local y determinista para pruebas de carga sin red ni consumo de tokens.
+
+    La respuesta depende solo del contenido de la petición (misma entrada, misma
+    salida). La latencia es STUB_LATENCY_MS + STUB_MS_PER_ITEM por pregunta
+    generada/evaluada, con una variación de ±STUB_LATENCY_JITTER_MS. Con
+    STUB_INVALID_RATE y STUB_FAILURE_RATE se ejercitan la reparación de preguntas
+    y los caminos de fallback. Si el prompt fija la estructura por posición de
+    las variantes, las preguntas la siguen.
+    """
+
+    name = LLM_PROVIDER_STUB
+
+    @staticmethod
+    def _text_of(contents: List[Any]) -> str:
+        parts = []
+        for part in contents:
+            if isinstance(part, dict):
+                parts.append(hashlib.sha256(part.get("data", b"")).hexdigest())
+            else:
+                parts.append(str(part))
+        return "\n".join(parts)
+
+    def _rng(self, text: str, operation: str) -> random.Random:
+        seed = hashlib.sha256(f"{operation}\n{text}".encode("utf-8")).hexdigest()
+        return random.Random(int(seed[:16], 16))
+
+    async def _sleep(self, rng: random.Random, items: int) -> None:
+        jitter = rng.uniform(-settings.STUB_LATENCY_JITTER_MS, settings.STUB_LATENCY_JITTER_MS)
+        delay_ms = max(0.0, settings.STUB_LATENCY_MS + settings.STUB_MS_PER_ITEM * items + jitter)
+        await asyncio.sleep(delay_ms / 1000)
+
+    @staticmethod
+    def _question(rng: random.Random, index: int, competence_ids: List[int], slot: Optional[Tuple[str, List[int]]] = None) -> Dict[str, Any]:
+        """'slot' (formato, competencias) fija la estructura pedida para esa posición"""
+        statement = f"Pregunta simulada {index + 1} ({rng.randrange(10 ** 6):06d})"
+        competences = rng.sample(competence_ids, min(len(competence_ids), 2)) if competence_ids else []
+        if slot is not None:
+            competences = slot[1]
+        if rng.random() < settings.STUB_INVALID_RATE:
+            # Pregunta de opción múltiple con la respuesta fuera de las opciones
+            return {
+                "statement": statement,
+                "answer_correct": "Respuesta inexistente",
+                "points": 2,
+                "answer_base": {"type": "base_multiple_option", "options": ["A", "B", "C"]},
+                "competences_id": competences,
+            }
+        multiple_option = rng.random() < settings.STUB_MULTIPLE_OPTION_RATIO
+        if slot is not None:
+            multiple_option = slot[0] == "base_multiple_option"
+        if multiple_option:
+            options = [f"Opción {letter} de la pregunta {index + 1}" for letter in "ABCD"]
+            return {
+                "statement": statement,
+                "answer_correct": rng.choice(options),
+                "points": rng.randint(1, 4),
+                "answer_base": {"type": "base_multiple_option", "options": options},
+                "competences_id": competences,
+            }
+        return {
+            "statement": statement,
+            "answer_correct": f"Respuesta esperada de la pregunta {index + 1}.",
+            "points": rng.randint(1, 4),
+            "answer_base": {"type": "base_text"},
+            "competences_id": competences,
+        }
+
+    def _build_payload(self, rng: random.Random, text: str, operation: str, tags: Dict[str, Any]):
+        """Arma la respuesta según la operación; retorna (payload, cantidad de ítems)"""
+        if operation == OPERATION_GRADE:
+            question_ids = tags.get("question_ids") or [int(i) for i in _QUESTION_ID_RE.findall(text)]
+            evaluations = [
+                {
+                    "question_id": question_id,
+                    "percentage_correct": rng.choice((0, 25, 50, 75, 100)),
+                    "feedback": "Feedback simulado para la pregunta.",
+                }
+                for question_id in question_ids
+            ]
+            return {"evaluations": evaluations, "general_feedback": "Feedback general simulado."}, len(evaluations)
+        if operation == OPERATION_FEEDBACK:
+            return {"general_feedback": "Feedback general simulado."}, 1
+
+        competence_ids = sorted({int(i) for i in _COMPETENCE_ID_RE.findall(text)})
+        num_question = int(tags.get("num_question") or settings.DEFAULT_NUM_QUESTIONS)
+        if operation == OPERATION_REPAIR:
+            slots = [(answer_type, [int(c) for c in ids.split(",") if c.strip()])
+                     for answer_type, ids in _REPAIR_SLOT_RE.findall(text)]
+        else:
+            slots = [("base_multiple_option" if f == "mc" else "base_text", [int(c) for c in ids.split(",") if c])
+                     for f, ids in _BLUEPRINT_SLOT_RE.findall(text)]
+        slots += [None] * (num_question - len(slots))
+        questions = [self._question(rng, i, competence_ids, slots[i]) for i in range(num_question)]
+        if operation == OPERATION_REPAIR:
+            return questions, num_question
+
+        num_variants = int(tags.get("variants") or 1)
+        if num_variants > 1:
+            variants = [{"questions": questions}] + [
+                {"questions": [self._question(rng, i, competence_ids, slots[i]) for i in range(num_question)]}
+                for _ in range(num_variants - 1)
+            ]
+            return {
+                "title": "Quiz simulado",
+                "instruction": "Responde las preguntas del quiz simulado.",
+                "variants": variants,
+            }, num_question * num_variants
+
+        return {
+            "classroom_id": tags.get("classroom_id", 0),
+            "title": "Quiz simulado",
+            "instruction": "Responde las preguntas del quiz simulado.",
+            "start_time": "2000-01-01T00:00:00Z",
+            "end_time": "2000-01-01T01:00:00Z",
+            "questions": questions,
+        }, num_question
+
+    def _respond(self, request: LLMRequest):
+        text = self._text_of(request.contents)
+        rng = self._rng(text, request.operation)
+        payload, items = self._build_payload(rng, text, request.operation, request.tags)
+        return rng, text, json.dumps(payload, ensure_ascii=False), items
+
+    def _maybe_fail(self, rng: random.Random, operation: str) -> None:
+        if rng.random() < settings.STUB_FAILURE_RATE:
+            raise RuntimeError(f"Fallo simulado del proveedor stub en '{operation}'.")
+
+    @staticmethod
+    def _cached_tokens(request: LLMRequest) -> Optional[int]:
+        return request.document.token_count if request.document else None
+
+    async def register_document(self, part: Any, system_instruction: Optional[str], ttl_s: int) -> Optional[DocumentHandle]:
+        content_hash = document_hash(part)
+        return DocumentHandle(
+            kind="stub",
+            name=f"stub/{content_hash[:16]}",
+            content_hash=content_hash,
+            size_bytes=document_size(part),
+            expires_at=time.time() + ttl_s,
+            token_count=len(self._text_of([part])) // 4,
+        )
+
+    async def _generate(self, request: LLMRequest) -> LLMResponse:
+        # La respuesta se calcula sobre el contenido completo para que no dependa de la caché
+        rng, text, output, items = self._respond(request)
+        await self._sleep(rng, items)
+        self._maybe_fail(rng, request.operation)
+        return LLMResponse(
+            text=output, input_tokens=len(text) // 4, output_tokens=len(output) // 4,
+            cached_tokens=self._cached_tokens(request),
+        )
+
+    async def _generate_stream(self, request: LLMRequest, usage: LLMResponse) -> AsyncIterator[str]:
+        rng, text, output, items = self._respond(request)
+        usage.input_tokens, usage.output_tokens = len(text) // 4, len(output) // 4
+        usage.cached_tokens = self._cached_tokens(request)
+        self._maybe_fail(rng, request.operation)
+        chunk_size = max(1, settings.STUB_STREAM_CHUNK_CHARS)
+        num_chunks = max(1, -(-len(output) // chunk_size))
+        # Primer fragmento tras la latencia base; el resto del tiempo por ítem se reparte entre fragmentos
+        await self._sleep(rng, 0)
+        per_chunk_s = settings.STUB_MS_PER_ITEM * items / num_chunks / 1000
+        for i in range(num_chunks):
+            if i:
+                await asyncio.sleep(per_chunk_s)
+            yield output[i * chunk_size:(i + 1) * chunk_size]
+
+    async def count_tokens(self, contents: List[Any]) -> int:
+        # Aproximación: ~4 caracteres por token
+        return len(self._text_of(contents)) // 4
+
+
+_PROVIDERS = {
+    LLM_PROVIDER_GEMINI: GeminiProvider,
+    LLM_PROVIDER_STUB: StubProvider,
+}
+
+
+_provider: Optional[LLMProvider] = None
+
+
+def get_llm_provider() -> LLMProvider:
+    """
+    Retorna el proveedor configurado en LLM_PROVIDER (una instancia por proceso).
+    Si LLM_CASSETTE_MODE no es "off" se envuelve en un CassetteProvider.
+    """
+    global _provider
+    if _provider is None:
+        provider_cls = _PROVIDERS.get(settings.LLM_PROVIDER)
+        if provider_cls is None:
+            raise ValueError(f"LLM_PROVIDER debe ser uno de: {', '.join(_PROVIDERS)}.")
+        provider = provider_cls()
+
+        if settings.LLM_CASSETTE_MODE != "off":
+            from core.ai.cassette import CassetteProvider
+            provider = CassetteProvider(provider, settings.LLM_CASSETTE_MODE, settings.LLM_CASSETTE_DIR)
+
+        logger.info(f"Proveedor de LLM: {provider.name}")
+        _provider = provider
+    return _provider
+
+
+def set_llm_provider(provider: Optional[LLMProvider]) -> None:
+    """Reemplaza el proveedor del proceso (benchmarks y scripts); None vuelve al configurado"""
+    global _provider
+    _provider = provider
@@ -0,0 +1,390 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from config.settings import get_settings
+
+settings = get_settings()
+
+PROMPT_ENCODING_COMPACT = "compact"
+PROMPT_ENCODING_LEGACY = "legacy" # Prompts verbosos originales (para comparar y reproducir cassettes antiguos)
+
+# Instrucciones estáticas: viajan como system instruction, idénticas en cada llamada,
+# de modo que el prefijo se reutiliza y el prompt variable queda corto.
+GENERATION_SYSTEM_INSTRUCTION = """Eres un generador de quizzes educativos en español a partir de un documento o tema.
+Reglas:
+1. El quiz tiene "title" e "instruction" relevantes al contenido.
+2. Cada pregunta vale un entero positivo de "points" y la suma debe ser igual o muy cercana al total pedido.
+3. Usa solo los tipos de pregunta habilitados (textuales, inferenciales, críticas) y repártelos de forma equitativa, igual que los formatos de respuesta "base_text" (texto libre) y "base_multiple_option" (opción múltiple), salvo que se pida otra combinación.
+4. "answer_correct": en base_text es la respuesta completa esperada; en base_multiple_option es exactamente el texto de una de las "options" (entre 3 y 5 opciones).
+5. "competences_id": IDs tomados solo del listado de competencias (id, n=nombre, d=descripción); combina idealmente 2 o más competencias afines a la pregunta.
+6. Copia classroom_id, start_time y end_time tal como se indican.
+Responde solo con JSON."""
+
+GRADING_SYSTEM_INSTRUCTION = """Eres un evaluador de quizzes. Cada pregunta llega como JSON con: id, q=enunciado, ref=respuesta correcta, t=tipo (txt=texto libre, mc=opción múltiple), ans=respuesta del estudiante, max=puntaje máximo.
+- mc: 100 si ans es idéntica a ref, 0 si no.
+- txt: evalúa coherencia, precisión y exhaustividad de ans frente a ref con un porcentaje entero de 0 a 100.
+- "feedback" por pregunta: conciso y constructivo, máximo 2-3 oraciones.
+- "general_feedback": máximo 4-5 oraciones, amigable y motivador; resume el desempeño, los puntos fuertes y las áreas de mejora.
+Responde solo con JSON: {"evaluations":[{"question_id":id,"percentage_correct":0-100,"feedback":"..."}],"general_feedback":"..."}"""
+
+# Calificación sin feedback general (FEEDBACK_LAZY): se genera aparte cuando se consulta
+SCORING_SYSTEM_INSTRUCTION = """Eres un evaluador de quizzes. Cada pregunta llega como JSON con: id, q=enunciado, ref=respuesta correcta, t=tipo (txt=texto libre, mc=opción múltiple), ans=respuesta del estudiante, max=puntaje máximo.
+- mc: 100 si ans es idéntica a ref, 0 si no.
+- txt: evalúa coherencia, precisión y exhaustividad de ans frente a ref con un porcentaje entero de 0 a 100.
+- "feedback" por pregunta: conciso y constructivo, máximo 2-3 oraciones.
+Responde solo con JSON: {"evaluations":[{"question_id":id,"percentage_correct":0-100,"feedback":"..."}]}"""
+
+FEEDBACK_SYSTEM_INSTRUCTION = """Eres un tutor que escribe el feedback general de un quiz ya calificado. Cada pregunta llega como JSON con: q=enunciado, pts=puntos obtenidos, max=puntaje máximo, fb=feedback de la pregunta.
+- Máximo 4-5 oraciones, amigable y motivador; resume el desempeño, los puntos fuertes y las áreas de mejora.
+Responde solo con JSON: {"general_feedback":"..."}"""
+
+_GRADING_TYPES = {"text": "txt", "multiple option": "mc"}
+
+
+def compact_json(data: Any) -> str:
+    """JSON sin indentación ni espacios"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _compact_lines(items: List[Dict[str, Any]]) -> str:
+    return "\n".join(compact_json(item) for item in items)
+
+
+class PromptBuilder:
+    """
+    Construcción de prompts para generación y calificación.
+
+    Con PROMPT_ENCODING="compact" (por defecto) las reglas fijas van en una system
+    instruction constante y el prompt solo lleva los datos variables con claves
+    cortas, una entrada por línea y sin indentación. Con "legacy" se usan los
+    prompts originales y no hay system instruction.
+    """
+
+    @staticmethod
+    def is_compact() -> bool:
+        return settings.PROMPT_ENCODING != PROMPT_ENCODING_LEGACY
+
+    @staticmethod
+    def generation_system_instruction() -> Optional[str]:
+        return GENERATION_SYSTEM_INSTRUCTION if PromptBuilder.is_compact() else None
+
+    @staticmethod
+    def grading_system_instruction(general_feedback: bool = True) -> Optional[str]:
+        if not PromptBuilder.is_compact():
+            return None
+        return GRADING_SYSTEM_INSTRUCTION if general_feedback else SCORING_SYSTEM_INSTRUCTION
+
+    @staticmethod
+    def feedback_system_instruction() -> Optional[str]:
+        return FEEDBACK_SYSTEM_INSTRUCTION if PromptBuilder.is_compact() else None
+
+    @staticmethod
+    def compact_competences(competences: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Deja solo id, nombre y descripción de cada competencia, sin repetidas
+        (mismo id, o mismo nombre y descripción), conservando el primer orden.
+        """
+        seen_ids = set()
+        seen_texts = set()
+        compact = []
+        for competence in competences:
+            if not isinstance(competence, dict) or competence.get("id") in seen_ids:
+                continue
+            name = " ".join(str(competence.get("name") or "").split())
+            description = " ".join(str(competence.get("description") or "").split())
+            if (name, description) in seen_texts and (name or description):
+                continue
+            seen_ids.add(competence.get("id"))
+            seen_texts.add((name, description))
+            entry = {"id": competence.get("id"), "n": name}
+            if description:
+                entry["d"] = description
+            compact.append(entry)
+        return compact
+
+    @staticmethod
+    def _avoid_note(params: Dict[str, Any], section_note: Optional[str]) -> Optional[str]:
+        """Agrega a la nota las preguntas que el quiz ya incluye (p. ej. tomadas del banco)"""
+        avoid = params.get("avoid_statements")
+        if not avoid:
+            return section_note
+        lines = [section_note] if section_note else []
+        lines += ["El quiz ya incluye estas preguntas; no las repitas:", *(f"- {statement}" for statement in avoid)]
+        return "\n".join(lines)
+
+    @staticmethod
+    def generation_prompt(params: Dict[str, Any], section_note: Optional[str] = None) -> str:
+        section_note = PromptBuilder._avoid_note(params, section_note)
+        if not PromptBuilder.is_compact():
+            return PromptBuilder._legacy_generation_prompt(params, section_note)
+
+        lines = [f"Genera un quiz de {params['num_question']} preguntas sobre el documento adjunto."]
+        if params.get("text"):
+            lines.append(f"Tema o restricciones: {params['text']}")
+        if section_note:
+            lines.append(section_note)
+        lines += [
+            f"Total de puntos: {params['point_max']}",
+            f"Tipos habilitados: {', '.join(params['enabled_question_types'])}",
+            f"classroom_id: {params['classroom_id']}",
+            f"start_time: {params['current_time'].isoformat()}Z",
+            f"end_time: {params['end_time'].isoformat()}Z",
+            "Competencias:",
+            _compact_lines(PromptBuilder.compact_competences(params["competences"])),
+        ]
+        return "\n".join(lines)
+
+    @staticmethod
+    def variants_note(num_variants: int, blueprint: Optional[List[Dict[str, Any]]] = None, existing: Optional[List[str]] = None) -> str:
+        """
+        Indicación para generar 'num_variants' variantes paralelas en "variants".
+        'blueprint' fija por posición los puntos (p), el formato (f) y las
+        competencias (c) de todas las variantes; 'existing'
+        son enunciados de variantes anteriores que no se deben repetir.
+        """
+        lines = [
+            f'Genera {num_variants} variantes distintas del quiz en "variants", cada una con sus propias preguntas: '
+            f"ninguna pregunta se repite ni se reformula entre variantes. La pregunta en la posición i de cada variante "
+            f"evalúa las mismas competencias, con el mismo formato de respuesta y los mismos puntos en todas las variantes."
+        ]
+        if blueprint:
+            lines += [
+                "Estructura obligatoria por posición (p=puntos, f=formato: mc opción múltiple o txt texto libre, "
+                "c=IDs exactos de las competencias que evalúa):",
+                _compact_lines(blueprint),
+            ]
+        if existing:
+            lines += ["No repitas estos enunciados:", *(f"- {statement}" for statement in existing)]
+        return "\n".join(lines)
+
+    @staticmethod
+    def repair_prompt(invalid, valid_questions: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+        """Prompt para regenerar solo las preguntas inválidas; 'invalid' es [(posición, pregunta, motivo)]"""
+        if not PromptBuilder.is_compact():
+            return PromptBuilder._legacy_repair_prompt(invalid, valid_questions, params)
+
+        lines = [
+            f"Estas preguntas generadas son inválidas; genera exactamente {len(invalid)} preguntas nuevas que las "
+            f"reemplacen, sobre el mismo contenido, sin repetir las existentes. Responde solo con la lista JSON.",
+            "Inválidas (pregunta -> motivo):",
+            *(f"{compact_json(q)[:800]} -> {reason}" for _, q, reason in invalid),
+            "Existentes:",
+            *(f"- {q['statement']}" for q in valid_questions),
+            f"Tipos habilitados: {', '.join(params['enabled_question_types'])}",
+            "Competencias:",
+            _compact_lines(PromptBuilder.compact_competences(params["competences"])),
+        ]
+        return "\n".join(lines)
+
+    @staticmethod
+    def pregraded_note(num_questions: int, points: int, max_points: int) -> str:
+        """Resumen de las preguntas ya calificadas localmente, para que el feedback general las considere"""
+        return (
+            f"Además, {num_questions} preguntas ya fueron calificadas automáticamente (no las evalúes): "
+            f"el estudiante obtuvo {points} de {max_points} puntos en ellas. Tenlo en cuenta en el feedback general."
+        )
+
+    @staticmethod
+    def grading_prompt(quiz_title: str, quiz_instruction: Optional[str], total_points: int, questions: List[Dict[str, Any]], note: Optional[str] = None) -> str:
+        """
+        'questions' son los datos que arma process_student_submission (question_id,
+        statement, correct_answer, question_type, student_answer, max_points).
+        """
+        if not PromptBuilder.is_compact():
+            prompt = PromptBuilder._legacy_grading_prompt(quiz_title, quiz_instruction, total_points, questions)
+            return f"{prompt}\n        {note}\n" if note else prompt
+
+        encoded = [
+            {
+                "id": q["question_id"],
+                "q": q["statement"],
+                "ref": q["correct_answer"],
+                "t": _GRADING_TYPES.get(q["question_type"], q["question_type"]),
+                "ans": q["student_answer"],
+                "max": q["max_points"],
+            }
+            for q in questions
+        ]
+        lines = [f"Quiz: {quiz_title}"]
+        if quiz_instruction:
+            lines.append(f"Instrucciones: {quiz_instruction}")
+        lines.append(f"Puntaje total: {total_points}")
+        if note:
+            lines.append(note)
+        lines += ["Preguntas:", _compact_lines(encoded)]
+        return "\n".join(lines)
+
+    @staticmethod
+    def general_feedback_prompt(quiz_title: str, quiz_instruction: Optional[str], points: int, total_points: int, questions: List[Dict[str, Any]]) -> str:
+        """
+        Feedback general de una entrega ya calificada. 'questions' lleva statement,
+        points_obtained, max_points y feedback de cada pregunta.
+        """
+        encoded = [
+            {"q": q["statement"], "pts": q["points_obtained"], "max": q["max_points"], "fb": q["feedback"]}
+            for q in questions
+        ]
+        lines = [f"Quiz: {quiz_title}"]
+        if quiz_instruction:
+            lines.append(f"Instrucciones: {quiz_instruction}")
+        lines += [f"Puntaje obtenido: {points} de {total_points}", "Preguntas:", _compact_lines(encoded)]
+        if not PromptBuilder.is_compact():
+            # Sin system instruction: las reglas van al inicio del prompt
+            lines.insert(0, FEEDBACK_SYSTEM_INSTRUCTION)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _legacy_generation_prompt(params: Dict[str, Any], section_note: Optional[str] = None) -> str:
+        num_question = params["num_question"]
+        point_max = params["point_max"]
+        enabled_question_types = params["enabled_question_types"]
+        competences_str = json.dumps(params["competences"], ensure_ascii=False)
+        current_time = params["current_time"]
+        end_time = params["end_time"]
+        topic_line = (
+            f"\n            Lo que usaras como resticciones o tema principal para elaboar el quiz es {params['text']}"
+            if params.get("text") else ""
+        )
+        if section_note:
+            topic_line += f"\n            {section_note}"
+
+        # Definir el prompt para Gemini con las nuevas restricciones
+        return f"""
+            Analiza el contenido del documento PDF adjunto en profundidad. Tu tarea es generar un quiz educativo con {num_question} preguntas, siguiendo las siguientes directrices y restricciones estrictas:{topic_line}
+
+            **Directrices Generales:**
+            1.  El quiz debe tener un **título** y una **instrucción general** relevante al contenido del PDF.
+            2.  **Puntos Totales:** La suma total de los "points" de todas las preguntas generadas debe ser **igual o muy cercana a {point_max}**. Distribuye los puntos de manera que se ajuste a este total.
+            3.  **Distribución de Preguntas:**
+                -   Genera preguntas únicamente de los tipos habilitados en `type_question`: {', '.join(enabled_question_types)}.
+                -   Asegura una **distribución lo más equitativa y uniforme posible** de los {num_question} preguntas entre los **tipos de pregunta habilitados** (textuales, inferenciales, críticas) y también entre los **formatos de respuesta** (**"base_text"** para respuestas de texto libre, y **"base_multiple_option"** para opción múltiple).
+                -   Si un tipo de pregunta o formato de respuesta no está habilitado, **no lo uses**.
+            4.  **Combinación de Competencias:** Para cada pregunta, es **IMPERATIVO** que selecciones **múltiples competencias** (idealmente 2 o más si es relevante y posible) de la lista proporcionada. La selección debe basarse en la afinidad fuerte de la pregunta con la 'description' y 'name' de **todas las competencias seleccionadas**. Busca conectar conceptos en la pregunta con varias áreas de competencia.
+
+            **Estructura de Cada Pregunta:**
+            Para cada pregunta, incluye los siguientes campos exactos y con sus tipos de datos correctos:
+            -   **"statement"**: El enunciado claro y conciso de la pregunta.
+            -   **"answer_correct"**:
+                -   Si `answer_base.type` es "base_text", esta es la respuesta completa y correcta a la pregunta abierta.
+                -   Si `answer_base.type` es "base_multiple_option", esta debe ser **exactamente uno de los textos de las opciones proporcionadas** en la lista `options`.
+            -   **"points"**: Un valor numérico entero y positivo para la pregunta. La suma de estos puntos debe ajustarse a `point_max`.
+            -   **"answer_base"**: Un objeto JSON con los detalles del formato de respuesta:
+                -   **"type"**: Un string que debe ser **"base_text"** o **"base_multiple_option"**.
+                -   **"options"**: (SOLO si "type" es "base_multiple_option") Una lista de strings que contienen las posibles opciones de respuesta. Debe haber **entre 3 y 5 opciones**, y una de ellas debe ser la `answer_correct`.
+            -   **"competences_id"**: Una **lista de números enteros** (IDs) de las competencias relevantes para la pregunta. Estos IDs deben ser tomados **EXCLUSIVAMENTE** del listado de competencias que te proporciono.
+
+            **Listado de Competencias Disponibles:**
+            {competences_str}
+
+            **Formato de Salida Requerido (JSON Exacto):**
+            Devuelve **SOLO un objeto JSON** que siga este formato exacto, sin ningún texto adicional, explicaciones, o bloques de código que no sean el propio JSON, ni antes ni después.
+
+            ```json
+            {{
+                "classroom_id": {params["classroom_id"]},
+                "title": "Un título descriptivo para el quiz",
+                "instruction": "Instrucciones claras para los estudiantes sobre cómo completar el quiz.",
+                "start_time": "{current_time.isoformat()}Z",
+                "end_time": "{end_time.isoformat()}Z",
+                "questions": [
+                    {{
+                        "statement": "Enunciado de la primera pregunta, combinando tipos y competencias.",
+                        "answer_correct": "Respuesta correcta para esta pregunta.",
+                        "points": 10,
+                        "answer_base": {{
+                            "type": "base_text"
+                        }},
+                        "competences_id": [1, 2]
+                    }},
+                    {{
+                        "statement": "Pregunta de opción múltiple con enfoque crítico y varias competencias.",
+                        "answer_correct": "Opción Correcta A",
+                        "points": 10,
+                        "answer_base": {{
+                            "type": "base_multiple_option",
+                            "options": [
+                                "Opción Correcta A",
+                                "Opción Incorrecta B",
+                                "Opción Incorrecta C"
+                            ]
+                        }},
+                        "competences_id": [2]
+                    }}
+                    // ... más preguntas hasta alcanzar num_question y sume point_max
+                ]
+            }}
+            ```
+            Asegúrate de que `start_time` y `end_time` sean fechas y horas ISO 8601 válidas (sin terminacion Z), reflejando el momento actual y una hora después, respectivamente. La calidad de las preguntas, la correcta asignación de puntos para sumar {point_max} y la combinación de competencias es fundamental.
+            """
+
+    @staticmethod
+    def _legacy_repair_prompt(invalid, valid_questions: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+        problems = "\n".join(
+            f"- {json.dumps(q, ensure_ascii=False)[:800]} -> {reason}" for _, q, reason in invalid
+        )
+        existing = "\n".join(f"- {q['statement']}" for q in valid_questions)
+        competences_str = json.dumps(params["competences"], ensure_ascii=False)
+        return f"""
+            Estas preguntas generadas para un quiz son inválidas:
+            {problems}
+
+            Genera exactamente {len(invalid)} preguntas nuevas que las reemplacen, sobre el mismo contenido adjunto,
+            de los tipos habilitados ({', '.join(params['enabled_question_types'])}) y sin repetir estas preguntas existentes:
+            {existing or '- (ninguna)'}
+
+            Cada pregunta debe tener "statement", "answer_correct", "points" (entero positivo), "answer_base"
+            ("type" igual a "base_text" o "base_multiple_option"; si es opción múltiple, "options" con entre 3 y 5
+            opciones y "answer_correct" debe ser exactamente una de ellas) y "competences_id" con IDs tomados
+            exclusivamente de este listado: {competences_str}
+
+            Devuelve SOLO una lista JSON de preguntas.
+            """
+
+    @staticmethod
+    def _legacy_grading_prompt(quiz_title: str, quiz_instruction: Optional[str], total_points: int, questions: List[Dict[str, Any]]) -> str:
+        return f"""
+        Como un evaluador inteligente para un sistema de quizzes, tu tarea es analizar un conjunto de preguntas y las respuestas de un estudiante, y luego proporcionar un feedback general sobre el desempeño del estudiante en todo el quiz.
+
+        Para cada pregunta individual, debes proporcionar:
+        1. Una evaluación del porcentaje de corrección de la respuesta del estudiante (un número entero entre 0 y 100).
+        2. Un feedback conciso y constructivo para el estudiante (máximo 2-3 oraciones).
+
+        Las preguntas de tipo "text" requieren una evaluación más profunda de la coherencia, precisión y exhaustividad de la respuesta del estudiante con respecto a la respuesta correcta esperada.
+        Las preguntas de tipo "multiple option" son de evaluación binaria: 100% si la respuesta es idéntica a la correcta, 0% si no lo es.
+
+        Finalmente, genera un **feedback general** para el estudiante sobre todo el quiz. Este feedback general debe ser conciso (máximo 4-5 oraciones), amigable, motivador, y resumir el desempeño general, destacando puntos fuertes y áreas de mejora.
+
+        La salida debe ser un objeto JSON que contenga dos campos principales:
+        - `evaluations`: Una lista de objetos, donde cada objeto representa una pregunta evaluada con los campos:
+            - `question_id`: El ID de la pregunta.
+            - `percentage_correct`: El porcentaje de corrección de la respuesta del estudiante (0-100).
+            - `feedback`: El feedback constructivo para la pregunta.
+        - `general_feedback`: Una cadena de texto con el feedback general del quiz.
+
+        ---
+        Detalles del Quiz:
+        Título del Quiz: "{quiz_title}"
+        Instrucciones del Quiz: "{quiz_instruction or 'No se proporcionaron instrucciones.'}"
+        Puntuación Total Posible (calculada de las preguntas): {total_points}
+
+        Lista de Preguntas y Respuestas del Estudiante a Evaluar:
+        {json.dumps(questions, indent=2, ensure_ascii=False)}
+        ---
+
+        Formato de Salida JSON:
+        {{
+            "evaluations": [
+                {{
+                    "question_id": 1,
+                    "percentage_correct": 85,
+                    "feedback": "Tu respuesta es muy completa pero faltó mencionar el punto clave de X. Buen trabajo."
+                }},
+                {{
+                    "question_id": 2,
+                    "percentage_correct": 100,
+                    "feedback": "¡Correcto! Excelente selección de la opción."
+                }}
+            ],
+            "general_feedback": "¡Buen trabajo en el quiz! Demostraste un buen entendimiento general, especialmente en las preguntas de opción múltiple. Para mejorar aún más, enfócate en desarrollar respuestas más completas para las preguntas de texto."
+        }}
+        """
@@ -0,0 +1,125 @@
+from functools import lru_cache
+from typing import Any, Dict, Type
+
+from pydantic import BaseModel
+
+from schemas.quiz import QuizGenerationOutput, QuestionOutput
+
+# Subconjunto de OpenAPI que acepta Gemini en 'response_schema'
+_SUPPORTED_KEYS = {"type", "format", "description", "nullable", "enum", "properties", "required", "items"}
+
+
+def _resolve(node: Any, defs: Dict[str, Any]) -> Any:
+    if isinstance(node, list):
+        return [_resolve(item, defs) for item in node]
+    if not isinstance(node, dict):
+        return node
+
+    if "$ref" in node:
+        return _resolve(defs[node["$ref"].split("/")[-1]], defs)
+
+    # Optional[X] llega como anyOf [X, null]: Gemini lo expresa con 'nullable'
+    if "anyOf" in node:
+        options = [option for option in node["anyOf"] if option.get("type") != "null"]
+        resolved = _resolve(options[0], defs) if options else {"type": "STRING"}
+        if len(options) < len(node["anyOf"]):
+            resolved = {**resolved, "nullable": True}
+        if "description" in node:
+            resolved = {**resolved, "description": node["description"]}
+        return resolved
+
+    schema = {}
+    for key, value in node.items():
+        if key not in _SUPPORTED_KEYS:
+            continue
+        if key == "type":
+            schema["type"] = value.upper()
+        elif key == "properties":
+            schema["properties"] = {name: _resolve(prop, defs) for name, prop in value.items()}
+        elif key == "items":
+            schema["items"] = _resolve(value, defs)
+        else:
+            schema[key] = value
+    return schema
+
+
+def gemini_response_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Convierte el JSON Schema de un modelo Pydantic al formato de 'response_schema'
+    de Gemini: resuelve las referencias ($defs), traduce Optional a 'nullable' y
+    elimina las claves que la API no soporta (title, default, restricciones...).
+    """
+    json_schema = model.model_json_schema()
+    return _resolve(json_schema, json_schema.get("$defs", {}))
+
+
+@lru_cache()
+def quiz_response_schema() -> Dict[str, Any]:
+    """Schema de salida para la generación de un quiz completo"""
+    return gemini_response_schema(QuizGenerationOutput)
+
+
+@lru_cache()
+def grading_response_schema(general_feedback: bool = True) -> Dict[str, Any]:
+    """Schema de salida para la calificación de una entrega (sin 'general_feedback' si se genera aparte)"""
+    if not general_feedback:
+        schema = dict(grading_response_schema(True))
+        schema["properties"] = {"evaluations": schema["properties"]["evaluations"]}
+        schema["required"] = ["evaluations"]
+        return schema
+    return {
+        "type": "OBJECT",
+        "properties": {
+            "evaluations": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "question_id": {"type": "INTEGER"},
+                        "percentage_correct": {"type": "INTEGER"},
+                        "feedback": {"type": "STRING"},
+                    },
+                    "required": ["question_id", "percentage_correct", "feedback"],
+                },
+            },
+            "general_feedback": {"type": "STRING"},
+        },
+        "required": ["evaluations", "general_feedback"],
+    }
+
+
+@lru_cache()
+def general_feedback_response_schema() -> Dict[str, Any]:
+    """Schema de salida para el feedback general de una entrega ya calificada"""
+    return {
+        "type": "OBJECT",
+        "properties": {"general_feedback": {"type": "STRING"}},
+        "required": ["general_feedback"],
+    }
+
+
+@lru_cache()
+def variants_response_schema() -> Dict[str, Any]:
+    """Schema de salida para generar varias variantes del quiz en una sola llamada"""
+    return {
+        "type": "OBJECT",
+        "properties": {
+            "title": {"type": "STRING"},
+            "instruction": {"type": "STRING"},
+            "variants": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {"questions": {"type": "ARRAY", "items": gemini_response_schema(QuestionOutput)}},
+                    "required": ["questions"],
+                },
+            },
+        },
+        "required": ["title", "instruction", "variants"],
+    }
+
+
+@lru_cache()
+def questions_response_schema() -> Dict[str, Any]:
+    """Schema de salida para regenerar solo una lista de preguntas"""
+    return {"type": "ARRAY", "items": gemini_response_schema(QuestionOutput)}
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from config.settings import get_settings
+from core.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+metrics.describe("read_cache_total", "Lecturas de la caché de lectura por espacio y resultado (hit, miss, shared, error o cancelled)")
+metrics.describe("read_cache_entries", "Entradas vigentes en la caché de lectura")
+
+# Las claves son tuplas cuyo primer elemento es el espacio, p. ej. ("quiz_detail", 12)
+CacheKey = Tuple[Hashable, ...]
+
+
+class ReadCache:
+    """
+    Caché de lectura en memoria del proceso con TTL y single-flight.
+
+    Cada entrada vence a los READ_CACHE_TTL_S segundos (o el TTL indicado) y, al
+    superar READ_CACHE_MAX_ENTRIES, se descarta la menos usada. Si varias
+    peticiones piden a la vez una clave ausente, solo la primera ejecuta el
+    loader y las demás esperan su resultado (o su error), así el inicio de un
+    quiz no produce cientos de consultas idénticas. Las escrituras del servicio
+    invalidan lo que cambian; el TTL acota lo que otra instancia pueda tener
+    desactualizado.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._pending: Dict[CacheKey, asyncio.Future] = {}
+        # Cargas en curso invalidadas después de empezar: su resultado se entrega a
+        # quienes lo esperan pero no se guarda. Solo se marcan las claves afectadas
+        self._stale: Set[CacheKey] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: CacheKey, value: Any, ttl_s: Optional[float] = None) -> None:
+        ttl_s = settings.READ_CACHE_TTL_S if ttl_s is None else ttl_s
+        self._entries[key] = (time.monotonic() + ttl_s, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.READ_CACHE_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+        metrics.set("read_cache_entries", len(self._entries))
+
+    async def get_or_load(self, key: CacheKey, loader: Callable[[], Awaitable[Any]], ttl_s: Optional[float] = None) -> Any:
+        """Valor de la clave, cargándolo con 'loader' una sola vez aunque lleguen varias peticiones a la vez"""
+        namespace = key[0]
+        if not settings.READ_CACHE_ENABLED:
+            return await loader()
+
+        value = self.get(key)
+        if value is not None:
+            metrics.inc("read_cache_total", namespace=namespace, result="hit")
+            return value
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            metrics.inc("read_cache_total", namespace=namespace, result="shared")
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Se canceló la petición que estaba cargando (no esta): se vuelve a intentar
+                if not pending.cancelled():
+                    raise
+                return await self.get_or_load(key, loader, ttl_s)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # La cancelación es de esta petición (cliente desconectado, timeout): no se
+            # pasa a las demás, que reintentan la carga al ver el futuro cancelado
+            metrics.inc("read_cache_total", namespace=namespace, result="cancelled")
+            future.cancel()
+            raise
+        except BaseException as e:
+            metrics.inc("read_cache_total", namespace=namespace, result="error")
+            future.set_exception(e)
+            # Evita el aviso de "exception was never retrieved" si nadie más esperaba
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+            stale = key in self._stale
+            self._stale.discard(key)
+
+        metrics.inc("read_cache_total", namespace=namespace, result="miss")
+        future.set_result(value)
+        if value is not None and not stale:
+            self.set(key, value, ttl_s)
+        return value
+
+    def invalidate(self, key: CacheKey) -> None:
+        if key in self._pending:
+            self._stale.add(key)
+        self._entries.pop(key, None)
+        metrics.set("read_cache_entries", len(self._entries))
+
+    def invalidate_namespace(self, namespace: Hashable) -> None:
+        self._stale.update(key for key in self._pending if key[0] == namespace)
+        for key in [key for key in self._entries if key[0] == namespace]:
+            self._entries.pop(key, None)
+        metrics.set("read_cache_entries", len(self._entries))
+
+    def clear(self) -> None:
+        self._stale.update(self._pending)
+        self._entries.clear()
+        metrics.set("read_cache_entries", 0)
+
+
+read_cache = ReadCache()
@@ -0,0 +1,131 @@
+import bisect
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple, Any, List, Sequence
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+# Límites por defecto de los histogramas (segundos)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+
+def _label_set(labels: Dict[str, Any]) -> LabelSet:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(label_set: LabelSet) -> str:
+    if not label_set:
+        return ""
+    escaped = (
+        '{}="{}"'.format(key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in label_set
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Registro en memoria de métricas del microservicio (contadores, gauges e histogramas).
+
+    Las métricas se exponen en formato de texto de Prometheus en /metrics.
+    Es por proceso: con varios workers de uvicorn cada uno reporta lo suyo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelSet, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[LabelSet, float]] = defaultdict(dict)
+        self._histograms: Dict[str, Dict[LabelSet, _Histogram]] = defaultdict(dict)
+        self._buckets: Dict[str, Sequence[float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str, buckets: Sequence[float] = None) -> None:
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Incrementa un contador"""
+        with self._lock:
+            self._counters[name][_label_set(labels)] += value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Fija el valor de un gauge"""
+        with self._lock:
+            self._gauges[name][_label_set(labels)] = value
+
+    def add(self, name: str, value: float, **labels) -> None:
+        """Suma (o resta) al valor de un gauge"""
+        with self._lock:
+            label_set = _label_set(labels)
+            self._gauges[name][label_set] = self._gauges[name].get(label_set, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Registra una observación en un histograma"""
+        with self._lock:
+            series = self._histograms[name]
+            label_set = _label_set(labels)
+            if label_set not in series:
+                series[label_set] = _Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+            series[label_set].observe(value)
+
+    def get(self, name: str, **labels) -> float:
+        with self._lock:
+            label_set = _label_set(labels)
+            if name in self._gauges:
+                return self._gauges[name].get(label_set, 0)
+            return self._counters.get(name, {}).get(label_set, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Copia de los contadores y gauges para respuestas JSON"""
+        with self._lock:
+            return {
+                name: {_format_labels(label_set) or "total": value for label_set, value in series.items()}
+                for source in (self._counters, self._gauges)
+                for name, series in source.items()
+            }
+
+    def _header(self, lines: List[str], name: str, metric_type: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for source, metric_type in ((self._counters, "counter"), (self._gauges, "gauge")):
+                for name in sorted(source):
+                    self._header(lines, name, metric_type)
+                    for label_set, value in sorted(source[name].items()):
+                        lines.append(f"{name}{_format_labels(label_set)} {value:g}")
+
+            for name in sorted(self._histograms):
+                self._header(lines, name, "histogram")
+                for label_set, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        bucket_labels = _format_labels(label_set + (("le", f"{bound:g}"),))
+                        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(label_set + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(label_set)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(label_set)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -1,38 +1,135 @@
 import PyPDF2
 import io
+import re
+import asyncio
 import logging
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional
+
+from config.settings import get_settings
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Pool de procesos compartido: PyPDF2 es CPU-bound y bloquearía el event loop
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(\w)")
+_SPACES_RE = re.compile(r"[ \t\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        max_workers = settings.PDF_EXTRACTION_WORKERS or None  # None = número de CPUs
+        _process_pool = ProcessPoolExecutor(max_workers=max_workers)
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Libera los procesos de extracción (se llama al apagar la aplicación)"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _compact_text(text: str) -> str:
+    """Elimina espacios redundantes y une palabras cortadas por guion al final de línea"""
+    text = _HYPHEN_BREAK_RE.sub(r"\1\2", text)
+    text = _SPACES_RE.sub(" ", text)
+    text = _BLANK_LINES_RE.sub("\n", text)
+    return "\n".join(line.strip() for line in text.splitlines()).strip()
+
+
+def _count_pages(file_content: bytes) -> int:
+    return len(PyPDF2.PdfReader(io.BytesIO(file_content)).pages)
+
+
+def _extract_page_range(file_content: bytes, start: int, end: int, compact: bool) -> List[str]:
+    # Se ejecuta en un proceso del pool: cada tarea abre su propio lector
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    pages = []
+    for page_num in range(start, end):
+        text = pdf_reader.pages[page_num].extract_text() or ""
+        pages.append(_compact_text(text) if compact else text)
+    return pages
+
 
 class PDFExtractor:
     """
     Clase para extraer texto de archivos PDF
     """
-    
+
     @staticmethod
-    async def extract_text_from_pdf(file_content: bytes) -> str:
+    async def iter_pages(file_content: bytes, compact: bool = True) -> AsyncIterator[str]:
         """
-        Extrae el texto de un archivo PDF proporcionado como bytes
-        
+        Extrae el texto del PDF página por página en el pool de procesos.
+
+        Los bloques de páginas se procesan en paralelo y se entregan en orden
+        a medida que terminan, sin esperar al documento completo.
+
         Args:
             file_content: Contenido del archivo PDF en bytes
-            
-        Returns:
-            Texto extraído del PDF
+            compact: Si se debe compactar el texto (espacios, guiones de corte)
+
+        Yields:
+            Texto de cada página en orden
         """
+        loop = asyncio.get_running_loop()
+        pool = _get_process_pool()
+
+        try:
+            num_pages = await loop.run_in_executor(pool, _count_pages, file_content)
+        except Exception as e:
+            logger.error(f"Error extrayendo texto del PDF: {str(e)}")
+            raise
+
+        pages_per_task = max(1, settings.PDF_PAGES_PER_TASK)
+        futures = [
+            loop.run_in_executor(
+                pool, _extract_page_range, file_content, start, min(start + pages_per_task, num_pages), compact
+            )
+            for start in range(0, num_pages, pages_per_task)
+        ]
+
         try:
-            # Crear un objeto de lectura de PDF a partir de los bytes
-            pdf_file = io.BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            # Extraer texto de cada página
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
-                
-            return text
+            for future in futures:
+                for page_text in await future:
+                    yield page_text
         except Exception as e:
             logger.error(f"Error extrayendo texto del PDF: {str(e)}")
             raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    async def extract_pages(file_content: bytes, compact: bool = True) -> List[str]:
+        """
+        Extrae el texto de todas las páginas del PDF
+
+        Args:
+            file_content: Contenido del archivo PDF en bytes
+            compact: Si se debe compactar el texto
+
+        Returns:
+            Lista con el texto de cada página
+        """
+        return [page async for page in PDFExtractor.iter_pages(file_content, compact=compact)]
+
+    @staticmethod
+    async def extract_text_from_pdf(file_content: bytes, compact: bool = False) -> str:
+        """
+        Extrae el texto de un archivo PDF proporcionado como bytes
+
+        Args:
+            file_content: Contenido del archivo PDF en bytes
+            compact: Si se debe compactar el texto extraído
+
+        Returns:
+            Texto extraído del PDF
+        """
+        pages = await PDFExtractor.extract_pages(file_content, compact=compact)
+        return "".join(page + "\n\n" for page in pages)
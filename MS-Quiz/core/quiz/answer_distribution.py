@@ -0,0 +1,94 @@
+import json
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db.models.quiz import Quiz, Question, Base_Multiple_Option, Option_Answer_Count
+
+logger = logging.getLogger(__name__)
+
+# (question_id, opción elegida) -> cambio en la cantidad de estudiantes
+OptionDeltas = Counter
+
+
+class AnswerDistributionService:
+    """
+    Distribución de respuestas por opción de las preguntas de opción múltiple.
+
+    Los contadores de 'option_answer_counts' se actualizan con un solo upsert por
+    entrega dentro de la transacción de process_student_submission, así la
+    lectura de un quiz completo cuesta O(opciones) y no recorre las entregas.
+    """
+
+    @staticmethod
+    async def apply_deltas(db: AsyncSession, quiz_id: int, deltas: OptionDeltas) -> None:
+        """Suma (o resta) los cambios a los contadores. No hace commit"""
+        rows = [
+            {"quiz_id": quiz_id, "id_question": question_id, "option_select": option, "count": delta}
+            for (question_id, option), delta in deltas.items()
+            if delta and option is not None
+        ]
+        if not rows:
+            return
+        stmt = insert(Option_Answer_Count).values(rows)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[Option_Answer_Count.quiz_id, Option_Answer_Count.id_question, Option_Answer_Count.option_select],
+                set_={"count": Option_Answer_Count.count + stmt.excluded.count},
+            )
+        )
+
+    @staticmethod
+    async def get_quiz_distribution(db: AsyncSession, quiz_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Distribución de cada pregunta de opción múltiple del quiz, con las opciones
+        no elegidas en 0 y en el orden en que se definieron. Retorna None si el quiz no existe.
+        """
+        questions = (await db.execute(
+            select(Quiz.id, Question.id, Base_Multiple_Option.options)
+            .select_from(Quiz)
+            .outerjoin(Question, Question.quiz_id == Quiz.id)
+            .outerjoin(Base_Multiple_Option, Base_Multiple_Option.id == Question.id_answer)
+            .where(Quiz.id == quiz_id)
+            .order_by(Question.id)
+        )).all()
+        if not questions:
+            return None
+
+        counts: Dict[int, Dict[str, int]] = defaultdict(dict)
+        result = await db.execute(
+            select(Option_Answer_Count.id_question, Option_Answer_Count.option_select, Option_Answer_Count.count)
+            .where(Option_Answer_Count.quiz_id == quiz_id)
+        )
+        for question_id, option, count in result.all():
+            counts[question_id][option] = count
+
+        output = []
+        for _, question_id, options_json in questions:
+            if question_id is None or options_json is None:
+                continue
+            try:
+                options = json.loads(options_json)
+            except json.JSONDecodeError:
+                options = []
+            question_counts = counts.get(question_id, {})
+            # Opciones elegidas que ya no están en la pregunta (p. ej. se editó) al final
+            ordered = list(options) + sorted(option for option in question_counts if option not in options)
+            total = sum(max(0, count) for count in question_counts.values())
+            output.append({
+                "question_id": question_id,
+                "total_answers": total,
+                "options": [
+                    {
+                        "option": option,
+                        "count": max(0, question_counts.get(option, 0)),
+                        "percentage": round(100 * max(0, question_counts.get(option, 0)) / total, 2) if total else 0.0,
+                    }
+                    for option in ordered
+                ],
+            })
+        return {"quiz_id": quiz_id, "questions": output}
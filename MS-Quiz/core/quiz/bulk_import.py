@@ -0,0 +1,358 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import get_settings
+from core.metrics import metrics
+from core.quiz.question_index import question_index
+from core.quiz.quiz_service import QuizService
+from schemas.quiz import QuizCreateInput, QuizImportOutput, QuizImportErrorOutput, QuizImportItemOutput
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMAT_NDJSON = "ndjson"
+IMPORT_FORMAT_CSV = "csv"
+IMPORT_FORMATS = (IMPORT_FORMAT_NDJSON, IMPORT_FORMAT_CSV)
+
+ANSWER_BASE_TYPES = ("base_text", "base_multiple_option")
+
+# Columnas del CSV: una fila por pregunta; las filas consecutivas con el mismo 'quiz_key' forman un quiz
+CSV_QUIZ_COLUMNS = ("quiz_key", "classroom_id", "title", "instruction", "start_time", "end_time")
+CSV_QUESTION_COLUMNS = ("statement", "answer_correct", "points", "answer_type", "options", "competences_id")
+
+metrics.describe("quiz_import_rows_total", "Filas (preguntas) de la importación masiva por resultado (imported o rejected)")
+metrics.describe("quiz_import_rows_per_second", "Preguntas por segundo de la última importación masiva")
+
+# Tablas de staging: viven solo durante la transacción de cada lote
+_CREATE_STAGING_SQL = (
+    """
+    CREATE TEMP TABLE import_quizzes (
+        row_key integer PRIMARY KEY,
+        id integer,
+        id_classroom integer NOT NULL,
+        title varchar(255) NOT NULL,
+        instruction text,
+        start_time timestamp,
+        end_time timestamp,
+        total_points integer NOT NULL
+    ) ON COMMIT DROP
+    """,
+    """
+    CREATE TEMP TABLE import_questions (
+        row_key integer PRIMARY KEY,
+        quiz_key integer NOT NULL,
+        id integer,
+        answer_base_id integer,
+        answer_type varchar(50) NOT NULL,
+        options text,
+        statement text NOT NULL,
+        answer_correct text,
+        points integer NOT NULL,
+        competences_id integer[]
+    ) ON COMMIT DROP
+    """,
+)
+
+_STAGING_QUIZ_COLUMNS = ("row_key", "id_classroom", "title", "instruction", "start_time", "end_time", "total_points")
+_STAGING_QUESTION_COLUMNS = ("row_key", "quiz_key", "answer_type", "options", "statement", "answer_correct", "points", "competences_id")
+
+# Los IDs se reservan de las secuencias en staging, así cada tabla se llena con un solo INSERT ... SELECT
+_LOAD_SQL = (
+    "UPDATE import_quizzes SET id = nextval(pg_get_serial_sequence('quizzes', 'id'))",
+    """
+    UPDATE import_questions SET
+        id = nextval(pg_get_serial_sequence('questions', 'id')),
+        answer_base_id = nextval(pg_get_serial_sequence('answer_bases', 'id'))
+    """,
+    """
+    INSERT INTO quizzes (id, id_classroom, title, instruction, total_points, start_time, end_time, created_at, updated_at)
+    SELECT id, id_classroom, title, instruction, total_points, start_time, end_time, LOCALTIMESTAMP, LOCALTIMESTAMP
+    FROM import_quizzes ORDER BY row_key
+    """,
+    "INSERT INTO answer_bases (id, type) SELECT answer_base_id, answer_type FROM import_questions ORDER BY row_key",
+    "INSERT INTO base_texts (id) SELECT answer_base_id FROM import_questions WHERE answer_type = 'base_text'",
+    """
+    INSERT INTO base_multiple_options (id, options)
+    SELECT answer_base_id, options FROM import_questions WHERE answer_type = 'base_multiple_option'
+    """,
+    """
+    INSERT INTO questions (id, quiz_id, id_answer, statement, answer_correct, points, competences_id, created_at)
+    SELECT q.id, z.id, q.answer_base_id, q.statement, q.answer_correct, q.points, q.competences_id, LOCALTIMESTAMP
+    FROM import_questions q JOIN import_quizzes z ON z.row_key = q.quiz_key
+    ORDER BY q.row_key
+    """,
+)
+
+
+@dataclass
+class _ParsedQuiz:
+    """Un quiz del archivo con la línea de cada pregunta, validado o con sus errores"""
+    key: Optional[str]
+    line: int
+    question_lines: List[int] = field(default_factory=list)
+    quiz: Optional[QuizCreateInput] = None
+    errors: List[QuizImportErrorOutput] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return max(1, len(self.question_lines))
+
+
+def _parse_list(value: Optional[str], item_type=str) -> Optional[List[Any]]:
+    """Lista de una celda del CSV: JSON ("[1, 2]") o separada por '|'"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    if value.startswith("["):
+        return [item_type(item) for item in json.loads(value)]
+    return [item_type(item.strip()) for item in value.split("|") if item.strip()]
+
+
+class QuizImporter:
+    """
+    Importación masiva de quizzes desde NDJSON (un quiz por línea, con el formato
+    de /quiz/create y un 'key' opcional) o CSV (una pregunta por fila).
+
+    El archivo se lee y valida por lotes de unas IMPORT_BATCH_ROWS preguntas
+    (quizzes completos) fuera del event loop. Cada lote se carga en su propia
+    transacción: COPY de asyncpg a tablas temporales de staging y luego un
+    INSERT ... SELECT por tabla (quizzes, answer_bases, subtipos y questions),
+    sin flush por pregunta. Un quiz con cualquier fila inválida se rechaza
+    completo y sus errores se reportan por línea; si falla la carga de un lote,
+    sus quizzes se reportan como rechazados y se sigue con el siguiente.
+    """
+
+    @staticmethod
+    def _validate(parsed: _ParsedQuiz, data: Dict[str, Any]) -> _ParsedQuiz:
+        """Mismas reglas que create_full_quiz, con el error en la línea de la pregunta"""
+        def line_of(loc: Tuple[Any, ...]) -> int:
+            if len(loc) > 1 and loc[0] == "questions" and isinstance(loc[1], int) and loc[1] < len(parsed.question_lines):
+                return parsed.question_lines[loc[1]]
+            return parsed.line
+
+        def add_error(line: int, message: str) -> None:
+            parsed.errors.append(QuizImportErrorOutput(line=line, key=parsed.key, error=message))
+
+        try:
+            quiz = QuizCreateInput.model_validate(data)
+        except ValidationError as e:
+            for error in e.errors():
+                location = ".".join(str(part) for part in error["loc"])
+                add_error(line_of(error["loc"]), f"{location}: {error['msg']}")
+            return parsed
+
+        if not quiz.questions:
+            add_error(parsed.line, "El quiz no tiene preguntas.")
+        if quiz.start_time and quiz.end_time and quiz.start_time.replace(tzinfo=None) >= quiz.end_time.replace(tzinfo=None):
+            add_error(parsed.line, "La hora de inicio no puede ser igual o posterior a la hora de fin.")
+        for position, question in enumerate(quiz.questions):
+            line = line_of(("questions", position))
+            if not question.statement.strip():
+                add_error(line, "El enunciado no puede estar vacío.")
+            if question.answer_base.type not in ANSWER_BASE_TYPES:
+                add_error(line, f"Tipo de respuesta base '{question.answer_base.type}' no soportado.")
+            elif question.answer_base.type == "base_multiple_option" and not question.answer_base.options:
+                add_error(line, "Las opciones para 'base_multiple_option' no pueden estar vacías.")
+        if not parsed.errors:
+            parsed.quiz = quiz
+        return parsed
+
+    @staticmethod
+    def _iter_ndjson(stream: BinaryIO) -> Iterator[_ParsedQuiz]:
+        for line_number, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8-sig"), start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                if not isinstance(data, dict):
+                    raise ValueError("se esperaba un objeto JSON")
+            except ValueError as e:
+                parsed = _ParsedQuiz(key=None, line=line_number)
+                parsed.errors.append(QuizImportErrorOutput(line=line_number, error=f"JSON inválido: {e}"))
+                yield parsed
+                continue
+            key = data.pop("key", None)
+            questions = data.get("questions")
+            parsed = _ParsedQuiz(
+                key=str(key) if key is not None else None,
+                line=line_number,
+                question_lines=[line_number] * (len(questions) if isinstance(questions, list) else 0),
+            )
+            yield QuizImporter._validate(parsed, data)
+
+    @staticmethod
+    def _iter_csv(stream: BinaryIO) -> Iterator[_ParsedQuiz]:
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+        missing = {"quiz_key", "classroom_id", "title", "statement", "points", "answer_type"} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(missing))}.")
+
+        seen_keys = set()
+        current: Optional[_ParsedQuiz] = None
+        current_data: Dict[str, Any] = {}
+
+        def finish() -> _ParsedQuiz:
+            seen_keys.add(current.key)
+            if current.errors:
+                return current
+            return QuizImporter._validate(current, current_data)
+
+        for row in reader:
+            # Línea del archivo donde termina la fila (una celda entre comillas puede tener saltos de línea)
+            line_number = reader.line_num
+            key = (row.get("quiz_key") or "").strip()
+            if current is None or key != current.key:
+                if current is not None:
+                    yield finish()
+                current = _ParsedQuiz(key=key, line=line_number)
+                current_data = {name: (row.get(name) or None) for name in CSV_QUIZ_COLUMNS if name != "quiz_key"}
+                current_data["questions"] = []
+                if key in seen_keys:
+                    current.errors.append(QuizImportErrorOutput(line=line_number, key=key, error="Las filas de un quiz deben ser consecutivas."))
+            current.question_lines.append(line_number)
+            try:
+                current_data["questions"].append({
+                    "statement": row.get("statement") or "",
+                    "answer_correct": row.get("answer_correct") or None,
+                    "points": row.get("points"),
+                    "answer_base": {"type": row.get("answer_type"), "options": _parse_list(row.get("options"))},
+                    "competences_id": _parse_list(row.get("competences_id"), int) or [],
+                })
+            except ValueError as e:
+                current.errors.append(QuizImportErrorOutput(line=line_number, key=key, error=f"Lista inválida en 'options' o 'competences_id': {e}"))
+        if current is not None:
+            yield finish()
+
+    @staticmethod
+    def _next_batch(quizzes: Iterator[_ParsedQuiz]) -> List[_ParsedQuiz]:
+        """Quizzes completos hasta juntar unas IMPORT_BATCH_ROWS preguntas"""
+        batch: List[_ParsedQuiz] = []
+        rows = 0
+        for parsed in quizzes:
+            batch.append(parsed)
+            rows += parsed.rows
+            if rows >= settings.IMPORT_BATCH_ROWS:
+                break
+        return batch
+
+    @staticmethod
+    async def _load_batch(db: AsyncSession, quizzes: List[QuizCreateInput]) -> Tuple[List[int], List[int]]:
+        """Carga un lote con COPY + INSERT ... SELECT. Retorna (IDs de quizzes, IDs de preguntas) en orden"""
+        quiz_records = []
+        question_records = []
+        for quiz_key, quiz in enumerate(quizzes):
+            quiz_records.append((
+                quiz_key,
+                quiz.classroom_id,
+                quiz.title,
+                quiz.instruction,
+                quiz.start_time.replace(tzinfo=None) if quiz.start_time else None,
+                quiz.end_time.replace(tzinfo=None) if quiz.end_time else None,
+                sum(question.points for question in quiz.questions),
+            ))
+            for question in quiz.questions:
+                options = question.answer_base.options
+                question_records.append((
+                    len(question_records),
+                    quiz_key,
+                    question.answer_base.type,
+                    json.dumps(options) if question.answer_base.type == "base_multiple_option" else None,
+                    question.statement,
+                    question.answer_correct,
+                    question.points,
+                    question.competences_id or [],
+                ))
+
+        # El staging se crea desde SQLAlchemy, que abre la transacción; COPY usa la conexión asyncpg de esa transacción
+        connection = await db.connection()
+        for statement in _CREATE_STAGING_SQL:
+            await connection.exec_driver_sql(statement)
+        raw_connection = await connection.get_raw_connection()
+        driver = raw_connection.driver_connection
+        await driver.copy_records_to_table("import_quizzes", records=quiz_records, columns=_STAGING_QUIZ_COLUMNS)
+        await driver.copy_records_to_table("import_questions", records=question_records, columns=_STAGING_QUESTION_COLUMNS)
+        for statement in _LOAD_SQL:
+            await driver.execute(statement)
+        quiz_ids = [row["id"] for row in await driver.fetch("SELECT id FROM import_quizzes ORDER BY row_key")]
+        question_ids = [row["id"] for row in await driver.fetch("SELECT id FROM import_questions ORDER BY row_key")]
+        return quiz_ids, question_ids
+
+    @staticmethod
+    async def import_file(db: AsyncSession, stream: BinaryIO, import_format: str) -> QuizImportOutput:
+        """Importa todos los quizzes válidos del archivo y reporta los errores por línea"""
+        if import_format not in IMPORT_FORMATS:
+            raise ValueError(f"Formato no soportado: {import_format}. Usa {' o '.join(IMPORT_FORMATS)}.")
+        iterate = QuizImporter._iter_ndjson if import_format == IMPORT_FORMAT_NDJSON else QuizImporter._iter_csv
+        quizzes = iterate(stream)
+
+        started = time.monotonic()
+        report = QuizImportOutput(rows_read=0, quizzes_imported=0, questions_imported=0, quizzes_rejected=0)
+        # Las firmas del índice de casi duplicados de un lote se calculan mientras se carga el siguiente
+        indexing: Optional[asyncio.Task] = None
+        while True:
+            # Lectura, parseo y validación del lote fuera del event loop
+            batch = await asyncio.to_thread(QuizImporter._next_batch, quizzes)
+            if not batch:
+                break
+            valid = [parsed for parsed in batch if parsed.quiz is not None]
+            for parsed in batch:
+                report.rows_read += parsed.rows
+                if parsed.quiz is None:
+                    report.quizzes_rejected += 1
+                    metrics.inc("quiz_import_rows_total", parsed.rows, result="rejected")
+                    QuizImporter._add_errors(report, parsed.errors)
+            if not valid:
+                continue
+
+            try:
+                quiz_ids, question_ids = await QuizImporter._load_batch(db, [parsed.quiz for parsed in valid])
+                await db.commit()
+                for classroom_id in {parsed.quiz.classroom_id for parsed in valid}:
+                    QuizService.invalidate_quiz_cache(classroom_id=classroom_id)
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Fallo la carga de un lote de {len(valid)} quizzes: {e}", exc_info=True)
+                report.quizzes_rejected += len(valid)
+                metrics.inc("quiz_import_rows_total", sum(parsed.rows for parsed in valid), result="rejected")
+                QuizImporter._add_errors(report, [
+                    QuizImportErrorOutput(line=parsed.line, key=parsed.key, error=f"No se pudo cargar el lote: {e}") for parsed in valid
+                ])
+                continue
+
+            statements = [question.statement for parsed in valid for question in parsed.quiz.questions]
+            if indexing is not None:
+                await indexing
+            indexing = asyncio.create_task(question_index.add_async(question_ids, statements))
+            report.quizzes_imported += len(valid)
+            report.questions_imported += len(question_ids)
+            metrics.inc("quiz_import_rows_total", len(question_ids), result="imported")
+            report.quizzes.extend(
+                QuizImportItemOutput(key=parsed.key, line=parsed.line, quiz_id=quiz_id) for parsed, quiz_id in zip(valid, quiz_ids)
+            )
+
+        if indexing is not None:
+            await indexing
+        report.elapsed_s = round(time.monotonic() - started, 3)
+        if report.elapsed_s > 0:
+            report.rows_per_second = round(report.rows_read / report.elapsed_s, 1)
+            metrics.set("quiz_import_rows_per_second", report.rows_per_second)
+        logger.info(
+            f"Importación masiva: {report.quizzes_imported} quizzes ({report.questions_imported} preguntas) importados, "
+            f"{report.quizzes_rejected} rechazados, {report.rows_per_second} filas/s"
+        )
+        return report
+
+    @staticmethod
+    def _add_errors(report: QuizImportOutput, errors: List[QuizImportErrorOutput]) -> None:
+        room = settings.IMPORT_MAX_ERRORS - len(report.errors)
+        report.errors.extend(errors[:max(0, room)])
+        report.errors_truncated = report.errors_truncated or len(errors) > room
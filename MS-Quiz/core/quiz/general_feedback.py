@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config.settings import get_settings
+from core.ai.llm_provider import get_llm_provider, OPERATION_FEEDBACK
+from core.ai.prompt_builder import PromptBuilder
+from core.ai.response_schema import general_feedback_response_schema
+from core.cache import read_cache
+from core.metrics import metrics
+from core.quiz.pregrader import GRADING_SOURCE_LLM
+from core.quiz.quiz_service import QuizService
+from db.database import AsyncSessionLocal
+from db.models.quiz import Quiz, Quiz_Student, Question, Question_Student, Submission_Intake
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CACHE_GENERAL_FEEDBACK = "general_feedback"  # Solo single-flight: (espacio, quiz_id, student_id) con TTL 0
+
+FEEDBACK_SOURCE_LLM = "llm"
+FEEDBACK_SOURCE_TEMPLATE = "template"
+
+metrics.describe("general_feedback_total", "Feedback general generado bajo demanda por origen (llm o template) y disparador (view o backfill)")
+metrics.describe("general_feedback_seconds", "Duración de la generación de cada feedback general")
+
+
+class GeneralFeedbackService:
+    """
+    Feedback general de una entrega generado bajo demanda (FEEDBACK_LAZY).
+
+    Al calificar solo se calculan los puntos y el feedback por pregunta; el
+    feedback general queda en NULL y se escribe la primera vez que se consulta
+    el resultado del estudiante (o en la pasada de FeedbackBackfiller). Se pide
+    al LLM solo si alguna pregunta la calificó el LLM; si todo se calificó
+    localmente o el LLM falla se usa la plantilla por porcentaje, igual que al
+    calificar. Si varias peticiones lo piden a la vez se genera una sola vez.
+    """
+
+    @staticmethod
+    async def ensure(db: AsyncSession, quiz_id: int, student_id: int) -> Optional[str]:
+        """Feedback general guardado o recién generado. None si el estudiante no tiene entrega"""
+        row = (await db.execute(
+            select(Quiz_Student.feedback_general_automated)
+            .where(Quiz_Student.id_quiz == quiz_id, Quiz_Student.id_student == student_id)
+        )).first()
+        if row is None:
+            return None
+        if row.feedback_general_automated is not None:
+            return row.feedback_general_automated
+        return await read_cache.get_or_load(
+            (CACHE_GENERAL_FEEDBACK, quiz_id, student_id),
+            lambda: GeneralFeedbackService.generate(quiz_id, student_id, trigger="view"),
+            ttl_s=0,
+        )
+
+    @staticmethod
+    async def generate(quiz_id: int, student_id: int, trigger: str) -> Optional[str]:
+        """Genera y guarda el feedback general si sigue vacío. Usa su propia sesión"""
+        started = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            quiz = (await db.execute(
+                select(Quiz.title, Quiz.instruction, Quiz.id_classroom).where(Quiz.id == quiz_id)
+            )).first()
+            if quiz is None:
+                return None
+            rows = (await db.execute(
+                select(
+                    Question.statement, Question.points, Question_Student.points_obtained,
+                    Question_Student.feedback_automated, Question_Student.grading_source,
+                )
+                .join(Question_Student, Question_Student.id_question == Question.id)
+                .where(Question.quiz_id == quiz_id, Question_Student.id_student == student_id)
+                .order_by(Question.id)
+            )).all()
+
+            points = sum(row.points_obtained or 0 for row in rows)
+            total_points = sum(row.points or 0 for row in rows)
+            feedback, source = None, FEEDBACK_SOURCE_TEMPLATE
+            if any(row.grading_source == GRADING_SOURCE_LLM for row in rows):
+                feedback = await GeneralFeedbackService._llm_feedback(quiz, quiz_id, points, total_points, rows)
+                if feedback:
+                    source = FEEDBACK_SOURCE_LLM
+            if not feedback:
+                percentage = (points / total_points) * 100 if total_points > 0 else 0
+                feedback = QuizService._template_general_feedback(percentage)
+
+            # Si otra instancia lo escribió primero, se conserva el suyo
+            stored = (await db.execute(
+                update(Quiz_Student)
+                .where(Quiz_Student.id_quiz == quiz_id, Quiz_Student.id_student == student_id)
+                .values(feedback_general_automated=func.coalesce(Quiz_Student.feedback_general_automated, feedback))
+                .returning(Quiz_Student.feedback_general_automated)
+                .execution_options(synchronize_session=False)
+            )).scalar_one_or_none()
+            await db.commit()
+
+        metrics.inc("general_feedback_total", source=source, trigger=trigger)
+        metrics.observe("general_feedback_seconds", time.monotonic() - started)
+        return stored
+
+    @staticmethod
+    async def _llm_feedback(quiz, quiz_id: int, points: int, total_points: int, rows) -> Optional[str]:
+        prompt = PromptBuilder.general_feedback_prompt(
+            quiz.title, quiz.instruction, points, total_points,
+            [
+                {"statement": row.statement, "points_obtained": row.points_obtained, "max_points": row.points, "feedback": row.feedback_automated}
+                for row in rows
+            ],
+        )
+        try:
+            response = await get_llm_provider().generate(
+                [prompt],
+                operation=OPERATION_FEEDBACK,
+                temperature=0.5,
+                response_schema=general_feedback_response_schema(),
+                system_instruction=PromptBuilder.feedback_system_instruction(),
+                timeout=60,
+                tags={"classroom_id": quiz.id_classroom, "quiz_id": quiz_id},
+            )
+            feedback = json.loads(response.text.strip()).get("general_feedback")
+            return feedback.strip() if isinstance(feedback, str) and feedback.strip() else None
+        except Exception as e:
+            logger.warning(f"Fallo el feedback general del quiz {quiz_id} con el LLM; se usa la plantilla: {e}")
+            return None
+
+    @staticmethod
+    async def backfill_once(limit: int) -> int:
+        """
+        Genera el feedback pendiente de hasta 'limit' entregas de quizzes ya
+        cerrados (o sin 'end_time'), solo si no hay entregas esperando calificación.
+        """
+        async with AsyncSessionLocal() as db:
+            busy = (await db.execute(
+                select(Submission_Intake.id).where(Submission_Intake.status == "queued").limit(1)
+            )).first()
+            if busy is not None:
+                return 0
+            pending = (await db.execute(
+                select(Quiz_Student.id_quiz, Quiz_Student.id_student)
+                .join(Quiz, Quiz.id == Quiz_Student.id_quiz)
+                .where(
+                    Quiz_Student.feedback_general_automated.is_(None),
+                    or_(Quiz.end_time.is_(None), Quiz.end_time <= datetime.now()),
+                )
+                .order_by(Quiz_Student.id_quiz, Quiz_Student.id_student)
+                .limit(limit)
+            )).all()
+
+        for quiz_id, student_id in pending:
+            await read_cache.get_or_load(
+                (CACHE_GENERAL_FEEDBACK, quiz_id, student_id),
+                lambda: GeneralFeedbackService.generate(quiz_id, student_id, trigger="backfill"),
+                ttl_s=0,
+            )
+        return len(pending)
+
+
+class FeedbackBackfiller:
+    """
+    Pasada de baja prioridad que completa el feedback general pendiente cada
+    FEEDBACK_BACKFILL_INTERVAL_S segundos, de a FEEDBACK_BACKFILL_BATCH entregas
+    y solo mientras la cola de calificación está vacía. Desactivada por defecto:
+    sin ella, solo se genera el feedback de los resultados que se consultan.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if settings.FEEDBACK_LAZY and settings.FEEDBACK_BACKFILL_ENABLED and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                generated = await GeneralFeedbackService.backfill_once(settings.FEEDBACK_BACKFILL_BATCH)
+                if generated:
+                    logger.info(f"Feedback general generado en segundo plano para {generated} entregas")
+            except Exception as e:
+                logger.error(f"Fallo la generación de feedback general en segundo plano: {e}", exc_info=True)
+            await asyncio.sleep(settings.FEEDBACK_BACKFILL_INTERVAL_S)
+
+
+feedback_backfiller = FeedbackBackfiller()
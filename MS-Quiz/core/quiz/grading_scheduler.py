@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Integer, and_, case, func, literal_column, true, union
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+
+from config.settings import get_settings
+from db.models.quiz import Submission_Intake
+from schemas.quiz import QuizSubmissionInput
+
+settings = get_settings()
+
+# Prioridades de calificación: menor número, antes se califica
+PRIORITY_MULTIPLE_OPTION = 0  # Solo opción múltiple: no llama al LLM
+PRIORITY_SHORT_TEXT = 1
+PRIORITY_LONG_TEXT = 2
+PRIORITIES = (PRIORITY_MULTIPLE_OPTION, PRIORITY_SHORT_TEXT, PRIORITY_LONG_TEXT)
+
+
+class GradingScheduler:
+    """
+    Orden en que los workers toman las entregas en cola.
+
+    - Equidad por aula: cada aula avanza por turnos. La posición de una entrega
+      es su lugar en la cola de su aula más las entregas de esa aula que ya se
+      están calificando, y se toma la de menor posición; un aula que envió 500
+      entregas no hace esperar a la siguiente aula más que una entrega por worker.
+    - Prioridad: dentro de cada aula (y a igual posición entre aulas) primero las
+      de solo opción múltiple, luego las de texto corto y al final las de texto largo.
+    - Plazo: las de quizzes cuyo 'end_time' ya pasó o cae en los próximos
+      SCHEDULER_URGENT_WINDOW_S segundos van antes dentro de su aula y desempatan
+      entre aulas; el plazo más cercano va primero.
+
+    La entrega elegida siempre es de las primeras de su aula, así que cada toma
+    lee solo la cabeza de cada aula en ix_submission_intakes_lane_queue (LATERAL
+    con LIMIT) y las que se están calificando en ix_submission_intakes_lane_processing:
+    el costo depende del número de aulas con entregas en cola, no de su profundidad.
+    """
+
+    @staticmethod
+    def priority_for(submission_data: QuizSubmissionInput) -> int:
+        text_chars = sum(
+            len(question.answer_submitted.answer_written or "")
+            for question in submission_data.questions
+            if question.answer_submitted.type == "submitted_text"
+        )
+        has_text = any(question.answer_submitted.type == "submitted_text" for question in submission_data.questions)
+        if not has_text:
+            return PRIORITY_MULTIPLE_OPTION
+        if text_chars <= settings.SCHEDULER_SHORT_TEXT_CHARS:
+            return PRIORITY_SHORT_TEXT
+        return PRIORITY_LONG_TEXT
+
+    @staticmethod
+    def next_submission_query(now: Optional[datetime] = None):
+        """SELECT del ID de la siguiente entrega a calificar, bloqueándola con SKIP LOCKED"""
+        now = now or datetime.now()
+        cutoff = now + timedelta(seconds=settings.SCHEDULER_URGENT_WINDOW_S)
+        # Basta con las primeras SUBMISSION_WORKERS de cada aula: si otro worker está
+        # tomando la cabeza (bloqueada), SKIP LOCKED pasa a la siguiente de la misma aula
+        per_lane = max(1, settings.SUBMISSION_WORKERS)
+
+        # Aulas con entregas en cola: un salto por aula en ix_submission_intakes_lane_queue
+        # (min() de la siguiente aula) en lugar de recorrer todas las entregas
+        first = aliased(Submission_Intake)
+        lanes = (
+            select(func.min(_lane(first)).label("lane"))
+            .where(first.status == "queued")
+            .cte("lanes", recursive=True)
+        )
+        previous = lanes.alias()
+        following = aliased(Submission_Intake)
+        lanes = lanes.union_all(
+            select(
+                select(func.min(_lane(following)))
+                .where(following.status == "queued", _lane(following) > previous.c.lane)
+                .scalar_subquery()
+            )
+            .where(previous.c.lane.is_not(None))
+        )
+
+        candidates = GradingScheduler._lane_head(lanes, now, cutoff, per_lane)
+        processing = aliased(Submission_Intake)
+        in_flight = (
+            select(func.count())
+            .where(processing.status == "processing", _lane(processing) == lanes.c.lane)
+            .scalar_subquery()
+        )
+        return (
+            select(Submission_Intake.id)
+            .select_from(lanes)
+            .join(candidates, true())
+            .join(Submission_Intake, Submission_Intake.id == candidates.c.id)
+            .where(Submission_Intake.status == "queued")
+            .order_by(
+                candidates.c.position + in_flight,
+                candidates.c.urgent,
+                Submission_Intake.priority,
+                Submission_Intake.deadline.asc().nulls_last(),
+                Submission_Intake.id,
+            )
+            .limit(1)
+            .with_for_update(of=Submission_Intake, skip_locked=True)
+        )
+
+    @staticmethod
+    def _lane_head(lanes, now: datetime, cutoff: datetime, limit: int):
+        """
+        LATERAL con las primeras 'limit' entregas listas de un aula y su posición en ella.
+        Las urgentes salen de un rango del índice por prioridad y las demás del
+        recorrido del índice en orden de prioridad y plazo; cada parte lee a lo
+        sumo 'limit' filas, sin importar cuántas haya en cola.
+        """
+        parts = []
+        for priority in PRIORITIES:
+            urgent = aliased(Submission_Intake)
+            parts.append(
+                _candidate_columns(urgent, cutoff)
+                .where(
+                    urgent.status == "queued", _lane(urgent) == lanes.c.lane, urgent.priority == priority,
+                    urgent.deadline <= cutoff, urgent.next_attempt_at <= now,
+                )
+                .order_by(urgent.deadline, urgent.id)
+                .limit(limit)
+                .correlate(lanes)
+            )
+        # Puede repetir urgentes de las partes anteriores; UNION las descarta
+        queued = aliased(Submission_Intake)
+        parts.append(
+            _candidate_columns(queued, cutoff)
+            .where(queued.status == "queued", _lane(queued) == lanes.c.lane, queued.next_attempt_at <= now)
+            .order_by(queued.priority, queued.deadline.asc().nulls_last(), queued.id)
+            .limit(limit)
+            .correlate(lanes)
+        )
+        heads = union(*parts).subquery()
+        order = (heads.c.urgent, heads.c.priority, heads.c.deadline.asc().nulls_last(), heads.c.id)
+        return (
+            select(heads.c.id, heads.c.urgent, func.row_number().over(order_by=order).label("position"))
+            .order_by(*order)
+            .limit(limit)
+            .lateral("candidates")
+        )
+
+
+def _lane(table):
+    # Misma expresión que SUBMISSION_LANE_SQL (literal, no parámetro, para que coincida con el índice)
+    return func.coalesce(table.classroom_id, literal_column("-1", Integer))
+
+
+def _candidate_columns(table, cutoff: datetime):
+    urgent = case((and_(table.deadline.is_not(None), table.deadline <= cutoff), 0), else_=1)
+    return select(table.id, table.priority, table.deadline, urgent.label("urgent"))
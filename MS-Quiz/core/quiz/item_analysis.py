@@ -0,0 +1,246 @@
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config.settings import get_settings
+from core.cache import read_cache
+from core.metrics import metrics
+from core.quiz.quiz_service import CACHE_ITEM_ANALYSIS
+from db.models.quiz import Quiz, Question, Question_Student, Base_Multiple_Option, Submitted_Multiple_Option
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+SCOPE_QUIZ = "quiz"
+SCOPE_CLASSROOM = "classroom"
+
+metrics.describe("item_analysis_seconds", "Duración del cálculo del análisis de ítems (consulta y cálculo)")
+
+_SUBMITTED_OPTIONS = Submitted_Multiple_Option.__table__
+
+
+def _number(value: float, digits: int = 4) -> Optional[float]:
+    """float redondeado; None si es NaN o infinito (p. ej. sin varianza)"""
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+class ItemAnalysisService:
+    """
+    Análisis de ítems de un quiz o de todos los quizzes de un aula.
+
+    Se carga la matriz estudiante x pregunta desde 'question_students' con una
+    sola consulta y todo se calcula con operaciones vectorizadas de NumPy sobre
+    el bloque de cada quiz (las respuestas que faltan son NaN y no cuentan):
+
+    - Dificultad: proporción media del puntaje obtenido (p-value, 1 = fácil).
+    - Discriminación: correlación punto-biserial corregida entre la pregunta y
+      el puntaje en el resto del quiz.
+    - Distractores (opción múltiple): proporción de elección de cada opción, su
+      diferencia entre el grupo superior e inferior (ITEM_ANALYSIS_GROUP_FRACTION
+      de los estudiantes por puntaje) y la eficiencia, es decir la fracción de
+      distractores elegidos por al menos ITEM_ANALYSIS_DISTRACTOR_MIN_RATE.
+    - Confiabilidad: alfa de Cronbach de cada quiz con los estudiantes que
+      respondieron todas sus preguntas.
+
+    El resultado queda en la caché de lectura hasta la siguiente entrega o
+    recalificación del quiz (o ITEM_ANALYSIS_CACHE_TTL_S).
+    """
+
+    @staticmethod
+    async def analyze(db: AsyncSession, scope: str, scope_id: int) -> Optional[Dict[str, Any]]:
+        """Análisis del quiz o aula. Retorna None si no existe ningún quiz"""
+        return await read_cache.get_or_load(
+            (CACHE_ITEM_ANALYSIS, scope, scope_id),
+            lambda: ItemAnalysisService._load(db, scope, scope_id),
+            ttl_s=settings.ITEM_ANALYSIS_CACHE_TTL_S,
+        )
+
+    @staticmethod
+    def _scope_filter(stmt, scope: str, scope_id: int):
+        if scope == SCOPE_QUIZ:
+            return stmt.where(Question.quiz_id == scope_id)
+        return stmt.join(Quiz, Quiz.id == Question.quiz_id).where(Quiz.id_classroom == scope_id)
+
+    @staticmethod
+    async def _load(db: AsyncSession, scope: str, scope_id: int) -> Optional[Dict[str, Any]]:
+        started = time.monotonic()
+        questions = (await db.execute(
+            ItemAnalysisService._scope_filter(
+                select(Question.id, Question.quiz_id, Question.points, Question.answer_correct, Base_Multiple_Option.options)
+                .outerjoin(Base_Multiple_Option, Base_Multiple_Option.id == Question.id_answer),
+                scope, scope_id,
+            ).order_by(Question.quiz_id, Question.id)
+        )).all()
+        if not questions:
+            # Sin preguntas: distinguir un quiz vacío de uno inexistente
+            quiz_filter = Quiz.id == scope_id if scope == SCOPE_QUIZ else Quiz.id_classroom == scope_id
+            if (await db.execute(select(Quiz.id).where(quiz_filter).limit(1))).first() is None:
+                return None
+
+        # Matriz de puntajes como columnas (un arreglo por campo en una sola fila): el
+        # driver las decodifica sin crear un objeto por respuesta
+        scores = (await db.execute(
+            ItemAnalysisService._scope_filter(
+                select(
+                    func.array_agg(Question_Student.id_student), func.array_agg(Question_Student.id_question),
+                    func.array_agg(Question_Student.points_obtained), func.array_agg(_SUBMITTED_OPTIONS.c.option_select),
+                )
+                .select_from(Question_Student)
+                .join(Question, Question.id == Question_Student.id_question)
+                .outerjoin(_SUBMITTED_OPTIONS, _SUBMITTED_OPTIONS.c.id == Question_Student.id_answer_submitted),
+                scope, scope_id,
+            )
+        )).one()
+
+        analysis = ItemAnalysisService.compute(questions, scores)
+        analysis.update({"scope": scope, "scope_id": scope_id})
+        elapsed = time.monotonic() - started
+        analysis["elapsed_ms"] = round(elapsed * 1000, 1)
+        metrics.observe("item_analysis_seconds", elapsed)
+        return analysis
+
+    @staticmethod
+    def compute(questions: List[Any], scores: Any) -> Dict[str, Any]:
+        """
+        'questions': (id, quiz_id, points, answer_correct, options JSON o None) ordenadas
+        por quiz; 'scores': listas paralelas (id_student, id_question, points_obtained,
+        option_select), o None en cada una si no hay respuestas.
+        """
+        question_ids = np.array([q[0] for q in questions], dtype=np.int64)
+        quiz_ids = np.array([q[1] for q in questions], dtype=np.int64)
+        max_points = np.array([q[2] or 0 for q in questions], dtype=float)
+
+        student_col, question_col, points_col, option_col = (column or [] for column in scores)
+        students, student_index = np.unique(np.array(student_col, dtype=np.int64), return_inverse=True)
+        order = np.argsort(question_ids)
+        question_index = order[np.searchsorted(question_ids[order], np.array(question_col, dtype=np.int64))]
+
+        shape = (len(students), len(questions))
+        points = np.full(shape, np.nan)
+        points[student_index, question_index] = np.nan_to_num(np.array(points_col, dtype=float))
+        selected = np.full(shape, None, dtype=object)
+        options_column = np.empty(len(option_col), dtype=object)
+        options_column[:] = option_col
+        selected[student_index, question_index] = options_column
+        fraction = np.divide(points, max_points, out=np.full(shape, np.nan), where=max_points > 0)
+
+        output_questions: List[Dict[str, Any]] = []
+        output_quizzes: List[Dict[str, Any]] = []
+        for quiz_id in dict.fromkeys(quiz_ids.tolist()):
+            columns = np.flatnonzero(quiz_ids == quiz_id)
+            answered = ~np.isnan(points[:, columns])
+            rows = np.flatnonzero(answered.any(axis=1))
+            quiz_questions, quiz_summary = ItemAnalysisService._analyze_quiz(
+                [questions[j] for j in columns],
+                points[np.ix_(rows, columns)],
+                fraction[np.ix_(rows, columns)],
+                selected[np.ix_(rows, columns)],
+                max_points[columns],
+            )
+            output_questions += quiz_questions
+            output_quizzes.append({"quiz_id": quiz_id, **quiz_summary})
+
+        return {"students": int(len(students)), "questions": output_questions, "quizzes": output_quizzes}
+
+    @staticmethod
+    def _analyze_quiz(questions: List[Any], points: np.ndarray, fraction: np.ndarray, selected: np.ndarray, max_points: np.ndarray):
+        num_students, num_questions = points.shape
+        answered = ~np.isnan(points)
+        answered_count = answered.sum(axis=0)
+        scored = np.where(answered, points, 0.0)
+        totals = scored.sum(axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            difficulty = np.where(answered, fraction, 0.0).sum(axis=0) / answered_count
+            mean_points = scored.sum(axis=0) / answered_count
+
+            # Punto-biserial corregida: pregunta contra el puntaje del resto del quiz
+            rest = totals[:, None] - scored
+            mean_x = difficulty
+            mean_y = np.where(answered, rest, 0.0).sum(axis=0) / answered_count
+            dx = np.where(answered, fraction - mean_x, 0.0)
+            dy = np.where(answered, rest - mean_y, 0.0)
+            covariance = (dx * dy).sum(axis=0)
+            discrimination = covariance / np.sqrt((dx ** 2).sum(axis=0) * (dy ** 2).sum(axis=0))
+            discrimination[answered_count < 3] = np.nan
+
+        # Alfa de Cronbach con los estudiantes que respondieron todo el quiz
+        complete = points[answered.all(axis=1)] if num_questions else np.empty((0, 0))
+        alpha = np.nan
+        if num_questions >= 2 and complete.shape[0] >= 2:
+            total_variance = complete.sum(axis=1).var(ddof=1)
+            if total_variance > 0:
+                alpha = num_questions / (num_questions - 1) * (1 - complete.var(axis=0, ddof=1).sum() / total_variance)
+
+        # Grupos superior e inferior por puntaje total
+        group_size = int(round(num_students * settings.ITEM_ANALYSIS_GROUP_FRACTION))
+        ranking = np.argsort(totals, kind="stable")
+        lower, upper = (ranking[:group_size], ranking[-group_size:]) if group_size >= 1 and num_students >= 2 else (None, None)
+
+        output = []
+        for j, (question_id, quiz_id, _, answer_correct, options_json) in enumerate(questions):
+            options_output = None
+            distractor_efficiency = None
+            if options_json is not None:
+                options_output, distractor_efficiency = ItemAnalysisService._distractors(
+                    options_json, answer_correct, selected[:, j], int(answered_count[j]), upper, lower
+                )
+            output.append({
+                "question_id": question_id,
+                "quiz_id": quiz_id,
+                "students": int(answered_count[j]),
+                "max_points": int(max_points[j]),
+                "mean_points": _number(mean_points[j], 2),
+                "difficulty": _number(difficulty[j]),
+                "discrimination": _number(discrimination[j]),
+                "distractor_efficiency": distractor_efficiency,
+                "options": options_output,
+            })
+
+        summary = {
+            "students": int(num_students),
+            "questions": int(num_questions),
+            "complete_students": int(complete.shape[0]),
+            "mean_score": _number(totals.mean(), 2) if num_students else None,
+            "std_score": _number(totals.std(ddof=1), 2) if num_students >= 2 else None,
+            "cronbach_alpha": _number(alpha),
+        }
+        return output, summary
+
+    @staticmethod
+    def _distractors(options_json: str, answer_correct: Optional[str], column: np.ndarray, answered: int,
+                     upper: Optional[np.ndarray], lower: Optional[np.ndarray]):
+        try:
+            options = list(json.loads(options_json))
+        except (json.JSONDecodeError, TypeError):
+            options = []
+        # Opciones elegidas que no están en la pregunta (p. ej. se editó) al final
+        options += sorted({value for value in column if value is not None and value not in options})
+
+        output, distractors, functional = [], 0, 0
+        for option in options:
+            chosen = column == option
+            count = int(chosen.sum())
+            proportion = count / answered if answered else 0.0
+            is_correct = option == answer_correct
+            option_discrimination = None
+            if upper is not None:
+                option_discrimination = _number(chosen[upper].mean() - chosen[lower].mean())
+            if not is_correct:
+                distractors += 1
+                functional += proportion >= settings.ITEM_ANALYSIS_DISTRACTOR_MIN_RATE
+            output.append({
+                "option": option,
+                "is_correct": is_correct,
+                "count": count,
+                "proportion": round(proportion, 4),
+                "discrimination": option_discrimination,
+            })
+        efficiency = round(functional / distractors, 4) if distractors and answered else None
+        return output, efficiency
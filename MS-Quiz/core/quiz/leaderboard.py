@@ -0,0 +1,104 @@
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config.settings import get_settings
+from core.cache import read_cache
+from core.quiz.quiz_service import CACHE_LEADERBOARD
+from db.models.quiz import Quiz, Quiz_Student
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class LeaderboardService:
+    """
+    Ranking de los estudiantes de un quiz por puntaje.
+
+    RANK(), DENSE_RANK() y el percentil se calculan en Postgres con funciones de
+    ventana en una sola consulta que filtra por el índice (id_quiz,
+    points_obtained DESC); con la tabla ya vaciada (VACUUM) el planificador lo lee
+    con un Index Only Scan en orden de puntaje. El ranking completo queda en
+    la caché de lectura hasta la siguiente entrega o recalificación del quiz (o
+    LEADERBOARD_CACHE_TTL_S); el top-k y la consulta alrededor de un estudiante
+    son cortes de esa lista.
+    """
+
+    @staticmethod
+    async def get_top(db: AsyncSession, quiz_id: int, limit: int) -> Optional[Dict[str, Any]]:
+        """Los 'limit' primeros del ranking. None si el quiz no existe"""
+        ranking = await LeaderboardService._ranking(db, quiz_id)
+        if ranking is None:
+            return None
+        return {
+            "quiz_id": quiz_id,
+            "total_students": len(ranking["entries"]),
+            "student": None,
+            "entries": ranking["entries"][:limit],
+        }
+
+    @staticmethod
+    async def get_around(db: AsyncSession, quiz_id: int, student_id: int, radius: int) -> Optional[Dict[str, Any]]:
+        """
+        Posición del estudiante y las 'radius' filas por encima y por debajo.
+        None si el quiz no existe o el estudiante no tiene entrega.
+        """
+        ranking = await LeaderboardService._ranking(db, quiz_id)
+        if ranking is None or student_id not in ranking["positions"]:
+            return None
+        entries = ranking["entries"]
+        position = ranking["positions"][student_id]
+        return {
+            "quiz_id": quiz_id,
+            "total_students": len(entries),
+            "student": entries[position],
+            "entries": entries[max(0, position - radius):position + radius + 1],
+        }
+
+    @staticmethod
+    async def _ranking(db: AsyncSession, quiz_id: int) -> Optional[Dict[str, Any]]:
+        return await read_cache.get_or_load(
+            (CACHE_LEADERBOARD, quiz_id),
+            lambda: LeaderboardService._load(db, quiz_id),
+            ttl_s=settings.LEADERBOARD_CACHE_TTL_S,
+        )
+
+    @staticmethod
+    async def _load(db: AsyncSession, quiz_id: int) -> Optional[Dict[str, Any]]:
+        # Todas las ventanas usan el mismo orden (el del índice); el desempate por
+        # id_student del resultado final es un Incremental Sort dentro de cada puntaje
+        order = Quiz_Student.points_obtained.desc().nulls_last()
+        total = func.count().over()
+        # Percentil: porcentaje del resto de estudiantes con menos puntos. cume_dist() en
+        # orden descendente es la fracción con igual o más puntos (incluidos los empates)
+        below = (1 - func.cume_dist().over(order_by=order)) * total
+        rows = (await db.execute(
+            select(
+                Quiz_Student.id_student,
+                Quiz_Student.points_obtained,
+                func.rank().over(order_by=order).label("rank"),
+                func.dense_rank().over(order_by=order).label("dense_rank"),
+                (100 * below / func.nullif(total - 1, 0)).label("percentile"),
+            )
+            .where(Quiz_Student.id_quiz == quiz_id)
+            .order_by(order, Quiz_Student.id_student)
+        )).all()
+        if not rows:
+            if (await db.execute(select(Quiz.id).where(Quiz.id == quiz_id))).first() is None:
+                return None
+
+        entries = [
+            {
+                "student_id": row.id_student,
+                "points_obtained": row.points_obtained,
+                "rank": row.rank,
+                "dense_rank": row.dense_rank,
+                # Un único estudiante queda en el percentil 100
+                "percentile": round(float(row.percentile), 2) if row.percentile is not None else 100.0,
+            }
+            for row in rows
+        ]
+        return {"entries": entries, "positions": {entry["student_id"]: i for i, entry in enumerate(entries)}}
@@ -0,0 +1,234 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import get_settings
+from core.quiz.question_merger import QuestionMerger
+
+settings = get_settings()
+
+_HASH_SHIFT = np.uint64(32)
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+# Caracteres por bloque al calcular firmas: acota la matriz intermedia (permutaciones x n-gramas)
+_SIGNATURE_BLOCK_CHARS = 16384
+# Filas nuevas que se buscan en un diccionario antes de mezclarlas en las tablas ordenadas
+_MAX_PENDING_ROWS = 4096
+
+
+class MinHasher:
+    """
+    Firmas MinHash de enunciados.
+
+    Cada enunciado se normaliza (sin tildes, mayúsculas ni puntuación) y se
+    reduce a su conjunto de n-gramas de caracteres; la fracción de posiciones
+    iguales entre dos firmas estima la similitud de Jaccard de esos conjuntos,
+    que tolera cambios pequeños de redacción.
+    """
+
+    def __init__(self, num_perm: int, shingle_chars: int, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_chars = shingle_chars
+        # Hashing multiply-shift: ((a*x + b) mod 2^64) >> 32 con 'a' impar, sin divisiones
+        self._mix = rng.integers(0, 1 << 63, size=shingle_chars, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._a = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64)
+
+    def _block_signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        Firmas de textos normalizados y no vacíos en una sola pasada vectorizada:
+        los textos se unen con un separador, se hashea cada ventana de
+        'shingle_chars' caracteres y se descartan las que cruzan un separador.
+        """
+        size = self.shingle_chars
+        joined = "\0".join(text.ljust(size) for text in texts)
+        codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        windows = len(codes) - size + 1
+
+        shingles = np.zeros(windows, dtype=np.uint64)
+        for position in range(size):
+            shingles += codes[position:position + windows] * self._mix[position]
+        # separators[i] = separadores antes de la posición i = texto al que pertenece la ventana i
+        separators = np.concatenate(([0], np.cumsum(codes == 0)))
+        inside = separators[size:size + windows] == separators[:windows]
+        text_of = separators[:windows][inside]
+        offsets = np.flatnonzero(np.concatenate(([True], text_of[1:] != text_of[:-1])))
+
+        permuted = (self._a * (shingles[inside] >> _HASH_SHIFT) + self._b) >> _HASH_SHIFT
+        return np.minimum.reduceat(permuted, offsets, axis=1).T.astype(np.uint32)
+
+    def signatures(self, statements: Sequence[str]) -> np.ndarray:
+        """
+        Firmas de varios enunciados como matriz (len(statements) x num_perm, uint32),
+        calculadas por bloques; un enunciado vacío queda con la firma de máximos.
+        """
+        result = np.full((len(statements), self.num_perm), 0xFFFFFFFF, dtype=np.uint32)
+        rows: List[int] = []
+        block: List[str] = []
+        chars = 0
+        for row, statement in enumerate(statements):
+            text = QuestionMerger.normalize_statement(statement)
+            if not text:
+                continue
+            rows.append(row)
+            block.append(text)
+            chars += len(text) + 1
+            if chars >= _SIGNATURE_BLOCK_CHARS:
+                result[rows] = self._block_signatures(block)
+                rows, block, chars = [], [], 0
+        if rows:
+            result[rows] = self._block_signatures(block)
+        return result
+
+    def signature(self, statement: str) -> np.ndarray:
+        return self.signatures([statement])[0]
+
+
+class LSHIndex:
+    """
+    Índice LSH por bandas sobre firmas MinHash.
+
+    La firma se divide en 'bands' bandas; dos enunciados son candidatos si
+    coinciden en al menos una banda completa, y los candidatos se verifican con
+    la similitud estimada de sus firmas. Cada banda guarda sus hashes en un
+    arreglo ordenado (búsqueda binaria), así una consulta cuesta O(bandas·log n)
+    más los candidatos, sin comparar contra todo el índice. Las filas nuevas se
+    buscan en un diccionario hasta que se mezclan en bloque en los arreglos.
+    """
+
+    def __init__(self, hasher: MinHasher, bands: int, threshold: float):
+        if bands <= 0 or hasher.num_perm % bands:
+            raise ValueError("MINHASH_NUM_PERM debe ser múltiplo de MINHASH_BANDS.")
+        self.hasher = hasher
+        self.bands = bands
+        self.rows = hasher.num_perm // bands
+        self.threshold = threshold
+        self._size = 0
+        self._keys = np.empty(0, dtype=np.int64)
+        self._signatures = np.empty((0, hasher.num_perm), dtype=np.uint32)
+        self._band_hashes = np.empty((0, bands), dtype=np.uint64)
+        self._tables: List[Tuple[np.ndarray, np.ndarray]] = [
+            (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)) for _ in range(bands)
+        ]
+        self._indexed = 0
+        self._pending: Dict[Tuple[int, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _hash_bands(self, signatures: np.ndarray) -> np.ndarray:
+        grouped = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        hashes = np.full((len(signatures), self.bands), _FNV_OFFSET, dtype=np.uint64)
+        for column in range(self.rows):
+            hashes = (hashes ^ grouped[:, :, column]) * _FNV_PRIME
+        return hashes
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        if needed <= len(self._keys):
+            return
+        capacity = max(needed, 2 * len(self._keys), 1024)
+        for name in ("_keys", "_signatures", "_band_hashes"):
+            current = getattr(self, name)
+            grown = np.empty((capacity, *current.shape[1:]), dtype=current.dtype)
+            grown[:self._size] = current[:self._size]
+            setattr(self, name, grown)
+
+    def add_many(self, keys: Sequence[int], signatures: np.ndarray) -> None:
+        if not len(keys):
+            return
+        band_hashes = self._hash_bands(signatures)
+        self._reserve(len(keys))
+        start = self._size
+        self._keys[start:start + len(keys)] = keys
+        self._signatures[start:start + len(keys)] = signatures
+        self._band_hashes[start:start + len(keys)] = band_hashes
+        self._size += len(keys)
+
+        for row in range(start, self._size):
+            for band, value in enumerate(self._band_hashes[row].tolist()):
+                self._pending.setdefault((band, value), []).append(row)
+        if self._size - self._indexed > _MAX_PENDING_ROWS:
+            self._merge_pending()
+
+    def add(self, key: int, signature: np.ndarray) -> None:
+        self.add_many([key], signature[None, :])
+
+    def _merge_pending(self) -> None:
+        """Inserta las filas pendientes en los arreglos ordenados de cada banda (O(n) por banda)"""
+        new_rows = np.arange(self._indexed, self._size, dtype=np.int64)
+        for band, (hashes, rows) in enumerate(self._tables):
+            new_hashes = self._band_hashes[new_rows, band]
+            order = np.argsort(new_hashes, kind="stable")
+            positions = np.searchsorted(hashes, new_hashes[order], side="right")
+            self._tables[band] = (np.insert(hashes, positions, new_hashes[order]), np.insert(rows, positions, new_rows[order]))
+        self._indexed = self._size
+        self._pending.clear()
+
+    def query(self, signature: np.ndarray, threshold: Optional[float] = None, limit: Optional[int] = None, exclude_key: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Claves con similitud estimada >= threshold, de mayor a menor similitud"""
+        if not self._size:
+            return []
+        threshold = self.threshold if threshold is None else threshold
+        band_hashes = self._hash_bands(signature[None, :])[0]
+
+        candidates = []
+        # value queda como np.uint64: un int de Python mayor a 2^63 se compararía como float
+        for band, value in enumerate(band_hashes):
+            hashes, rows = self._tables[band]
+            low = np.searchsorted(hashes, value, side="left")
+            high = np.searchsorted(hashes, value, side="right")
+            if high > low:
+                candidates.append(rows[low:high])
+            pending = self._pending.get((band, int(value)))
+            if pending:
+                candidates.append(np.asarray(pending, dtype=np.int64))
+        if not candidates:
+            return []
+
+        rows = np.unique(np.concatenate(candidates))
+        similarities = (self._signatures[rows] == signature).mean(axis=1)
+        keep = similarities >= threshold
+        matches: Dict[int, float] = {}
+        for key, similarity in zip(self._keys[rows[keep]].tolist(), similarities[keep].tolist()):
+            if key != exclude_key and similarity > matches.get(key, -1.0):
+                matches[key] = similarity
+        ranked = sorted(matches.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit is not None else ranked
+
+
+def new_statement_index(threshold: Optional[float] = None) -> LSHIndex:
+    """Índice vacío con la configuración de MINHASH_* y NEAR_DUPLICATE_THRESHOLD"""
+    return LSHIndex(
+        statement_hasher,
+        settings.MINHASH_BANDS,
+        settings.NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold,
+    )
+
+
+def near_duplicate_mask(statements: Sequence[str], index: Optional[LSHIndex] = None) -> List[bool]:
+    """
+    Indica por posición si el enunciado es casi idéntico a uno anterior de la
+    lista o a uno que ya estaba en 'index'. Los enunciados nuevos se agregan al
+    índice, así un mismo índice puede compartirse entre varias listas.
+    """
+    index = index if index is not None else new_statement_index()
+    mask = []
+    for signature in statement_hasher.signatures(statements):
+        duplicate = bool(index.query(signature, limit=1))
+        if not duplicate:
+            index.add(len(index), signature)
+        mask.append(duplicate)
+    return mask
+
+
+def dedupe_questions(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Elimina preguntas sin enunciado o casi idénticas a una anterior, conservando la primera aparición"""
+    with_statement = [q for q in questions if QuestionMerger.normalize_statement(q.get("statement", ""))]
+    mask = near_duplicate_mask([q["statement"] for q in with_statement])
+    return [q for q, duplicate in zip(with_statement, mask) if not duplicate]
+
+
+statement_hasher = MinHasher(settings.MINHASH_NUM_PERM, settings.MINHASH_SHINGLE_CHARS)
@@ -0,0 +1,216 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import get_settings
+from core.metrics import metrics
+from core.quiz.question_merger import QuestionMerger
+
+settings = get_settings()
+
+# Origen de la calificación de cada respuesta (question_students.grading_source)
+GRADING_SOURCE_LOCAL = "local"        # Pre-calificación léxica u opción múltiple
+GRADING_SOURCE_LLM = "llm"
+GRADING_SOURCE_FALLBACK = "fallback"  # El LLM falló o no evaluó la pregunta
+GRADING_SOURCES = (GRADING_SOURCE_LOCAL, GRADING_SOURCE_LLM, GRADING_SOURCE_FALLBACK)
+
+# Palabras vacías (ya normalizadas, sin tildes) que no cuentan como coincidencia de contenido
+_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aun cada como con contra cual cuales cuando de del desde
+donde durante e el ella ellas ellos en entre era es esa esas ese eso esos esta estas este esto estos fue fueron
+ha han hay la las le les lo los mas me mi mis muy ni no nos o otra otras otro otros para pero por porque que quien
+se sea segun ser si sin sobre son su sus tambien tan te tiene tienen todo todos tu u un una unas uno unos y ya
+""".split())
+
+_HASH_MASK = np.uint64(0xFFFFFFFF)
+_KEY_SHIFT = np.uint64(32)
+_NGRAM_CHARS = 3
+
+metrics.describe("quiz_pregrade_answers_total", "Respuestas por decisión de la pre-calificación local (correct, incorrect o llm)")
+metrics.describe("quiz_pregrade_local_answers_total", "Respuestas calificadas localmente por quiz (proporción local = este / quiz_pregrade_graded_answers_total)")
+metrics.describe("quiz_pregrade_graded_answers_total", "Respuestas que pasaron por la pre-calificación por quiz")
+
+
+def _ngram_keys(texts: List[str], owners: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes de los n-gramas de caracteres de todos los textos en una pasada
+    vectorizada (los textos se unen con un separador y se descartan las
+    ventanas que lo cruzan). Retorna (dueño de cada n-grama, hash de 32 bits).
+    """
+    size = _NGRAM_CHARS
+    padded = [text.ljust(size) if text else "" for text in texts]
+    codes = np.frombuffer("\0".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    windows = len(codes) - size + 1
+    if windows <= 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64)
+
+    hashes = np.zeros(windows, dtype=np.uint64)
+    for position in range(size):
+        hashes = (hashes << np.uint64(21)) ^ codes[position:position + windows]
+    separators = np.concatenate(([0], np.cumsum(codes == 0)))
+    inside = separators[size:size + windows] == separators[:windows]
+    text_of = separators[:windows][inside]
+    # Mezcla multiplicativa para repartir los 63 bits del n-grama en 32
+    mixed = (hashes[inside] * np.uint64(0x9E3779B97F4A7C15)) >> _KEY_SHIFT
+    return owners[text_of].astype(np.uint64), mixed
+
+
+def _token_keys(texts: List[str], owners: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    owner_list, hash_list = [], []
+    for owner, text in zip(owners.tolist(), texts):
+        for token in set(text.split()) - _STOPWORDS:
+            owner_list.append(owner)
+            hash_list.append(hash(token) & 0xFFFFFFFF)
+    return np.asarray(owner_list, dtype=np.uint64), np.asarray(hash_list, dtype=np.uint64)
+
+
+def _overlap(
+    reference_keys: Tuple[np.ndarray, np.ndarray],
+    answer_keys: Tuple[np.ndarray, np.ndarray],
+    reference_of: np.ndarray,
+    num_references: int,
+    num_answers: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (tamaño del conjunto de la referencia, del de la respuesta y de la
+    intersección) por respuesta. Cada referencia se procesa una sola vez
+    aunque la compartan muchas respuestas.
+    """
+    reference_set = np.unique((reference_keys[0] << _KEY_SHIFT) | reference_keys[1])
+    answer_set = np.unique((answer_keys[0] << _KEY_SHIFT) | answer_keys[1])
+    answer_owner = (answer_set >> _KEY_SHIFT).astype(np.int64)
+
+    # Cada elemento de la respuesta se busca en el conjunto de su propia referencia
+    lookup = (reference_of[answer_owner].astype(np.uint64) << _KEY_SHIFT) | (answer_set & _HASH_MASK)
+    position = np.searchsorted(reference_set, lookup)
+    found = position < len(reference_set)
+    found[found] = reference_set[position[found]] == lookup[found]
+
+    reference_size = np.bincount((reference_set >> _KEY_SHIFT).astype(np.int64), minlength=num_references)[reference_of]
+    answer_size = np.bincount(answer_owner, minlength=num_answers)
+    common = np.bincount(answer_owner[found], minlength=num_answers)
+    return reference_size, answer_size, common
+
+
+class LexicalPreGrader:
+    """
+    Pre-calificación local de respuestas de texto libre antes de llamar al LLM.
+
+    Compara cada respuesta con 'answer_correct' ya normalizadas (sin tildes,
+    mayúsculas, puntuación ni espacios extra) con dos medidas: F1 de las
+    palabras de contenido (sin palabras vacías) y Dice de los trigramas de
+    caracteres, que tolera variaciones de escritura. El puntaje es su promedio
+    (1 si los textos normalizados son idénticos) y se calcula con NumPy para
+    todas las respuestas a la vez. Solo los extremos se califican localmente:
+    puntaje >= PREGRADE_HIGH_THRESHOLD es correcta y <= PREGRADE_LOW_THRESHOLD
+    incorrecta; el medio ambiguo va al LLM.
+    """
+
+    @staticmethod
+    def similarity(references: Sequence[str], answers: Sequence[str]) -> np.ndarray:
+        """Puntaje de 0 a 1 por par (referencia, respuesta)"""
+        num_answers = len(answers)
+        if not num_answers:
+            return np.zeros(0)
+
+        unique_references: Dict[str, int] = {}
+        reference_of = np.empty(num_answers, dtype=np.int64)
+        for i, reference in enumerate(references):
+            reference_of[i] = unique_references.setdefault(QuestionMerger.normalize_statement(reference), len(unique_references))
+        reference_texts = list(unique_references)
+        answer_texts = [QuestionMerger.normalize_statement(answer) for answer in answers]
+        reference_owners = np.arange(len(reference_texts), dtype=np.int64)
+        answer_owners = np.arange(num_answers, dtype=np.int64)
+
+        counts = (reference_of, len(reference_texts), num_answers)
+        ref_tokens, ans_tokens, common_tokens = _overlap(
+            _token_keys(reference_texts, reference_owners), _token_keys(answer_texts, answer_owners), *counts
+        )
+        ref_ngrams, ans_ngrams, common_ngrams = _overlap(
+            _ngram_keys(reference_texts, reference_owners), _ngram_keys(answer_texts, answer_owners), *counts
+        )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            token_f1 = 2 * common_tokens / (ref_tokens + ans_tokens)
+            ngram_dice = np.where(ref_ngrams + ans_ngrams > 0, 2 * common_ngrams / (ref_ngrams + ans_ngrams), 0.0)
+        # Si la referencia no tiene palabras de contenido (p. ej. "Sí" / "No") solo cuentan los trigramas
+        score = np.where(ref_tokens > 0, (token_f1 + ngram_dice) / 2, ngram_dice)
+
+        reference_normalized = np.array(reference_texts, dtype=object)[reference_of]
+        answer_normalized = np.array(answer_texts, dtype=object)
+        score[reference_normalized == answer_normalized] = 1.0
+        score[answer_normalized == ""] = 0.0
+        return score
+
+    @staticmethod
+    def _local_evaluation(question: Dict[str, Any], correct: bool, score: float) -> Dict[str, Any]:
+        """Evaluación con feedback de plantilla, como la del fallback cuando falla el LLM"""
+        reference = question["correct_answer"]
+        if question["question_type"] == "multiple option":
+            feedback = "¡Muy bien! Esa es la opción correcta." if correct else f"Incorrecto. La opción correcta era: '{reference}'."
+        elif correct:
+            feedback = "¡Correcto! Tu respuesta coincide con la respuesta esperada."
+        elif not (question["student_answer"] or "").strip():
+            feedback = f"No respondiste esta pregunta. La respuesta esperada era: '{reference}'."
+        else:
+            feedback = f"Incorrecto. La respuesta esperada era: '{reference}'."
+        return {
+            "question_id": question["question_id"],
+            "percentage_correct": 100 if correct else 0,
+            "feedback": feedback,
+            "source": GRADING_SOURCE_LOCAL,
+            "score": round(score, 4),
+        }
+
+    @staticmethod
+    def pregrade(questions: List[Dict[str, Any]], quiz_id: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Separa las preguntas de una entrega (formato de process_student_submission)
+        en (evaluaciones locales, preguntas que debe calificar el LLM).
+
+        Las de opción múltiple se califican localmente por coincidencia exacta. Las
+        de texto sin respuesta de referencia (preguntas abiertas) siempre van al
+        LLM. En el resto, si la proporción local supera PREGRADE_MAX_LOCAL_RATE,
+        las de menor confianza (más cerca de su umbral) vuelven al LLM. Con
+        'quiz_id' se suman los contadores de respuestas locales y totales del quiz.
+        """
+        local: List[Dict[str, Any]] = []
+        pending: List[Dict[str, Any]] = []
+        text_questions = []
+        for question in questions:
+            if question["question_type"] == "multiple option":
+                correct = question["student_answer"] == question["correct_answer"]
+                local.append(LexicalPreGrader._local_evaluation(question, correct, 1.0 if correct else 0.0))
+                metrics.inc("quiz_pregrade_answers_total", answer_type="multiple_option", decision="correct" if correct else "incorrect")
+            elif question["question_type"] == "text" and (question["correct_answer"] or "").strip():
+                text_questions.append(question)
+            else:
+                pending.append(question)
+
+        scores = LexicalPreGrader.similarity(
+            [q["correct_answer"] or "" for q in text_questions],
+            [q["student_answer"] or "" for q in text_questions],
+        ).tolist()
+        confident = []
+        for question, score in zip(text_questions, scores):
+            if score >= settings.PREGRADE_HIGH_THRESHOLD:
+                confident.append((score - settings.PREGRADE_HIGH_THRESHOLD, question, True, score))
+            elif score <= settings.PREGRADE_LOW_THRESHOLD:
+                confident.append((settings.PREGRADE_LOW_THRESHOLD - score, question, False, score))
+            else:
+                pending.append(question)
+
+        max_local = int(len(text_questions) * settings.PREGRADE_MAX_LOCAL_RATE)
+        confident.sort(key=lambda item: -item[0])
+        for _, question, correct, score in confident[:max_local]:
+            local.append(LexicalPreGrader._local_evaluation(question, correct, score))
+            metrics.inc("quiz_pregrade_answers_total", answer_type="text", decision="correct" if correct else "incorrect")
+        for _, question, _, _ in confident[max_local:]:
+            pending.append(question)
+        metrics.inc("quiz_pregrade_answers_total", len(text_questions) - min(max_local, len(confident)), answer_type="text", decision="llm")
+
+        if questions and quiz_id is not None:
+            # Dos contadores por quiz: la proporción se calcula al consultar las métricas
+            metrics.inc("quiz_pregrade_local_answers_total", len(local), quiz_id=quiz_id)
+            metrics.inc("quiz_pregrade_graded_answers_total", len(questions), quiz_id=quiz_id)
+        return local, pending
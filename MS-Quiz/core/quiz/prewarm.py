@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy.future import select
+
+from config.settings import get_settings
+from core.metrics import metrics
+from core.quiz.quiz_service import QuizService
+from db.database import AsyncSessionLocal
+from db.models.quiz import Quiz
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+metrics.describe("quiz_prewarm_total", "Quizzes pre-cargados en la caché de lectura antes de su start_time")
+metrics.describe("quiz_prewarm_seconds", "Duración de cada ronda de pre-carga")
+
+
+class QuizPrewarmer:
+    """
+    Pre-carga de quizzes antes de su 'start_time'.
+
+    Cada PREWARM_INTERVAL_S segundos busca los quizzes que empiezan en los
+    próximos PREWARM_LEAD_S segundos y deja en la caché de lectura su detalle
+    serializado y la lista de quizzes del aula (con un TTL que cubre hasta el
+    inicio), además de leer sus filas para calentar los buffers de Postgres.
+    Cada quiz se pre-carga una vez por 'start_time'; si se reprograma, otra vez.
+    Las horas se comparan como las guarda el servicio (naive, con datetime.now()).
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._warmed: Dict[int, datetime] = {}
+
+    def start(self) -> None:
+        if settings.PREWARM_ENABLED and settings.READ_CACHE_ENABLED and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Fallo la pre-carga de quizzes: {e}", exc_info=True)
+            await asyncio.sleep(settings.PREWARM_INTERVAL_S)
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        """Pre-carga los quizzes que empiezan pronto. Retorna cuántos se cargaron"""
+        started = time.monotonic()
+        now = now or datetime.now()
+        lead = timedelta(seconds=settings.PREWARM_LEAD_S)
+        # Los que acaban de empezar también, por si el servicio arrancó tarde
+        since = now - timedelta(seconds=settings.PREWARM_INTERVAL_S)
+        warmed = 0
+        async with AsyncSessionLocal() as db:
+            upcoming = (await db.execute(
+                select(Quiz.id, Quiz.id_classroom, Quiz.start_time)
+                .where(Quiz.start_time > since, Quiz.start_time <= now + lead)
+                .order_by(Quiz.start_time)
+            )).all()
+            for quiz_id, classroom_id, start_time in upcoming:
+                if self._warmed.get(quiz_id) == start_time:
+                    continue
+                # La entrada debe seguir vigente durante los primeros minutos del quiz
+                ttl_s = max(0.0, (start_time - now).total_seconds()) + settings.READ_CACHE_TTL_S
+                if await QuizService.prewarm_quiz(db, quiz_id, classroom_id, ttl_s):
+                    self._warmed[quiz_id] = start_time
+                    warmed += 1
+                    metrics.inc("quiz_prewarm_total")
+
+        for quiz_id, start_time in list(self._warmed.items()):
+            if start_time < since:
+                del self._warmed[quiz_id]
+        metrics.observe("quiz_prewarm_seconds", time.monotonic() - started)
+        if warmed:
+            logger.info(f"Pre-carga: {warmed} quizzes listos antes de su inicio")
+        return warmed
+
+
+quiz_prewarmer = QuizPrewarmer()
@@ -0,0 +1,249 @@
+import base64
+import binascii
+import json
+import logging
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import cast, exists, func, null, tuple_, REAL
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased, joinedload, with_polymorphic
+
+from config.settings import get_settings
+from db.models.quiz import Quiz, Question, Answer_Base, Base_Text, Base_Multiple_Option, SEARCH_TS_CONFIG
+from schemas.quiz import AnswerBaseDetailOutput
+from schemas.question_bank import QuestionBankItemOutput, QuestionBankPageOutput, QuestionSimilarItemOutput, QuestionSimilarOutput
+from core.quiz.question_index import question_index
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Palabras de 5 letras o más: descarta la mayoría de artículos, preposiciones y conectores
+_TOPIC_TERM_RE = re.compile(r"[^\W\d_]{5,}")
+
+
+class QuestionBankService:
+    """
+    Búsqueda sobre las preguntas ya creadas para reutilizarlas en lugar de regenerarlas.
+
+    El texto se busca con el vector 'search_vector' (columna generada con índice
+    GIN, que Postgres mantiene al insertar cada pregunta) y los resultados se
+    ordenan por relevancia (ts_rank_cd) y luego por ID. La paginación es por
+    cursor (keyset): cada página continúa después del último (rank, id) de la
+    anterior, por lo que su costo no crece con la profundidad de la página.
+    """
+
+    @staticmethod
+    def _encode_cursor(rank: Optional[float], question_id: int) -> str:
+        payload = json.dumps({"r": rank, "id": question_id}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[Optional[float], int]:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            rank = payload["r"]
+            question_id = int(payload["id"])
+            if rank is not None:
+                rank = float(rank)
+            return rank, question_id
+        except (binascii.Error, ValueError, KeyError, TypeError, UnicodeError):
+            raise ValueError("El cursor de paginación es inválido.")
+
+    @staticmethod
+    def _answer_base_output(answer_base: Answer_Base) -> AnswerBaseDetailOutput:
+        options = None
+        if isinstance(answer_base, Base_Multiple_Option) and answer_base.options is not None:
+            try:
+                options = json.loads(answer_base.options)
+            except json.JSONDecodeError:
+                options = []
+        return AnswerBaseDetailOutput(id_answer=answer_base.id, type=answer_base.type, options=options)
+
+    @staticmethod
+    def _item_fields(question: Question, id_classroom: int) -> Dict[str, Any]:
+        return {
+            "id": question.id,
+            "quiz_id": question.quiz_id,
+            "classroom_id": id_classroom,
+            "statement": question.statement,
+            "answer_correct": question.answer_correct,
+            "points": question.points,
+            "answer_base": QuestionBankService._answer_base_output(question.answer_base),
+            "competences_id": question.competences_id or [],
+        }
+
+    @staticmethod
+    def topic_query(text: Optional[str], max_terms: int) -> Optional[str]:
+        """
+        Consulta para websearch_to_tsquery con los términos más frecuentes del
+        tema o documento unidos con "or": basta con que la pregunta comparta
+        alguno, y ts_rank_cd ordena por cuántos comparte.
+        """
+        counts = Counter(term.lower() for term in _TOPIC_TERM_RE.findall(text or ""))
+        terms = [term for term, _ in counts.most_common(max_terms)]
+        return " or ".join(terms) or None
+
+    @staticmethod
+    async def select_for_generation(
+        db: AsyncSession,
+        classroom_id: int,
+        competence_ids: List[int],
+        topic: Optional[str],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Candidatas del banco para un quiz nuevo: comparten al menos una de las
+        competencias pedidas, coinciden con el tema (si lo hay) y el aula no las
+        ha visto, es decir, ningún quiz del aula tiene una pregunta con el mismo
+        enunciado. Retorna [{"id", "rank", "question"}] de mayor a menor relevancia,
+        con 'question' en el formato de salida de la generación.
+        """
+        if not competence_ids:
+            return []
+
+        seen_question = aliased(Question)
+        seen_quiz = aliased(Quiz)
+        seen_by_classroom = exists().where(
+            seen_question.quiz_id == seen_quiz.id,
+            seen_quiz.id_classroom == classroom_id,
+            seen_question.statement == Question.statement,
+        )
+
+        answer_base_poly = with_polymorphic(Answer_Base, [Base_Text, Base_Multiple_Option], flat=True)
+        query_text = QuestionBankService.topic_query(topic, settings.BANK_TOPIC_TERMS)
+        stmt = (
+            select(Question)
+            .options(joinedload(Question.answer_base.of_type(answer_base_poly)))
+            .where(Question.competences_id.overlap(competence_ids), ~seen_by_classroom)
+        )
+        if query_text:
+            ts_query = func.websearch_to_tsquery(SEARCH_TS_CONFIG, query_text)
+            rank = func.ts_rank_cd(Question.search_vector, ts_query)
+            stmt = stmt.add_columns(rank).where(Question.search_vector.op("@@")(ts_query)).order_by(rank.desc(), Question.id.desc())
+        else:
+            stmt = stmt.add_columns(null()).order_by(Question.id.desc())
+
+        result = await db.execute(stmt.limit(limit))
+        candidates = []
+        for question, rank in result.unique().all():
+            answer_base = QuestionBankService._answer_base_output(question.answer_base)
+            candidates.append({
+                "id": question.id,
+                "rank": rank,
+                "question": {
+                    "statement": question.statement,
+                    "answer_correct": question.answer_correct,
+                    "points": question.points,
+                    "answer_base": {"type": answer_base.type, **({"options": answer_base.options} if answer_base.options else {})},
+                    "competences_id": question.competences_id or [],
+                },
+            })
+        return candidates
+
+    @staticmethod
+    async def search(
+        db: AsyncSession,
+        q: Optional[str] = None,
+        classroom_id: Optional[int] = None,
+        competences_id: Optional[List[int]] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> QuestionBankPageOutput:
+        """
+        Busca preguntas por texto (sintaxis de buscador web: "frase exacta", -excluir, or),
+        aula y competencias (las que tengan al menos una de 'competences_id').
+        Sin 'q' se listan las más recientes.
+        """
+        if not 1 <= limit <= settings.QUESTION_BANK_MAX_PAGE_SIZE:
+            raise ValueError(f"limit debe estar entre 1 y {settings.QUESTION_BANK_MAX_PAGE_SIZE}.")
+        q = (q or "").strip() or None
+        after = QuestionBankService._decode_cursor(cursor) if cursor else None
+
+        answer_base_poly = with_polymorphic(Answer_Base, [Base_Text, Base_Multiple_Option], flat=True)
+        if q:
+            ts_query = func.websearch_to_tsquery(SEARCH_TS_CONFIG, q)
+            rank = func.ts_rank_cd(Question.search_vector, ts_query)
+        else:
+            rank = None
+
+        stmt = (
+            select(Question, Quiz.id_classroom, (rank if rank is not None else null()).label("rank"))
+            .join(Quiz, Question.quiz_id == Quiz.id)
+            .options(joinedload(Question.answer_base.of_type(answer_base_poly)))
+        )
+        if q:
+            stmt = stmt.where(Question.search_vector.op("@@")(ts_query))
+        if classroom_id is not None:
+            stmt = stmt.where(Quiz.id_classroom == classroom_id)
+        if competences_id:
+            stmt = stmt.where(Question.competences_id.overlap(competences_id))
+
+        if rank is not None:
+            if after is not None:
+                after_rank, after_id = after
+                stmt = stmt.where(tuple_(rank, Question.id) < tuple_(cast(after_rank or 0.0, REAL), after_id))
+            stmt = stmt.order_by(rank.desc(), Question.id.desc())
+        else:
+            if after is not None:
+                stmt = stmt.where(Question.id < after[1])
+            stmt = stmt.order_by(Question.id.desc())
+
+        # Una fila extra indica si hay página siguiente
+        result = await db.execute(stmt.limit(limit + 1))
+        rows = result.unique().all()
+
+        items = [
+            QuestionBankItemOutput(**QuestionBankService._item_fields(question, id_classroom), rank=row_rank)
+            for question, id_classroom, row_rank in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = QuestionBankService._encode_cursor(last.rank, last.id)
+        return QuestionBankPageOutput(items=items, next_cursor=next_cursor)
+
+    @staticmethod
+    async def similar(
+        db: AsyncSession,
+        text: Optional[str] = None,
+        question_id: Optional[int] = None,
+        threshold: Optional[float] = None,
+        limit: int = 10,
+    ) -> Optional[QuestionSimilarOutput]:
+        """
+        Preguntas casi idénticas a 'text' o al enunciado de la pregunta 'question_id'
+        (sin incluirla), según el índice MinHash/LSH. Retorna None si 'question_id'
+        no existe.
+        """
+        if (text is None) == (question_id is None):
+            raise ValueError("Envía 'text' o 'question_id' (solo uno).")
+        if not 1 <= limit <= settings.QUESTION_BANK_MAX_PAGE_SIZE:
+            raise ValueError(f"limit debe estar entre 1 y {settings.QUESTION_BANK_MAX_PAGE_SIZE}.")
+
+        if question_id is not None:
+            text = (await db.execute(select(Question.statement).where(Question.id == question_id))).scalar_one_or_none()
+            if text is None:
+                return None
+        if not text.strip():
+            raise ValueError("El enunciado a comparar no puede estar vacío.")
+
+        # Solo se indexa después del commit, así que cada ID del índice existe en la base
+        matches = question_index.similar(text, threshold, limit, exclude_id=question_id)
+        items = []
+        if matches:
+            answer_base_poly = with_polymorphic(Answer_Base, [Base_Text, Base_Multiple_Option], flat=True)
+            result = await db.execute(
+                select(Question, Quiz.id_classroom)
+                .join(Quiz, Question.quiz_id == Quiz.id)
+                .options(joinedload(Question.answer_base.of_type(answer_base_poly)))
+                .where(Question.id.in_([match_id for match_id, _ in matches]))
+            )
+            found = {question.id: (question, id_classroom) for question, id_classroom in result.unique().all()}
+            items = [
+                QuestionSimilarItemOutput(**QuestionBankService._item_fields(*found[match_id]), similarity=similarity)
+                for match_id, similarity in matches if match_id in found
+            ][:limit]
+        return QuestionSimilarOutput(items=items, index_ready=question_index.ready)
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from config.settings import get_settings
+from core.metrics import metrics
+from core.quiz.near_duplicates import new_statement_index, statement_hasher
+from db.database import AsyncSessionLocal
+from db.models.quiz import Question
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+metrics.describe("question_index_size", "Preguntas en el índice de casi duplicados")
+metrics.describe("question_index_build_seconds", "Duración de la carga inicial del índice de casi duplicados")
+
+
+class QuestionIndex:
+    """
+    Índice de casi duplicados de todas las preguntas guardadas, en memoria del proceso.
+
+    Al arrancar se carga en segundo plano desde la tabla 'questions' (las
+    firmas se calculan por lotes fuera del event loop) y luego crece con cada
+    quiz creado o importado, siempre después del commit para no guardar IDs de
+    transacciones revertidas. Las claves son IDs de pregunta; quien consulta
+    carga las preguntas desde la base.
+    """
+
+    def __init__(self):
+        self._index = new_statement_index()
+        self._build_task: Optional[asyncio.Task] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def add(self, question_ids: Sequence[int], statements: Sequence[str]) -> None:
+        self._index.add_many(list(question_ids), statement_hasher.signatures(statements))
+        metrics.set("question_index_size", len(self._index))
+
+    async def add_async(self, question_ids: Sequence[int], statements: Sequence[str]) -> None:
+        """Como add, con las firmas calculadas fuera del event loop (para lotes grandes)"""
+        signatures = await asyncio.to_thread(statement_hasher.signatures, list(statements))
+        self._index.add_many(list(question_ids), signatures)
+        metrics.set("question_index_size", len(self._index))
+
+    def similar(self, statement: str, threshold: Optional[float] = None, limit: Optional[int] = None, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """[(question_id, similitud estimada)] de mayor a menor similitud"""
+        return self._index.query(statement_hasher.signature(statement), threshold, limit, exclude_id)
+
+    def start_build(self) -> None:
+        if self._build_task is None:
+            self._build_task = asyncio.get_running_loop().create_task(self.build())
+
+    async def build(self) -> None:
+        """
+        Carga las preguntas existentes hasta el ID máximo al comenzar; las que se
+        inserten mientras tanto ya se agregan al crearse (QuizService.index_created_quiz).
+        """
+        started = asyncio.get_running_loop().time()
+        batch = settings.QUESTION_INDEX_BUILD_BATCH
+        try:
+            async with AsyncSessionLocal() as db:
+                max_id = (await db.execute(select(func.max(Question.id)))).scalar()
+                if max_id is not None:
+                    result = await db.stream(
+                        select(Question.id, Question.statement)
+                        .where(Question.id <= max_id)
+                        .order_by(Question.id)
+                        .execution_options(yield_per=batch)
+                    )
+                    async for rows in result.partitions(batch):
+                        signatures = await asyncio.to_thread(statement_hasher.signatures, [row.statement for row in rows])
+                        self._index.add_many([row.id for row in rows], signatures)
+                        metrics.set("question_index_size", len(self._index))
+            self.ready = True
+            elapsed = asyncio.get_running_loop().time() - started
+            metrics.set("question_index_build_seconds", round(elapsed, 3))
+            logger.info(f"Índice de casi duplicados cargado: {len(self._index)} preguntas en {elapsed:.1f} s")
+        except Exception as e:
+            logger.error(f"No se pudo cargar el índice de casi duplicados: {e}", exc_info=True)
+        finally:
+            self._build_task = None
+
+
+question_index = QuestionIndex()
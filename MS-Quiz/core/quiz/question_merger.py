@@ -0,0 +1,67 @@
+import re
+import unicodedata
+from typing import List, Dict, Any
+
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+
+class QuestionMerger:
+    """
+    Utilidades para combinar preguntas generadas en varias llamadas al modelo:
+    normalización de enunciados, selección con cobertura y reajuste de puntos.
+    La deduplicación está en near_duplicates.
+    """
+
+    @staticmethod
+    def normalize_statement(statement: str) -> str:
+        """Normaliza un enunciado ignorando tildes, mayúsculas, puntuación y espacios"""
+        text = unicodedata.normalize("NFKD", statement or "")
+        text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+        text = _NON_WORD_RE.sub(" ", text)
+        return _SPACES_RE.sub(" ", text).strip()
+
+    @staticmethod
+    def select_round_robin(groups: List[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+        """
+        Toma preguntas alternando entre grupos (secciones del documento) hasta
+        alcanzar 'limit', para repartir la cobertura de forma uniforme.
+        """
+        selected = []
+        index = 0
+        while len(selected) < limit and any(index < len(g) for g in groups):
+            for group in groups:
+                if index < len(group) and len(selected) < limit:
+                    selected.append(group[index])
+            index += 1
+        return selected
+
+    @staticmethod
+    def rebalance_points(questions: List[Dict[str, Any]], point_max: int) -> List[Dict[str, Any]]:
+        """
+        Reajusta los puntos para que sumen exactamente point_max, respetando la
+        proporción original entre preguntas y un mínimo de 1 punto por pregunta
+        (método del mayor resto).
+        """
+        if not questions:
+            return questions
+
+        weights = [max(1, int(q.get("points") or 1)) for q in questions]
+        extra = point_max - len(questions)
+        if extra <= 0:
+            # No alcanza para más de 1 punto por pregunta
+            for q in questions:
+                q["points"] = 1
+            return questions
+
+        total_weight = sum(weights)
+        shares = [w * extra / total_weight for w in weights]
+        floors = [int(s) for s in shares]
+        remaining = extra - sum(floors)
+        by_remainder = sorted(range(len(questions)), key=lambda i: (-(shares[i] - floors[i]), i))
+        for i in by_remainder[:remaining]:
+            floors[i] += 1
+
+        for q, bonus in zip(questions, floors):
+            q["points"] = 1 + bonus
+        return questions
@@ -1,22 +1,52 @@
 import json
 import logging
-import google.generativeai as genai
 from sqlalchemy.ext.asyncio import AsyncSession
 import io
 import re
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, AsyncIterator
 import datetime
 from datetime import datetime, timedelta
 import math
 
 from config.settings import get_settings
+from core.pdf.pdf_extractor import PDFExtractor
+from core.quiz.text_chunker import TextChunker
+from core.quiz.question_merger import QuestionMerger
+from core.quiz.question_bank_service import QuestionBankService
+from core.quiz.near_duplicates import LSHIndex, dedupe_questions, near_duplicate_mask, new_statement_index
+from core.quiz.stream_parser import IncrementalQuestionParser
+from core.ai.prompt_builder import PromptBuilder
+from core.ai.response_schema import quiz_response_schema, questions_response_schema, variants_response_schema
+from core.ai.llm_provider import get_llm_provider, OPERATION_GENERATE_PDF, OPERATION_GENERATE_TEXT, OPERATION_REPAIR
+from core.metrics import metrics
 from db.models.quiz import *
+from schemas.quiz import QuestionOutput
+from pydantic import ValidationError
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Configurar la API de Google Gemini
-genai.configure(api_key=settings.GOOGLE_API_KEY)
+# Modos de envío del PDF a Gemini
+PDF_MODE_RAW = "raw"    # El PDF completo como parte binaria
+PDF_MODE_TEXT = "text"  # Solo el texto extraído localmente (menos bytes y tokens)
+PDF_MODES = (PDF_MODE_RAW, PDF_MODE_TEXT)
+
+ANSWER_FORMATS = ("base_text", "base_multiple_option")
+
+# Extracción de JSON de salidas de texto heredadas (compilado una sola vez)
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*([\s\S]*?)\s*```")
+_LINE_COMMENT_RE = re.compile(r"^\s*//.*$", re.MULTILINE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_JSON_DECODER = json.JSONDecoder()
+
+metrics.describe("quiz_generation_parse_failures_total", "Respuestas de generación que no eran JSON directo (fast_path) o que no se pudieron reparar (unrecoverable)")
+metrics.describe("quiz_generation_invalid_questions_total", "Preguntas generadas que no pasaron la validación")
+metrics.describe("quiz_generation_repair_calls_total", "Llamadas al modelo para regenerar solo preguntas inválidas")
+metrics.describe("quiz_generation_repaired_questions_total", "Preguntas inválidas reemplazadas con éxito por la reparación")
+metrics.describe("quiz_generation_near_duplicates_total", "Preguntas generadas descartadas o reparadas por ser casi idénticas a otra del mismo quiz")
+metrics.describe("quiz_generation_discarded_variants_total", "Variantes descartadas porque tras la reparación no seguían la estructura por posición")
+metrics.describe("quiz_generation_bank_questions_total", "Preguntas tomadas del banco en la generación bank-first (reused) o generadas para completar (generated)")
 
 class QuizGenerator:
     """
@@ -24,42 +54,60 @@ class QuizGenerator:
     """
     @staticmethod
     def _extract_and_fix_json(response_text: str) -> Dict[str, Any]:
-        json_patterns = [
-            r"```json\s*([\s\S]*?)\s*```",
-            r"```\s*([\s\S]*?)\s*```",
-            r"\{[\s\S]*\}"
-        ]
-        
-        extracted_json_str = None
-        for pattern in json_patterns:
-            matches = re.findall(pattern, response_text)
-            if matches:
-                for match in matches:
-                    try:
-                        extracted_json_str = match.strip()
-                        json.loads(extracted_json_str)
-                        return json.loads(extracted_json_str)
-                    except json.JSONDecodeError:
-                        continue
-                if extracted_json_str:
-                    break
-        
-        extracted_json_str = response_text.strip() # Si no se encuentra con regex, usar el texto completo
-        
+        """
+        Extrae el objeto JSON de la respuesta del modelo en una sola pasada.
+
+        Camino rápido: la respuesta ya es JSON (modo application/json con schema).
+        Para salidas de texto heredadas se toma el primer bloque ```json``` (o el
+        texto completo) y se decodifica desde la primera llave con raw_decode,
+        ignorando lo que venga después. Solo si eso falla se intenta una
+        reparación simple (comentarios //, comas finales y comillas simples).
+        """
+        text = response_text.strip()
         try:
-            return json.loads(extracted_json_str)
+            return QuizGenerator._as_quiz_dict(json.loads(text))
         except json.JSONDecodeError:
-            try: # Intentar una corrección simple si falla
-                fixed_json = extracted_json_str.replace("'", '"')
-                return json.loads(fixed_json)
-            except json.JSONDecodeError as e:
-                logger.error(f"Error severo al parsear/reparar JSON de Gemini: {e}. Texto original: {response_text[:500]}...")
-                raise ValueError("La respuesta de Gemini no contiene un JSON válido y no pudo ser reparada.")
+            metrics.inc("quiz_generation_parse_failures_total", stage="fast_path")
+
+        fence_match = _JSON_FENCE_RE.search(text)
+        candidate = fence_match.group(1) if fence_match else text
+        start = candidate.find("{")
+
+        if start >= 0:
+            try:
+                parsed, _ = _JSON_DECODER.raw_decode(candidate, start)
+                return QuizGenerator._as_quiz_dict(parsed)
+            except json.JSONDecodeError:
+                pass
+
+            fixed_json = _LINE_COMMENT_RE.sub("", candidate[start:])
+            fixed_json = _TRAILING_COMMA_RE.sub(r"\1", fixed_json)
+            for attempt in (fixed_json, fixed_json.replace("'", '"')):
+                try:
+                    parsed, _ = _JSON_DECODER.raw_decode(attempt)
+                    return QuizGenerator._as_quiz_dict(parsed)
+                except json.JSONDecodeError:
+                    continue
+
+        metrics.inc("quiz_generation_parse_failures_total", stage="unrecoverable")
+        logger.error(f"Error severo al parsear/reparar JSON de Gemini. Texto original: {response_text[:500]}...")
+        raise ValueError("La respuesta de Gemini no contiene un JSON válido y no pudo ser reparada.")
 
     @staticmethod
-    async def create_quiz_from_pdf(pdf_content: bytes, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        
-        # Validaciones de entrada
+    def _as_quiz_dict(parsed: Any) -> Dict[str, Any]:
+        # Algunas respuestas traen solo la lista de preguntas
+        if isinstance(parsed, list):
+            return {"questions": parsed}
+        if not isinstance(parsed, dict):
+            raise json.JSONDecodeError("Se esperaba un objeto JSON", str(parsed), 0)
+        return parsed
+
+    @staticmethod
+    def _validate_generation_input(input_data: Dict[str, Any], operation: str = OPERATION_GENERATE_TEXT) -> Dict[str, Any]:
+        """
+        Valida los parámetros comunes de generación y los retorna normalizados.
+        'operation' etiqueta las llamadas al LLM de esta generación (PDF o texto).
+        """
         if not input_data or not isinstance(input_data, dict):
             raise ValueError("Los datos de entrada para la generación del quiz son inválidos.")
         
@@ -68,6 +116,7 @@ class QuizGenerator:
         point_max = input_data.get("point_max") # Nuevo campo
         competences = input_data.get("competences")
         type_question_flags = input_data.get("type_question")
+        variants = input_data.get("variants", 1)
 
         if not isinstance(classroom_id, int):
             raise ValueError("classroom_id es requerido y debe ser un entero.")
@@ -79,6 +128,8 @@ class QuizGenerator:
             raise ValueError("competences es requerido y debe ser una lista.")
         if not isinstance(type_question_flags, dict):
             raise ValueError("type_question es requerido y debe ser un objeto.")
+        if not isinstance(variants, int) or not 1 <= variants <= settings.MAX_QUIZ_VARIANTS:
+            raise ValueError(f"variants debe ser un entero entre 1 y {settings.MAX_QUIZ_VARIANTS}.")
 
         enabled_question_types = [
             q_type for q_type, enabled in type_question_flags.items() if enabled
@@ -87,330 +138,843 @@ class QuizGenerator:
         if not enabled_question_types:
             raise ValueError("Al menos un tipo de pregunta debe estar habilitado (true) en 'type_question'.")
 
-        competences_str = json.dumps(competences, ensure_ascii=False)
-
         current_time = datetime.now()
-        end_time = current_time + timedelta(hours=1) # Quiz de 1 hora de duración
-
-        # Definir el prompt para Gemini con las nuevas restricciones
-        prompt = f"""
-            Analiza el contenido del documento PDF adjunto en profundidad. Tu tarea es generar un quiz educativo con {num_question} preguntas, siguiendo las siguientes directrices y restricciones estrictas:
-
-            **Directrices Generales:**
-            1.  El quiz debe tener un **título** y una **instrucción general** relevante al contenido del PDF.
-            2.  **Puntos Totales:** La suma total de los "points" de todas las preguntas generadas debe ser **igual o muy cercana a {point_max}**. Distribuye los puntos de manera que se ajuste a este total.
-            3.  **Distribución de Preguntas:**
-                -   Genera preguntas únicamente de los tipos habilitados en `type_question`: {', '.join(enabled_question_types)}.
-                -   Asegura una **distribución lo más equitativa y uniforme posible** de los {num_question} preguntas entre los **tipos de pregunta habilitados** (textuales, inferenciales, críticas) y también entre los **formatos de respuesta** (**"base_text"** para respuestas de texto libre, y **"base_multiple_option"** para opción múltiple).
-                -   Si un tipo de pregunta o formato de respuesta no está habilitado, **no lo uses**.
-            4.  **Combinación de Competencias:** Para cada pregunta, es **IMPERATIVO** que selecciones **múltiples competencias** (idealmente 2 o más si es relevante y posible) de la lista proporcionada. La selección debe basarse en la afinidad fuerte de la pregunta con la 'description' y 'name' de **todas las competencias seleccionadas**. Busca conectar conceptos en la pregunta con varias áreas de competencia.
-
-            **Estructura de Cada Pregunta:**
-            Para cada pregunta, incluye los siguientes campos exactos y con sus tipos de datos correctos:
-            -   **"statement"**: El enunciado claro y conciso de la pregunta.
-            -   **"answer_correct"**:
-                -   Si `answer_base.type` es "base_text", esta es la respuesta completa y correcta a la pregunta abierta.
-                -   Si `answer_base.type` es "base_multiple_option", esta debe ser **exactamente uno de los textos de las opciones proporcionadas** en la lista `options`.
-            -   **"points"**: Un valor numérico entero y positivo para la pregunta. La suma de estos puntos debe ajustarse a `point_max`.
-            -   **"answer_base"**: Un objeto JSON con los detalles del formato de respuesta:
-                -   **"type"**: Un string que debe ser **"base_text"** o **"base_multiple_option"**.
-                -   **"options"**: (SOLO si "type" es "base_multiple_option") Una lista de strings que contienen las posibles opciones de respuesta. Debe haber **entre 3 y 5 opciones**, y una de ellas debe ser la `answer_correct`.
-            -   **"competences_id"**: Una **lista de números enteros** (IDs) de las competencias relevantes para la pregunta. Estos IDs deben ser tomados **EXCLUSIVAMENTE** del listado de competencias que te proporciono.
-
-            **Listado de Competencias Disponibles:**
-            {competences_str}
-
-            **Formato de Salida Requerido (JSON Exacto):**
-            Devuelve **SOLO un objeto JSON** que siga este formato exacto, sin ningún texto adicional, explicaciones, o bloques de código que no sean el propio JSON, ni antes ni después.
-
-            ```json
-            {{
-                "classroom_id": {classroom_id},
-                "title": "Un título descriptivo para el quiz",
-                "instruction": "Instrucciones claras para los estudiantes sobre cómo completar el quiz.",
-                "start_time": "{current_time.isoformat()}Z",
-                "end_time": "{end_time.isoformat()}Z",
-                "questions": [
-                    {{
-                        "statement": "Enunciado de la primera pregunta, combinando tipos y competencias.",
-                        "answer_correct": "Respuesta correcta para esta pregunta.",
-                        "points": 10,
-                        "answer_base": {{
-                            "type": "base_text"
-                        }},
-                        "competences_id": [1, 2]
-                    }},
-                    {{
-                        "statement": "Pregunta de opción múltiple con enfoque crítico y varias competencias.",
-                        "answer_correct": "Opción Correcta A",
-                        "points": 10,
-                        "answer_base": {{
-                            "type": "base_multiple_option",
-                            "options": [
-                                "Opción Correcta A",
-                                "Opción Incorrecta B",
-                                "Opción Incorrecta C"
-                            ]
-                        }},
-                        "competences_id": [2]
-                    }}
-                    // ... más preguntas hasta alcanzar num_question y sume point_max
-                ]
-            }}
-            ```
-            Asegúrate de que `start_time` y `end_time` sean fechas y horas ISO 8601 válidas (sin terminacion Z) , reflejando el momento actual y una hora después, respectivamente. La calidad de las preguntas, la correcta asignación de puntos para sumar {point_max} y la combinación de competencias es fundamental.
-            """
-
-        model = genai.GenerativeModel(
-            settings.GEMINI_MODEL,
-            generation_config={"temperature": 0.7, "response_mime_type": "application/json"}
-        )
+        return {
+            "classroom_id": classroom_id,
+            "num_question": num_question,
+            "point_max": point_max,
+            "competences": competences,
+            "enabled_question_types": enabled_question_types,
+            "text": input_data.get("text"),
+            "current_time": current_time,
+            "end_time": current_time + timedelta(hours=1), # Quiz de 1 hora de duración
+            "operation": operation,
+            "variants": variants,
+        }
+
+    @staticmethod
+    def _build_generation_prompt(params: Dict[str, Any], section_note: Optional[str] = None) -> str:
+        return PromptBuilder.generation_prompt(params, section_note)
+
+    @staticmethod
+    def _normalize_question(q: Dict[str, Any]) -> Dict[str, Any]:
+        q_type = q["answer_base"]["type"]
+        q_options = q["answer_base"].get("options", []) if q_type == "base_multiple_option" else []
         
-        contents = [
-            prompt, # Usamos el prompt actualizado
+        return {
+            "statement": q["statement"],
+            "answer_correct": q["answer_correct"],
+            "points": q["points"],
+            "answer_base": {
+                "type": q_type,
+                **({"options": q_options} if q_options else {})
+            },
+            "competences_id": q.get("competences_id", [])
+        }
+
+    @staticmethod
+    def _normalize_generated_quiz(generated_quiz_data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        classroom_id = params["classroom_id"]
+        num_question = params["num_question"]
+        point_max = params["point_max"]
+        current_time = params["current_time"]
+        end_time = params["end_time"]
+
+        # Asegurar que classroom_id del output coincida con el input
+        generated_quiz_data["classroom_id"] = classroom_id
+        
+        # --- Lógica de ajuste post-generación (si Gemini no cumple exactamente) ---
+        # Aunque Gemini debería seguir las instrucciones, esto es una capa de seguridad.
+        
+        # Ajustar número de preguntas si es necesario
+        if len(generated_quiz_data.get("questions", [])) < num_question:
+            generated_quiz_data.setdefault("questions", [])
+            for _ in range(num_question - len(generated_quiz_data["questions"])):
+                generated_quiz_data["questions"].append({
+                    "statement": "Pregunta de relleno por ajuste de cantidad.",
+                    "answer_correct": "Respuesta.",
+                    "points": 1, # Puntos bajos para no exceder point_max
+                    "answer_base": {"type": "base_text"},
+                    "competences_id": []
+                })
+        generated_quiz_data["questions"] = generated_quiz_data["questions"][:num_question]
+
+        # Ajustar puntos para que la suma no exceda point_max
+        current_total_points = sum(q.get("points", 0) for q in generated_quiz_data["questions"])
+        if current_total_points > point_max:
+            # Si los puntos exceden, se redistribuyen proporcionalmente o se reducen.
+            # Una estrategia simple es reducir los puntos de cada pregunta de forma uniforme.
+            reduction_factor = point_max / current_total_points
+            for q in generated_quiz_data["questions"]:
+                q["points"] = max(1, round(q.get("points", 1) * reduction_factor)) # Mínimo 1 punto
+
+        # Re-validar la estructura para asegurar que cumple con el schema de salida
+        output_questions = [
+            QuizGenerator._normalize_question(q) for q in generated_quiz_data.get("questions", [])
+        ]
+
+        return {
+            "classroom_id": generated_quiz_data.get("classroom_id", classroom_id),
+            "title": generated_quiz_data.get("title", "Quiz Generado"),
+            "instruction": generated_quiz_data.get("instruction", "Responde las siguientes preguntas basadas en el documento."),
+            "start_time": generated_quiz_data.get("start_time", current_time.isoformat() + "Z"),
+            "end_time": generated_quiz_data.get("end_time", end_time.isoformat() + "Z"),
+            "questions": output_questions
+        }
+
+    @staticmethod
+    def _document_text_part(pages: List[str]) -> str:
+        document_text = "\n\n".join(page for page in pages if page)
+        if not document_text.strip():
+            raise ValueError("No se pudo extraer texto del PDF (¿es un documento escaneado?). Usa pdf_mode 'raw'.")
+        return f"Contenido del documento PDF adjunto (texto extraído):\n{document_text}"
+
+    @staticmethod
+    async def build_pdf_contents(prompt: str, pdf_content: bytes, pdf_mode: str = PDF_MODE_RAW) -> List[Any]:
+        """
+        Arma el contenido a enviar a Gemini según el modo de PDF.
+
+        En modo "text" el PDF se extrae en el pool de procesos y solo viaja
+        el texto compactado; en modo "raw" se adjunta el PDF completo.
+        """
+        if pdf_mode not in PDF_MODES:
+            raise ValueError(f"pdf_mode debe ser uno de: {', '.join(PDF_MODES)}.")
+
+        if pdf_mode == PDF_MODE_TEXT:
+            pages = await PDFExtractor.extract_pages(pdf_content, compact=True)
+            return [prompt, QuizGenerator._document_text_part(pages)]
+
+        return [
+            prompt,
             {"mime_type": "application/pdf", "data": pdf_content}
         ]
 
-        try:
-            response = await model.generate_content_async(contents, request_options={"timeout": 600})
-            response_text = response.text
-            
-            generated_quiz_data = QuizGenerator._extract_and_fix_json(response_text)
-            
-            # Asegurar que classroom_id del output coincida con el input
-            generated_quiz_data["classroom_id"] = classroom_id
-            
-            # --- Lógica de ajuste post-generación (si Gemini no cumple exactamente) ---
-            # Aunque Gemini debería seguir las instrucciones, esto es una capa de seguridad.
-            
-            # Ajustar número de preguntas si es necesario
-            if len(generated_quiz_data.get("questions", [])) < num_question:
-                for _ in range(num_question - len(generated_quiz_data.get("questions", []))):
-                    generated_quiz_data["questions"].append({
-                        "statement": "Pregunta de relleno por ajuste de cantidad.",
-                        "answer_correct": "Respuesta.",
-                        "points": 1, # Puntos bajos para no exceder point_max
-                        "answer_base": {"type": "base_text"},
-                        "competences_id": []
-                    })
-            generated_quiz_data["questions"] = generated_quiz_data["questions"][:num_question]
-
-            # Ajustar puntos para que la suma no exceda point_max
-            current_total_points = sum(q.get("points", 0) for q in generated_quiz_data["questions"])
-            if current_total_points > point_max:
-                # Si los puntos exceden, se redistribuyen proporcionalmente o se reducen.
-                # Una estrategia simple es reducir los puntos de cada pregunta de forma uniforme.
-                reduction_factor = point_max / current_total_points
-                for q in generated_quiz_data["questions"]:
-                    q["points"] = max(1, round(q.get("points", 1) * reduction_factor)) # Mínimo 1 punto
-
-            # Re-validar la estructura para asegurar que cumple con el schema de salida
-            output_questions = []
-            for q in generated_quiz_data.get("questions", []):
-                q_type = q["answer_base"]["type"]
-                q_options = q["answer_base"].get("options", []) if q_type == "base_multiple_option" else []
-                
-                output_questions.append({
-                    "statement": q["statement"],
-                    "answer_correct": q["answer_correct"],
-                    "points": q["points"],
-                    "answer_base": {
-                        "type": q_type,
-                        **({"options": q_options} if q_options else {})
-                    },
-                    "competences_id": q.get("competences_id", [])
-                })
+    @staticmethod
+    def _llm_tags(params: Dict[str, Any]) -> Dict[str, Any]:
+        tags = {"classroom_id": params["classroom_id"], "num_question": params["num_question"]}
+        if params.get("variants", 1) > 1:
+            tags["variants"] = params["variants"]
+        return tags
+
+    @staticmethod
+    async def _call_model(
+        contents: List[Any],
+        params: Dict[str, Any],
+        operation: Optional[str] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
+        temperature: float = 0.7,
+    ) -> Dict[str, Any]:
+        response = await get_llm_provider().generate(
+            contents,
+            operation=operation or params["operation"],
+            temperature=temperature,
+            response_schema=response_schema or quiz_response_schema(),
+            timeout=600,
+            tags=QuizGenerator._llm_tags(params),
+            system_instruction=PromptBuilder.generation_system_instruction(),
+        )
+        return QuizGenerator._extract_and_fix_json(response.text)
+
+    @staticmethod
+    def _mark_near_duplicates(validated: List[Optional[Dict[str, Any]]], invalid, questions: List[Any], index: LSHIndex, reason: str) -> None:
+        """
+        Marca como inválidas las preguntas casi idénticas a una anterior o a una
+        ya registrada en 'index' (que se comparte, por ejemplo, entre variantes),
+        para que la reparación las reemplace.
+        """
+        positions = [i for i, q in enumerate(validated) if q is not None]
+        mask = near_duplicate_mask([validated[i]["statement"] for i in positions], index)
+        for i, duplicate in zip(positions, mask):
+            if duplicate:
+                validated[i] = None
+                invalid.append((i, questions[i], reason))
+        metrics.inc("quiz_generation_near_duplicates_total", sum(mask))
+
+    @staticmethod
+    async def _validate_and_repair(questions: List[Any], contents: List[Any], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Valida las preguntas y reemplaza en su misma posición las inválidas o repetidas que se pudieron reparar"""
+        validated, invalid = QuizGenerator._validate_questions(questions, params)
+        QuizGenerator._mark_near_duplicates(validated, invalid, questions, new_statement_index(), "Casi idéntica a otra pregunta del quiz.")
+        return await QuizGenerator._repair_in_place(validated, invalid, contents, params)
+
+    @staticmethod
+    async def _repair_in_place(validated: List[Optional[Dict[str, Any]]], invalid, contents: List[Any], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        repaired = await QuizGenerator._repair_positions(validated, invalid, contents, params)
+        return [q for q in repaired if q is not None]
+
+    @staticmethod
+    async def _repair_positions(validated: List[Optional[Dict[str, Any]]], invalid, contents: List[Any], params: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+        """Como _repair_in_place, pero deja None en las posiciones que no se pudieron reparar"""
+        if invalid:
+            valid_questions = [q for q in validated if q is not None]
+            repaired = iter(await QuizGenerator._repair_questions(invalid, valid_questions, contents, params))
+            for index, _, _ in invalid:
+                validated[index] = next(repaired, None)
+        return validated
+
+    @staticmethod
+    async def _generate_quiz(contents: List[Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        generated_quiz_data = await QuizGenerator._call_model(contents, params)
+        generated_quiz_data["questions"] = await QuizGenerator._validate_and_repair(
+            generated_quiz_data.get("questions", []), contents, params
+        )
+        return QuizGenerator._normalize_generated_quiz(generated_quiz_data, params)
+
+    @staticmethod
+    def _should_chunk(input_data: Dict[str, Any], content_length: int) -> bool:
+        chunked = input_data.get("chunked")
+        if chunked is not None:
+            return bool(chunked)
+        return content_length > settings.CHUNKED_GENERATION_MIN_CHARS
+
+    @staticmethod
+    async def _generate_quiz_chunked(sections: List[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Generación map-reduce: cada sección produce preguntas candidatas de forma
+        concurrente (acotada por LLM_MAX_CONCURRENCY) y luego se combinan,
+        deduplican y seleccionan las num_question finales con los puntos
+        reajustados a point_max.
+        """
+        num_question = params["num_question"]
+        num_sections = len(sections)
+        per_section = max(1, math.ceil(num_question * settings.CHUNK_CANDIDATE_FACTOR / num_sections))
+        section_points = max(per_section, round(params["point_max"] * per_section / num_question))
+
+        section_params = {**params, "text": None, "num_question": per_section, "point_max": section_points}
+
+        async def generate_section(index: int, section: str) -> Dict[str, Any]:
+            note = (
+                f"Este es el fragmento {index + 1} de {num_sections} del documento: genera preguntas "
+                f"basadas únicamente en este fragmento."
+            )
+            prompt = QuizGenerator._build_generation_prompt(section_params, section_note=note)
+            return await QuizGenerator._call_model(
+                [prompt, f"Fragmento {index + 1}/{num_sections} del documento:\n{section}"], section_params
+            )
+
+        results = await asyncio.gather(
+            *(generate_section(i, section) for i, section in enumerate(sections)),
+            return_exceptions=True
+        )
+
+        groups = []
+        first_ok: Optional[Dict[str, Any]] = None
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.warning(f"Fallo la generación del fragmento {i + 1}/{num_sections}: {result}")
+                continue
+            if first_ok is None:
+                first_ok = result
+            # Hay candidatas de sobra: las inválidas se descartan sin reparar
+            validated, _ = QuizGenerator._validate_questions(result.get("questions", []), params)
+            groups.append([q for q in validated if q is not None])
+
+        if first_ok is None:
+            raise ValueError("No se pudo generar preguntas para ningún fragmento del documento.")
+
+        # Deduplicar sobre el conjunto completo manteniendo el agrupamiento por sección
+        unique_ids = {id(q) for q in dedupe_questions([q for group in groups for q in group])}
+        groups = [[q for q in group if id(q) in unique_ids] for group in groups]
+
+        selected = QuestionMerger.select_round_robin(groups, num_question)
+        QuestionMerger.rebalance_points(selected, params["point_max"])
 
-            return {
-                "classroom_id": generated_quiz_data.get("classroom_id", classroom_id),
-                "title": generated_quiz_data.get("title", "Quiz Generado"),
-                "instruction": generated_quiz_data.get("instruction", "Responde las siguientes preguntas basadas en el documento."),
-                "start_time": generated_quiz_data.get("start_time", current_time.isoformat() + "Z"),
-                "end_time": generated_quiz_data.get("end_time", end_time.isoformat() + "Z"),
-                "questions": output_questions
+        merged = {
+            "title": first_ok.get("title"),
+            "instruction": first_ok.get("instruction"),
+            "questions": selected,
+        }
+        return QuizGenerator._normalize_generated_quiz(merged, params)
+
+    @staticmethod
+    def _plan_fanout(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Reparte num_question entre sub-peticiones por combinación de tipo de
+        pregunta y formato de respuesta. Si no alcanzan las preguntas para una
+        sub-petición por combinación, las combinaciones se agrupan de forma
+        intercalada para que cada sub-petición mezcle tipos y formatos.
+        El plan es determinista para una misma entrada.
+        """
+        num_question = params["num_question"]
+        combos = [(t, f) for t in params["enabled_question_types"] for f in ANSWER_FORMATS]
+        num_requests = min(len(combos), num_question // max(1, settings.FANOUT_MIN_PER_REQUEST))
+        if num_requests < 2:
+            return []
+
+        buckets = [combos[i::num_requests] for i in range(num_requests)]
+        base, remainder = divmod(num_question, num_requests)
+        return [
+            {"combos": bucket, "num_question": base + (1 if i < remainder else 0)}
+            for i, bucket in enumerate(buckets)
+        ]
+
+    @staticmethod
+    def _should_fan_out(input_data: Dict[str, Any], params: Dict[str, Any]) -> bool:
+        fanout = input_data.get("fanout")
+        if fanout is not None:
+            return bool(fanout)
+        return params["num_question"] >= settings.FANOUT_MIN_QUESTIONS
+
+    @staticmethod
+    async def _generate_quiz_fanout(contents: List[Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Divide la generación en sub-peticiones concurrentes (ver _plan_fanout) que
+        comparten el mismo contenido de contexto, de modo que la latencia sigue a
+        la sub-petición más larga y no al total de preguntas. Cada sub-petición
+        pide FANOUT_EXTRA_QUESTIONS preguntas de reserva para cubrir las que
+        resulten inválidas o duplicadas; la combinación final es determinista.
+        """
+        plan = QuizGenerator._plan_fanout(params)
+        if not plan:
+            return await QuizGenerator._generate_quiz(contents, params)
+
+        num_question = params["num_question"]
+
+        async def generate_part(part: Dict[str, Any]) -> Dict[str, Any]:
+            requested = part["num_question"] + settings.FANOUT_EXTRA_QUESTIONS
+            part_params = {
+                **params,
+                "num_question": requested,
+                "point_max": max(requested, round(params["point_max"] * requested / num_question)),
+                "enabled_question_types": list(dict.fromkeys(t for t, _ in part["combos"])),
             }
+            combos_str = ", ".join(f"{t} con formato {f}" for t, f in part["combos"])
+            note = (
+                f"Genera SOLO preguntas de estas combinaciones de tipo de pregunta y formato de respuesta, "
+                f"repartidas de forma equitativa: {combos_str}."
+            )
+            prompt = QuizGenerator._build_generation_prompt(part_params, section_note=note)
+            return await QuizGenerator._call_model([prompt, *contents[1:]], part_params)
+
+        results = await asyncio.gather(*(generate_part(part) for part in plan), return_exceptions=True)
+
+        groups = []
+        quotas = []
+        first_ok: Optional[Dict[str, Any]] = None
+        for part, result in zip(plan, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Fallo la sub-petición {part['combos']}: {result}")
+                continue
+            if first_ok is None:
+                first_ok = result
+            validated, _ = QuizGenerator._validate_questions(result.get("questions", []), params)
+            groups.append([q for q in validated if q is not None])
+            quotas.append(part["num_question"])
+
+        if first_ok is None:
+            raise ValueError("No se pudo generar preguntas en ninguna de las sub-peticiones.")
+
+        unique_ids = {id(q) for q in dedupe_questions([q for group in groups for q in group])}
+        groups = [[q for q in group if id(q) in unique_ids] for group in groups]
+
+        # Primero la cuota de cada sub-petición, luego las reservas para cubrir faltantes
+        selected = QuestionMerger.select_round_robin(
+            [group[:quota] for group, quota in zip(groups, quotas)], num_question
+        )
+        selected += QuestionMerger.select_round_robin(
+            [group[quota:] for group, quota in zip(groups, quotas)], num_question - len(selected)
+        )
+        QuestionMerger.rebalance_points(selected, params["point_max"])
+
+        merged = {
+            "title": first_ok.get("title"),
+            "instruction": first_ok.get("instruction"),
+            "questions": selected,
+        }
+        return QuizGenerator._normalize_generated_quiz(merged, params)
+
+    @staticmethod
+    def _variant_blueprint(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Puntos (p), formato (f) y competencias (c) por posición, comunes a todas
+        las variantes. Se fija antes de generar, a partir de los parámetros: los
+        puntos se reparten por igual hasta point_max, los formatos se alternan y
+        las competencias se asignan de a dos por turnos, de modo que todas quedan
+        cubiertas.
+        """
+        num_question = params["num_question"]
+        points = QuestionMerger.rebalance_points([{"points": 1} for _ in range(num_question)], params["point_max"])
+        competence_ids = [c["id"] for c in PromptBuilder.compact_competences(params["competences"]) if c.get("id") is not None]
+        per_question = min(2, len(competence_ids))
+        blueprint = []
+        for i in range(num_question):
+            competences = [competence_ids[(i * per_question + k) % len(competence_ids)] for k in range(per_question)]
+            blueprint.append({
+                "p": points[i]["points"],
+                "f": "mc" if i % 2 == 0 else "txt",
+                "c": list(dict.fromkeys(competences)),
+            })
+        return blueprint
+
+    @staticmethod
+    def _blueprint_type(slot: Dict[str, Any]) -> str:
+        return "base_multiple_option" if slot["f"] == "mc" else "base_text"
+
+    @staticmethod
+    def _blueprint_mismatch(question: Dict[str, Any], slot: Dict[str, Any]) -> Optional[str]:
+        """Motivo por el que una pregunta válida no sigue su posición de la estructura, o None"""
+        expected_type = QuizGenerator._blueprint_type(slot)
+        if question["answer_base"]["type"] != expected_type:
+            return f"Debe tener formato {expected_type}."
+        if set(question["competences_id"]) != set(slot["c"]):
+            return f"Debe evaluar exactamente las competencias {slot['c']}."
+        return None
+
+    @staticmethod
+    def _mark_off_blueprint(validated: List[Optional[Dict[str, Any]]], invalid, questions: List[Any], blueprint: List[Dict[str, Any]]) -> None:
+        """
+        Marca como inválidas las preguntas que no siguen su posición de la
+        estructura y agrega las posiciones que faltan, para que la reparación las
+        genere. Cada motivo incluye lo que se espera en esa posición.
+        """
+        for i, question in enumerate(validated):
+            reason = question is not None and QuizGenerator._blueprint_mismatch(question, blueprint[i])
+            if reason:
+                validated[i] = None
+                invalid.append((i, questions[i], reason))
+        for i in range(len(validated), len(blueprint)):
+            validated.append(None)
+            invalid.append((i, {}, "Falta la pregunta de esta posición."))
+        for n, (i, question, reason) in enumerate(invalid):
+            slot = blueprint[i]
+            invalid[n] = (i, question, f"{reason} Reemplázala por una de formato {QuizGenerator._blueprint_type(slot)} "
+                                       f"que evalúe las competencias {slot['c']}.")
+
+    @staticmethod
+    async def _call_variants(
+        contents: List[Any],
+        params: Dict[str, Any],
+        num_variants: int,
+        blueprint: Optional[List[Dict[str, Any]]] = None,
+        existing: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Pide 'num_variants' variantes en una sola llamada; retorna el quiz con 'variants' como listas de preguntas"""
+        call_params = {**params, "variants": num_variants}
+        note = PromptBuilder.variants_note(num_variants, blueprint, existing)
+        prompt = QuizGenerator._build_generation_prompt(call_params, section_note=note)
+        data = await QuizGenerator._call_model(
+            [prompt, *contents[1:]], call_params, response_schema=variants_response_schema()
+        )
+        variants = [v.get("questions", []) for v in data.get("variants", []) if isinstance(v, dict)]
+        # Si el modelo ignoró el formato de variantes, lo que haya en "questions" cuenta como una
+        if not variants and data.get("questions"):
+            variants = [data["questions"]]
+        data["variants"] = variants
+        return data
+
+    @staticmethod
+    async def _check_variants(
+        raw_variants: List[List[Any]],
+        contents: List[Any],
+        params: Dict[str, Any],
+        seen: LSHIndex,
+        blueprint: List[Dict[str, Any]],
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Valida cada variante contra la estructura por posición y trata como
+        inválidas las preguntas casi idénticas a otra de la misma u otra variante
+        ('seen'); luego repara cada variante en paralelo. Las variantes que tras
+        la reparación siguen sin cumplir la estructura se descartan. Las que
+        quedan reciben los puntos de la estructura.
+        """
+        checked = []
+        for questions in raw_variants:
+            questions = list(questions[:len(blueprint)])
+            validated, invalid = QuizGenerator._validate_questions(questions, params)
+            QuizGenerator._mark_near_duplicates(validated, invalid, questions, seen, "Repite una pregunta de esta u otra variante.")
+            QuizGenerator._mark_off_blueprint(validated, invalid, questions, blueprint)
+            checked.append((validated, invalid))
+
+        repaired = await asyncio.gather(*(
+            QuizGenerator._repair_positions(validated, invalid, contents, params) for validated, invalid in checked
+        ))
+        matching = []
+        for questions in repaired:
+            if any(q is None or QuizGenerator._blueprint_mismatch(q, slot) for q, slot in zip(questions, blueprint)):
+                metrics.inc("quiz_generation_discarded_variants_total")
+                continue
+            for question, slot in zip(questions, blueprint):
+                question["points"] = slot["p"]
+            matching.append(questions)
+        return matching
+
+    @staticmethod
+    async def _generate_variants(contents: List[Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Genera params["variants"] versiones del quiz sobre el mismo contenido.
+
+        La estructura por posición (puntos, formato y competencias) se fija antes
+        de generar y va en todas las llamadas. La primera llamada produce hasta
+        VARIANTS_MAX_QUESTIONS_PER_CALL preguntas (todas las variantes que quepan);
+        cada variante se revisa posición por posición y se reparan las preguntas
+        que no cumplen. Las variantes que faltan, o que se descartaron por no
+        cumplir, se piden de nuevo en paralelo con el mismo documento (que el
+        proveedor reutiliza desde su caché de contexto).
+        """
+        num_variants = params["variants"]
+        per_call = max(1, settings.VARIANTS_MAX_QUESTIONS_PER_CALL // params["num_question"])
+        seen = new_statement_index()
+        blueprint = QuizGenerator._variant_blueprint(params)
+
+        first = await QuizGenerator._call_variants(contents, params, min(num_variants, per_call), blueprint)
+        variants = await QuizGenerator._check_variants(first["variants"][:num_variants], contents, params, seen, blueprint)
+
+        missing = num_variants - len(variants)
+        if missing > 0:
+            existing = [q["statement"] for group in variants for q in group]
+            batches = [min(per_call, missing - start) for start in range(0, missing, per_call)]
+            results = await asyncio.gather(
+                *(QuizGenerator._call_variants(contents, params, size, blueprint, existing) for size in batches),
+                return_exceptions=True
+            )
+            for size, result in zip(batches, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Fallo la generación de {size} variantes adicionales: {result}")
+                    continue
+                variants += await QuizGenerator._check_variants(result["variants"][:size], contents, params, seen, blueprint)
+        if not variants:
+            raise ValueError("El modelo no generó ninguna variante del quiz con la estructura pedida.")
+        if len(variants) < num_variants:
+            logger.warning(f"Solo se generaron {len(variants)} de {num_variants} variantes del quiz.")
+
+        variants = [
+            QuizGenerator._normalize_generated_quiz({"questions": questions}, params)["questions"]
+            for questions in variants[:num_variants]
+        ]
+        reference = QuizGenerator._normalize_generated_quiz({**first, "questions": variants[0]}, params)
+        reference["variants"] = [{"variant": i + 1, "questions": questions} for i, questions in enumerate(variants)]
+        return reference
+
+    @staticmethod
+    def _use_bank(input_data: Dict[str, Any], params: Dict[str, Any], db: Optional[AsyncSession]) -> bool:
+        bank_first = input_data.get("bank_first")
+        if bank_first is None:
+            bank_first = settings.BANK_FIRST_GENERATION
+        # Las variantes deben ser distintas entre sí: no se completan desde el banco
+        return bool(bank_first) and db is not None and params["variants"] == 1
+
+    @staticmethod
+    def _pick_bank_questions(candidates: List[Dict[str, Any]], params: Dict[str, Any], limit: int) -> List[Any]:
+        """
+        Elige hasta 'limit' candidatas válidas y sin enunciados casi idénticos: primero
+        las que cubren alguna competencia aún no cubierta y luego por relevancia.
+        Retorna [(id de la pregunta, pregunta normalizada)].
+        """
+        valid = []
+        for candidate in candidates:
+            try:
+                valid.append((candidate["id"], QuizGenerator._validate_question(candidate["question"], params)))
+            except ValueError:
+                continue
+        mask = near_duplicate_mask([question["statement"] for _, question in valid])
+        valid = [item for item, duplicate in zip(valid, mask) if not duplicate]
+
+        selected = []
+        covered = set()
+        for item in valid:
+            if len(selected) < limit and set(item[1]["competences_id"]) - covered:
+                selected.append(item)
+                covered.update(item[1]["competences_id"])
+        for item in valid:
+            if len(selected) < limit and item not in selected:
+                selected.append(item)
+        return selected
+
+    @staticmethod
+    async def _generate_bank_first(db: AsyncSession, params: Dict[str, Any], topic: Optional[str], generate) -> Dict[str, Any]:
+        """
+        Toma del banco las preguntas que encajan con las competencias y el tema
+        (sin las que el aula ya vio) y llama al LLM solo por las que faltan,
+        pidiéndole no repetir las reutilizadas. 'generate' recibe los parámetros
+        del faltante y retorna el quiz generado con el flujo habitual. Al final se
+        reajustan los puntos a point_max.
+        """
+        num_question = params["num_question"]
+        max_reused = min(num_question, int(num_question * settings.BANK_FIRST_MAX_RATIO))
+        competence_ids = [c.get("id") for c in params["competences"] if isinstance(c, dict) and isinstance(c.get("id"), int)]
+
+        reused = []
+        if max_reused > 0:
+            try:
+                candidates = await QuestionBankService.select_for_generation(
+                    db, params["classroom_id"], competence_ids, topic, max_reused * settings.BANK_CANDIDATE_FACTOR
+                )
+                reused = QuizGenerator._pick_bank_questions(candidates, params, max_reused)
+            except Exception as e:
+                # Sin banco se genera todo, como en el modo normal
+                logger.warning(f"No se pudo consultar el banco de preguntas: {e}")
+
+        shortfall = num_question - len(reused)
+        metrics.inc("quiz_generation_bank_questions_total", len(reused), source="reused")
+        metrics.inc("quiz_generation_bank_questions_total", shortfall, source="generated")
+
+        generated: Dict[str, Any] = {}
+        if shortfall > 0:
+            generated = await generate({
+                **params,
+                "num_question": shortfall,
+                "point_max": max(shortfall, round(params["point_max"] * shortfall / num_question)),
+                "avoid_statements": [q["statement"] for _, q in reused],
+            })
+
+        questions = [q for _, q in reused] + list(generated.get("questions", []))
+        QuestionMerger.rebalance_points(questions, params["point_max"])
+        quiz = QuizGenerator._normalize_generated_quiz({
+            "title": generated.get("title"),
+            "instruction": generated.get("instruction"),
+            "questions": questions,
+        }, params)
+        if not generated and params.get("text"):
+            quiz["title"] = f"Quiz: {params['text'][:80]}"
+        quiz["reused_question_ids"] = [question_id for question_id, _ in reused]
+        return quiz
+
+    @staticmethod
+    async def _generate_from_pdf(pdf_content: bytes, input_data: Dict[str, Any], params: Dict[str, Any], pages: Optional[List[str]] = None) -> Dict[str, Any]:
+        pdf_mode = input_data.get("pdf_mode") or settings.PDF_GENERATION_MODE
+        if pdf_mode not in PDF_MODES:
+            raise ValueError(f"pdf_mode debe ser uno de: {', '.join(PDF_MODES)}.")
+        prompt = QuizGenerator._build_generation_prompt(params)
+
+        # El modo por fragmentos necesita el texto; en modo "raw" solo se extrae si se pide explícitamente
+        if pdf_mode == PDF_MODE_TEXT or input_data.get("chunked"):
+            if pages is None:
+                pages = await PDFExtractor.extract_pages(pdf_content, compact=True)
+            if params["variants"] == 1 and QuizGenerator._should_chunk(input_data, sum(len(p) for p in pages)):
+                sections = TextChunker.split_sections(
+                    pages, settings.CHUNK_MAX_CHARS, settings.CHUNK_MAX_SECTIONS
+                )
+                if len(sections) > 1:
+                    return await QuizGenerator._generate_quiz_chunked(sections, params)
+            contents = [prompt, QuizGenerator._document_text_part(pages)]
+        else:
+            contents = await QuizGenerator.build_pdf_contents(prompt, pdf_content, pdf_mode)
+
+        if params["variants"] > 1:
+            return await QuizGenerator._generate_variants(contents, params)
+        if QuizGenerator._should_fan_out(input_data, params):
+            return await QuizGenerator._generate_quiz_fanout(contents, params)
+        return await QuizGenerator._generate_quiz(contents, params)
+
+    @staticmethod
+    async def _generate_from_text(input_data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        text = params.get("text") or ""
+        if params["variants"] == 1 and QuizGenerator._should_chunk(input_data, len(text)):
+            sections = TextChunker.split_text(text, settings.CHUNK_MAX_CHARS, settings.CHUNK_MAX_SECTIONS)
+            if len(sections) > 1:
+                return await QuizGenerator._generate_quiz_chunked(sections, params)
+
+        prompt = QuizGenerator._build_generation_prompt(params)
+        if params["variants"] > 1:
+            return await QuizGenerator._generate_variants([prompt], params)
+        if QuizGenerator._should_fan_out(input_data, params):
+            return await QuizGenerator._generate_quiz_fanout([prompt], params)
+        return await QuizGenerator._generate_quiz([prompt], params)
+
+    @staticmethod
+    async def create_quiz_from_pdf(pdf_content: bytes, input_data: Dict[str, Any], db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+        
+        # Validaciones de entrada
+        params = QuizGenerator._validate_generation_input(input_data, OPERATION_GENERATE_PDF)
+
+        try:
+            if QuizGenerator._use_bank(input_data, params, db):
+                # Sin tema explícito, la similitud se mide contra el texto del documento
+                pages = None
+                topic = params.get("text")
+                if not topic:
+                    pages = await PDFExtractor.extract_pages(pdf_content, compact=True)
+                    topic = "\n".join(pages)
+                return await QuizGenerator._generate_bank_first(
+                    db, params, topic,
+                    lambda gap_params: QuizGenerator._generate_from_pdf(pdf_content, input_data, gap_params, pages)
+                )
+            return await QuizGenerator._generate_from_pdf(pdf_content, input_data, params)
 
         except Exception as e:
             logger.error(f"Error al generar quiz desde PDF con IA: {str(e)}")
             raise ValueError(f"Error al procesar el PDF o generar el quiz: {str(e)}")
         
     @staticmethod
-    async def create_quiz_from_text(input_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_quiz_from_text(input_data: Dict[str, Any], db: Optional[AsyncSession] = None) -> Dict[str, Any]:
         
         # Validaciones de entrada
-        if not input_data or not isinstance(input_data, dict):
-            raise ValueError("Los datos de entrada para la generación del quiz son inválidos.")
-        
-        classroom_id = input_data.get("classroom_id")
-        num_question = input_data.get("num_question")
-        point_max = input_data.get("point_max") # Nuevo campo
-        competences = input_data.get("competences")
-        type_question_flags = input_data.get("type_question")
-        text=input_data.get("text")
+        params = QuizGenerator._validate_generation_input(input_data)
 
-        if not isinstance(classroom_id, int):
-            raise ValueError("classroom_id es requerido y debe ser un entero.")
-        if not isinstance(num_question, int) or num_question <= 0:
-            raise ValueError("num_question es requerido y debe ser un entero positivo.")
-        if not isinstance(point_max, int) or point_max <= 0: # Nueva validación
-            raise ValueError("point_max es requerido y debe ser un entero positivo.")
-        if not isinstance(competences, list):
-            raise ValueError("competences es requerido y debe ser una lista.")
-        if not isinstance(type_question_flags, dict):
-            raise ValueError("type_question es requerido y debe ser un objeto.")
+        try:
+            if QuizGenerator._use_bank(input_data, params, db):
+                return await QuizGenerator._generate_bank_first(
+                    db, params, params.get("text"),
+                    lambda gap_params: QuizGenerator._generate_from_text(input_data, gap_params)
+                )
+            return await QuizGenerator._generate_from_text(input_data, params)
 
-        enabled_question_types = [
-            q_type for q_type, enabled in type_question_flags.items() if enabled
-        ]
+        except Exception as e:
+            logger.error(f"Error al generar quiz desde PDF con IA: {str(e)}")
+            raise ValueError(f"Error al procesar el PDF o generar el quiz: {str(e)}")
 
-        if not enabled_question_types:
-            raise ValueError("Al menos un tipo de pregunta debe estar habilitado (true) en 'type_question'.")
+    @staticmethod
+    def _validate_question(q: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Normaliza y valida una pregunta generada; lanza ValueError con el motivo si es inválida.
+        Las competencias que no están en el listado de entrada se descartan.
+        """
+        if not isinstance(q, dict):
+            raise ValueError("La pregunta no es un objeto JSON.")
+        try:
+            question = QuizGenerator._normalize_question(q)
+            QuestionOutput.model_validate(question)
+        except (KeyError, TypeError, ValidationError) as e:
+            raise ValueError(f"Estructura inválida: {e}")
 
-        competences_str = json.dumps(competences, ensure_ascii=False)
+        q_type = question["answer_base"]["type"]
+        if q_type not in ("base_text", "base_multiple_option"):
+            raise ValueError(f"Tipo de respuesta '{q_type}' no soportado.")
+        if q_type == "base_multiple_option":
+            options = question["answer_base"].get("options", [])
+            if len(options) < 2:
+                raise ValueError("Una pregunta de opción múltiple necesita al menos 2 opciones.")
+            if question["answer_correct"] not in options:
+                raise ValueError("La respuesta correcta no está entre las opciones.")
 
-        current_time = datetime.now()
-        end_time = current_time + timedelta(hours=1) # Quiz de 1 hora de duración
-
-        # Definir el prompt para Gemini con las nuevas restricciones
-        prompt = f"""
-            Analiza el contenido del documento PDF adjunto en profundidad. Tu tarea es generar un quiz educativo con {num_question} preguntas, siguiendo las siguientes directrices y restricciones estrictas:
-            Lo que usaras como resticciones o tema principal para elaboar el quiz es {text}
-            **Directrices Generales:**
-            1.  El quiz debe tener un **título** y una **instrucción general** relevante al contenido del PDF.
-            2.  **Puntos Totales:** La suma total de los "points" de todas las preguntas generadas debe ser **igual o muy cercana a {point_max}**. Distribuye los puntos de manera que se ajuste a este total.
-            3.  **Distribución de Preguntas:**
-                -   Genera preguntas únicamente de los tipos habilitados en `type_question`: {', '.join(enabled_question_types)}.
-                -   Asegura una **distribución lo más equitativa y uniforme posible** de los {num_question} preguntas entre los **tipos de pregunta habilitados** (textuales, inferenciales, críticas) y también entre los **formatos de respuesta** (**"base_text"** para respuestas de texto libre, y **"base_multiple_option"** para opción múltiple).
-                -   Si un tipo de pregunta o formato de respuesta no está habilitado, **no lo uses**.
-            4.  **Combinación de Competencias:** Para cada pregunta, es **IMPERATIVO** que selecciones **múltiples competencias** (idealmente 2 o más si es relevante y posible) de la lista proporcionada. La selección debe basarse en la afinidad fuerte de la pregunta con la 'description' y 'name' de **todas las competencias seleccionadas**. Busca conectar conceptos en la pregunta con varias áreas de competencia.
-
-            **Estructura de Cada Pregunta:**
-            Para cada pregunta, incluye los siguientes campos exactos y con sus tipos de datos correctos:
-            -   **"statement"**: El enunciado claro y conciso de la pregunta.
-            -   **"answer_correct"**:
-                -   Si `answer_base.type` es "base_text", esta es la respuesta completa y correcta a la pregunta abierta.
-                -   Si `answer_base.type` es "base_multiple_option", esta debe ser **exactamente uno de los textos de las opciones proporcionadas** en la lista `options`.
-            -   **"points"**: Un valor numérico entero y positivo para la pregunta. La suma de estos puntos debe ajustarse a `point_max`.
-            -   **"answer_base"**: Un objeto JSON con los detalles del formato de respuesta:
-                -   **"type"**: Un string que debe ser **"base_text"** o **"base_multiple_option"**.
-                -   **"options"**: (SOLO si "type" es "base_multiple_option") Una lista de strings que contienen las posibles opciones de respuesta. Debe haber **entre 3 y 5 opciones**, y una de ellas debe ser la `answer_correct`.
-            -   **"competences_id"**: Una **lista de números enteros** (IDs) de las competencias relevantes para la pregunta. Estos IDs deben ser tomados **EXCLUSIVAMENTE** del listado de competencias que te proporciono.
-
-            **Listado de Competencias Disponibles:**
-            {competences_str}
-
-            **Formato de Salida Requerido (JSON Exacto):**
-            Devuelve **SOLO un objeto JSON** que siga este formato exacto, sin ningún texto adicional, explicaciones, o bloques de código que no sean el propio JSON, ni antes ni después.
-
-            ```json
-            {{
-                "classroom_id": {classroom_id},
-                "title": "Un título descriptivo para el quiz",
-                "instruction": "Instrucciones claras para los estudiantes sobre cómo completar el quiz.",
-                "start_time": "{current_time.isoformat()}Z",
-                "end_time": "{end_time.isoformat()}Z",
-                "questions": [
-                    {{
-                        "statement": "Enunciado de la primera pregunta, combinando tipos y competencias.",
-                        "answer_correct": "Respuesta correcta para esta pregunta.",
-                        "points": 10,
-                        "answer_base": {{
-                            "type": "base_text"
-                        }},
-                        "competences_id": [1, 2]
-                    }},
-                    {{
-                        "statement": "Pregunta de opción múltiple con enfoque crítico y varias competencias.",
-                        "answer_correct": "Opción Correcta A",
-                        "points": 10,
-                        "answer_base": {{
-                            "type": "base_multiple_option",
-                            "options": [
-                                "Opción Correcta A",
-                                "Opción Incorrecta B",
-                                "Opción Incorrecta C"
-                            ]
-                        }},
-                        "competences_id": [2]
-                    }}
-                    // ... más preguntas hasta alcanzar num_question y sume point_max
-                ]
-            }}
-            ```
-            Asegúrate de que `start_time` y `end_time` sean fechas y horas ISO 8601 válidas (sin terminacion Z), reflejando el momento actual y una hora después, respectivamente. La calidad de las preguntas, la correcta asignación de puntos para sumar {point_max} y la combinación de competencias es fundamental.
-            """
-
-        model = genai.GenerativeModel(
-            settings.GEMINI_MODEL,
-            generation_config={"temperature": 0.7, "response_mime_type": "application/json"}
-        )
-        
-        contents = [
-            prompt
-        ]
+        allowed_ids = {c.get("id") for c in params["competences"] if isinstance(c, dict)}
+        question["competences_id"] = [c for c in question["competences_id"] if c in allowed_ids]
+        return question
+
+    @staticmethod
+    def _validate_questions(questions: List[Any], params: Dict[str, Any]):
+        """
+        Separa las preguntas válidas de las inválidas.
+
+        Returns:
+            (lista de preguntas con None en la posición de cada inválida,
+             lista de (posición, pregunta original, motivo) de las inválidas)
+        """
+        validated: List[Optional[Dict[str, Any]]] = []
+        invalid = []
+        for index, q in enumerate(questions):
+            try:
+                validated.append(QuizGenerator._validate_question(q, params))
+            except ValueError as e:
+                validated.append(None)
+                invalid.append((index, q, str(e)))
+        if invalid:
+            metrics.inc("quiz_generation_invalid_questions_total", len(invalid))
+        return validated, invalid
+
+    @staticmethod
+    async def _repair_questions(invalid, valid_questions: List[Dict[str, Any]], contents: List[Any], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Regenera únicamente las preguntas inválidas (una llamada con el mismo
+        contenido de contexto) en lugar de repetir la generación completa.
+        """
+        if not invalid or settings.GENERATION_REPAIR_ATTEMPTS <= 0:
+            return []
+
+        repaired: List[Dict[str, Any]] = []
+        pending = invalid
+        for _ in range(settings.GENERATION_REPAIR_ATTEMPTS):
+            prompt = PromptBuilder.repair_prompt(pending, valid_questions + repaired, params)
+            metrics.inc("quiz_generation_repair_calls_total")
+            try:
+                data = await QuizGenerator._call_model(
+                    [prompt, *contents[1:]],
+                    {**params, "num_question": len(pending), "variants": 1},
+                    operation=OPERATION_REPAIR,
+                    response_schema=questions_response_schema(),
+                    temperature=0.4,
+                )
+            except Exception as e:
+                logger.warning(f"Fallo la reparación de preguntas inválidas: {e}")
+                break
+
+            validated, still_invalid = QuizGenerator._validate_questions(data.get("questions", []), params)
+            repaired.extend(q for q in validated if q is not None)
+            if len(repaired) >= len(invalid) or not still_invalid:
+                break
+            pending = still_invalid
+
+        repaired = repaired[:len(invalid)]
+        metrics.inc("quiz_generation_repaired_questions_total", len(repaired))
+        return repaired
+
+    @staticmethod
+    async def _stream_quiz(contents: List[Any], params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Llama a Gemini en modo streaming y emite un evento por cada pregunta
+        completa y válida. Al final emite el quiz con el post-procesamiento
+        habitual (cantidad de preguntas y ajuste de puntos).
+        """
+        parser = IncrementalQuestionParser()
+        streamed_questions: List[Dict[str, Any]] = []
+        discarded = []
 
         try:
-            response = await model.generate_content_async(contents, request_options={"timeout": 600})
-            response_text = response.text
-            
-            generated_quiz_data = QuizGenerator._extract_and_fix_json(response_text)
-            
-            # Asegurar que classroom_id del output coincida con el input
-            generated_quiz_data["classroom_id"] = classroom_id
-            
-            # --- Lógica de ajuste post-generación (si Gemini no cumple exactamente) ---
-            # Aunque Gemini debería seguir las instrucciones, esto es una capa de seguridad.
-            
-            # Ajustar número de preguntas si es necesario
-            if len(generated_quiz_data.get("questions", [])) < num_question:
-                for _ in range(num_question - len(generated_quiz_data.get("questions", []))):
-                    generated_quiz_data["questions"].append({
-                        "statement": "Pregunta de relleno por ajuste de cantidad.",
-                        "answer_correct": "Respuesta.",
-                        "points": 1, # Puntos bajos para no exceder point_max
-                        "answer_base": {"type": "base_text"},
-                        "competences_id": []
-                    })
-            generated_quiz_data["questions"] = generated_quiz_data["questions"][:num_question]
-
-            # Ajustar puntos para que la suma no exceda point_max
-            current_total_points = sum(q.get("points", 0) for q in generated_quiz_data["questions"])
-            if current_total_points > point_max:
-                # Si los puntos exceden, se redistribuyen proporcionalmente o se reducen.
-                # Una estrategia simple es reducir los puntos de cada pregunta de forma uniforme.
-                reduction_factor = point_max / current_total_points
-                for q in generated_quiz_data["questions"]:
-                    q["points"] = max(1, round(q.get("points", 1) * reduction_factor)) # Mínimo 1 punto
-
-            # Re-validar la estructura para asegurar que cumple con el schema de salida
-            output_questions = []
-            for q in generated_quiz_data.get("questions", []):
-                q_type = q["answer_base"]["type"]
-                q_options = q["answer_base"].get("options", []) if q_type == "base_multiple_option" else []
-                
-                output_questions.append({
-                    "statement": q["statement"],
-                    "answer_correct": q["answer_correct"],
-                    "points": q["points"],
-                    "answer_base": {
-                        "type": q_type,
-                        **({"options": q_options} if q_options else {})
-                    },
-                    "competences_id": q.get("competences_id", [])
-                })
+            chunks = get_llm_provider().generate_stream(
+                contents,
+                operation=params["operation"],
+                temperature=0.7,
+                response_schema=quiz_response_schema(),
+                timeout=600,
+                tags=QuizGenerator._llm_tags(params),
+                system_instruction=PromptBuilder.generation_system_instruction(),
+            )
+            async for chunk in chunks:
+                for raw_question in parser.feed(chunk):
+                    index = len(streamed_questions)
+                    validated, invalid = QuizGenerator._validate_questions([raw_question], params)
+                    if invalid:
+                        logger.warning(f"Pregunta descartada durante el streaming: {invalid[0][2]}")
+                        discarded.append(invalid[0])
+                        yield {"event": "discarded", "detail": invalid[0][2]}
+                        continue
+                    streamed_questions.append(validated[0])
+                    yield {"event": "question", "index": index, "question": validated[0]}
 
-            return {
-                "classroom_id": generated_quiz_data.get("classroom_id", classroom_id),
-                "title": generated_quiz_data.get("title", "Quiz Generado"),
-                "instruction": generated_quiz_data.get("instruction", "Responde las siguientes preguntas basadas en el documento."),
-                "start_time": generated_quiz_data.get("start_time", current_time.isoformat() + "Z"),
-                "end_time": generated_quiz_data.get("end_time", end_time.isoformat() + "Z"),
-                "questions": output_questions
-            }
+            # Las descartadas se regeneran en una sola llamada acotada
+            if discarded and len(streamed_questions) < params["num_question"]:
+                for question in await QuizGenerator._repair_questions(discarded, streamed_questions, contents, params):
+                    streamed_questions.append(question)
+                    yield {"event": "question", "index": len(streamed_questions) - 1, "question": question}
+
+            try:
+                generated_quiz_data = QuizGenerator._extract_and_fix_json(parser.buffer)
+            except ValueError:
+                generated_quiz_data = {}
+            # Las preguntas ya validadas durante el streaming son las que cuentan
+            generated_quiz_data["questions"] = [dict(q) for q in streamed_questions]
+
+            quiz = QuizGenerator._normalize_generated_quiz(generated_quiz_data, params)
+            yield {"event": "quiz", "quiz": quiz}
 
         except Exception as e:
-            logger.error(f"Error al generar quiz desde PDF con IA: {str(e)}")
-            raise ValueError(f"Error al procesar el PDF o generar el quiz: {str(e)}")
+            logger.error(f"Error al generar quiz en streaming con IA: {str(e)}")
+            yield {"event": "error", "detail": f"Error al generar el quiz: {str(e)}"}
+
+    @staticmethod
+    async def stream_quiz_from_pdf(pdf_content: bytes, input_data: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Valida la entrada y prepara el contenido; retorna el iterador de eventos.
+        Los errores de validación se lanzan antes de empezar a emitir.
+        """
+        params = QuizGenerator._validate_generation_input(input_data, OPERATION_GENERATE_PDF)
+        if params["variants"] > 1:
+            raise ValueError("La generación de variantes no está disponible en streaming.")
+        pdf_mode = input_data.get("pdf_mode") or settings.PDF_GENERATION_MODE
+        prompt = QuizGenerator._build_generation_prompt(params)
+        contents = await QuizGenerator.build_pdf_contents(prompt, pdf_content, pdf_mode)
+        return QuizGenerator._stream_quiz(contents, params)
+
+    @staticmethod
+    async def stream_quiz_from_text(input_data: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Valida la entrada y retorna el iterador de eventos de la generación desde texto.
+        """
+        params = QuizGenerator._validate_generation_input(input_data)
+        if params["variants"] > 1:
+            raise ValueError("La generación de variantes no está disponible en streaming.")
+        prompt = QuizGenerator._build_generation_prompt(params)
+        return QuizGenerator._stream_quiz([prompt], params)
 
     
 #     @staticmethod
@@ -1,31 +1,44 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete
+from sqlalchemy import update, delete, func
 from sqlalchemy.orm import selectinload,joinedload,with_polymorphic
 
 from typing import List, Optional, Dict, Any
 import logging
 import json
-import google.generativeai as genai
 from config.settings import get_settings
+from core.ai.llm_provider import get_llm_provider, OPERATION_GRADE
+from core.ai.llm_metrics import llm_metrics
+from core.ai.prompt_builder import PromptBuilder
+from core.ai.response_schema import grading_response_schema
+from core.quiz.question_index import question_index
+from core.quiz.pregrader import LexicalPreGrader, GRADING_SOURCE_LOCAL, GRADING_SOURCE_LLM, GRADING_SOURCE_FALLBACK
+from core.quiz.answer_distribution import AnswerDistributionService, OptionDeltas
+from core.cache import read_cache
 import backoff
 import httpx
 
 settings = get_settings()
 
-genai.configure(api_key=settings.GOOGLE_API_KEY)
-
 
 from db.models.quiz import *
 from schemas.quiz import QuizCreateInput, QuizSubmissionInput, QuizBasicOutput,QuizDetailOutput,QuestionDetailOutput,AnswerBaseDetailOutput# Usaremos un schema nuevo para la entrada
 from schemas.quiz import (
     QuizResultDetailOutput, QuestionResultDetailOutput, AnswerBaseDetailOutput,
-    AnswerSubmittedDetailOutput,StudentPointsOutput,QuizWithAttemptStatusOutput,StudentQuizResultOutput
+    AnswerSubmittedDetailOutput,StudentPointsOutput,QuizWithAttemptStatusOutput,StudentQuizResultOutput,
+    QuizGradingStatsOutput
 )
 # from core.quiz.quiz_generator import QuizGenerator
 
 logger = logging.getLogger(__name__)
 
+# Espacios de la caché de lectura
+CACHE_QUIZ_DETAIL = "quiz_detail"              # (espacio, quiz_id) -> JSON de QuizDetailOutput
+CACHE_QUIZ_LIST = "quiz_list"                  # (espacio, IDs ordenados) -> List[QuizBasicOutput]
+CACHE_CLASSROOM_QUIZZES = "classroom_quizzes"  # (espacio, classroom_id) -> List[QuizBasicOutput]
+CACHE_ITEM_ANALYSIS = "item_analysis"          # (espacio, "quiz" o "classroom", id) -> análisis de ítems
+CACHE_LEADERBOARD = "leaderboard"              # (espacio, quiz_id) -> ranking completo del quiz
+
 class QuizService:
     @staticmethod
     async def create_full_quiz(db: AsyncSession, quiz_data: QuizCreateInput) -> Dict[str, Any]:
@@ -101,7 +114,114 @@ class QuizService:
         }
 
     @staticmethod
-    async def process_student_submission(db: AsyncSession, submission_data: QuizSubmissionInput) -> Dict[str, Any]:
+    def _template_general_feedback(percentage: float) -> str:
+        if percentage == 100:
+            return "¡Felicidades! Has respondido todas las preguntas correctamente y obtenido la máxima puntuación. ¡Excelente!"
+        elif percentage >= 75:
+            return "Excelente trabajo, has demostrado un gran conocimiento en general. Sigue así."
+        elif percentage >= 50:
+            return "Buen esfuerzo en el quiz. Hay áreas de oportunidad para mejorar, sigue practicando."
+        return "Necesitas repasar algunos conceptos clave. No te desanimes, ¡sigue practicando para mejorar tus habilidades!"
+
+    @staticmethod
+    async def _grade_answers(quiz: Quiz, total_points: int, questions_for_gemini: List[Dict[str, Any]], questions_map: Dict[int, Question], general_feedback: bool = True) -> Dict[str, Any]:
+        """
+        Califica las respuestas de una entrega. Primero la pre-calificación local
+        (opción múltiple y respuestas de texto claramente correctas o incorrectas);
+        solo las restantes van al LLM en una única llamada. Si todas se calificaron
+        localmente o el LLM falla, el feedback general sale de una plantilla según
+        el porcentaje obtenido. Con general_feedback=False solo se piden los
+        puntajes y 'general_feedback' queda en None (lo genera GeneralFeedbackService
+        al consultarse). Cada evaluación indica su 'source'.
+        """
+        if settings.PREGRADE_ENABLED:
+            local_evaluations, pending = LexicalPreGrader.pregrade(questions_for_gemini, quiz_id=quiz.id)
+        else:
+            local_evaluations, pending = [], list(questions_for_gemini)
+
+        gemini_response_json = {"evaluations": list(local_evaluations), "general_feedback": None}
+        if pending:
+            note = None
+            if local_evaluations and general_feedback:
+                local_max = sum(questions_map[e["question_id"]].points for e in local_evaluations)
+                local_points = sum(
+                    int(round((e["percentage_correct"] / 100) * questions_map[e["question_id"]].points)) for e in local_evaluations
+                )
+                note = PromptBuilder.pregraded_note(len(local_evaluations), local_points, local_max)
+            prompt = PromptBuilder.grading_prompt(quiz.title, quiz.instruction, total_points, pending, note)
+            try:
+                response = await get_llm_provider().generate(
+                    [prompt],
+                    operation=OPERATION_GRADE,
+                    temperature=0.5,
+                    response_schema=grading_response_schema(general_feedback),
+                    system_instruction=PromptBuilder.grading_system_instruction(general_feedback),
+                    timeout=180,
+                    tags={"classroom_id": quiz.id_classroom, "question_ids": [q["question_id"] for q in pending]},
+                )
+                llm_response_json = json.loads(response.text.strip())
+
+                if not isinstance(llm_response_json, dict) or "evaluations" not in llm_response_json or (general_feedback and "general_feedback" not in llm_response_json):
+                    raise ValueError("La respuesta de Gemini no tiene el formato JSON esperado.")
+
+                pending_ids = {q["question_id"] for q in pending}
+                gemini_response_json["evaluations"] += [
+                    {**e, "source": GRADING_SOURCE_LLM} for e in llm_response_json["evaluations"]
+                    if isinstance(e, dict) and e.get("question_id") in pending_ids
+                ]
+                gemini_response_json["general_feedback"] = llm_response_json.get("general_feedback")
+            except Exception as e:
+                logger.warning(f"Error al generar evaluaciones y feedback general con Gemini para el quiz {quiz.id}; se usa el fallback: {e}")
+                llm_metrics.record_fallback(OPERATION_GRADE, quiz.id_classroom, type(e).__name__)
+                # Fallback: coincidencia exacta para las preguntas que no se calificaron localmente
+                for q_data in pending:
+                    question = questions_map[q_data["question_id"]]
+                    student_answer = q_data["student_answer"]
+                    percentage_correct = 0
+                    feedback = "Feedback no disponible."
+
+                    if q_data["question_type"] == "multiple option":
+                        if student_answer == question.answer_correct:
+                            percentage_correct = 100
+                            feedback = "¡Muy bien! Esa es la opción correcta."
+                        else:
+                            percentage_correct = 0
+                            feedback = f"Incorrecto. La opción correcta era: '{question.answer_correct}'."
+                    elif q_data["question_type"] == "text":
+                        if student_answer and student_answer.lower() == question.answer_correct.lower():
+                            percentage_correct = 100
+                            feedback = "¡Correcto! Tu respuesta es precisa."
+                        else:
+                            feedback = f"Incorrecto. La respuesta esperada era: '{question.answer_correct}'."
+
+                    gemini_response_json["evaluations"].append({
+                        "question_id": q_data["question_id"],
+                        "percentage_correct": percentage_correct,
+                        "feedback": feedback,
+                        "source": GRADING_SOURCE_FALLBACK,
+                    })
+
+        if general_feedback and not gemini_response_json["general_feedback"]:
+            obtained = sum(
+                int(round((e["percentage_correct"] / 100) * questions_map[e["question_id"]].points))
+                for e in gemini_response_json["evaluations"]
+            )
+            percentage = (obtained / total_points) * 100 if total_points > 0 else 0
+            gemini_response_json["general_feedback"] = QuizService._template_general_feedback(percentage)
+
+        if questions_for_gemini:
+            logger.info(
+                f"Quiz {quiz.id}: {len(local_evaluations)}/{len(questions_for_gemini)} respuestas calificadas localmente"
+            )
+        return gemini_response_json
+
+    @staticmethod
+    async def process_student_submission(db: AsyncSession, submission_data: QuizSubmissionInput, commit: bool = True) -> Dict[str, Any]:
+        """
+        Califica y guarda la entrega. Con commit=False los cambios quedan en la
+        transacción de 'db' y quien llama debe confirmarla y después llamar a
+        invalidate_after_submission.
+        """
         # 1. Obtener el quiz
         quiz = (await db.execute(select(Quiz).filter_by(id=submission_data.quiz_id))).scalar_one_or_none()
         if not quiz:
@@ -112,6 +232,9 @@ class QuizService:
             select(Quiz_Student).filter_by(id_quiz=submission_data.quiz_id, id_student=submission_data.student_id)
         )).scalar_one_or_none()
 
+        # Cambios en los contadores por opción (se aplican junto con la entrega)
+        option_deltas = OptionDeltas()
+
         if not quiz_student:
             quiz_student = Quiz_Student(
                 id_quiz=submission_data.quiz_id,
@@ -128,6 +251,19 @@ class QuizService:
             quiz_student.points_obtained = 0
             quiz_student.feedback_general_teacher = None
             
+            # Las opciones del envío anterior se restan de los contadores
+            submitted_question_ids = [q.question_id for q in submission_data.questions]
+            previous_options = await db.execute(
+                select(Question_Student.id_question, Submitted_Multiple_Option.option_select)
+                .join(Submitted_Multiple_Option, Submitted_Multiple_Option.id == Question_Student.id_answer_submitted)
+                .where(
+                    Question_Student.id_student == submission_data.student_id,
+                    Question_Student.id_question.in_(submitted_question_ids)
+                )
+            )
+            for question_id, option in previous_options.all():
+                option_deltas[(question_id, option)] -= 1
+
             # Obtener y eliminar respuestas de preguntas previas del estudiante para este quiz
             # Asegúrate de cargar la relación answer_submitted para que el cascade de eliminación funcione
             # si lo tienes configurado en tus modelos para la eliminación de Answer_Submitted a través de Question_Student
@@ -185,117 +321,15 @@ class QuizService:
             })
         
         quiz_total_points_calc = sum(q["max_points"] for q in questions_for_gemini)
+        total_points_changed = quiz.total_points == 0 and quiz_total_points_calc != 0
         if quiz.total_points == 0:
             quiz.total_points = quiz_total_points_calc
 
-        # 4. Llamada Única a Gemini
-        model = genai.GenerativeModel(
-            settings.GEMINI_MODEL,
-            generation_config={"temperature": 0.5, "response_mime_type": "application/json"}
+        # 4. Pre-calificación local y llamada única al LLM con las preguntas restantes
+        gemini_response_json = await QuizService._grade_answers(
+            quiz, quiz_total_points_calc, questions_for_gemini, questions_map, general_feedback=not settings.FEEDBACK_LAZY
         )
 
-        # El prompt de Gemini va aquí, tal como lo tienes
-        prompt = f"""
-        Como un evaluador inteligente para un sistema de quizzes, tu tarea es analizar un conjunto de preguntas y las respuestas de un estudiante, y luego proporcionar un feedback general sobre el desempeño del estudiante en todo el quiz.
-
-        Para cada pregunta individual, debes proporcionar:
-        1. Una evaluación del porcentaje de corrección de la respuesta del estudiante (un número entero entre 0 y 100).
-        2. Un feedback conciso y constructivo para el estudiante (máximo 2-3 oraciones).
-
-        Las preguntas de tipo "text" requieren una evaluación más profunda de la coherencia, precisión y exhaustividad de la respuesta del estudiante con respecto a la respuesta correcta esperada.
-        Las preguntas de tipo "multiple option" son de evaluación binaria: 100% si la respuesta es idéntica a la correcta, 0% si no lo es.
-
-        Finalmente, genera un **feedback general** para el estudiante sobre todo el quiz. Este feedback general debe ser conciso (máximo 4-5 oraciones), amigable, motivador, y resumir el desempeño general, destacando puntos fuertes y áreas de mejora.
-
-        La salida debe ser un objeto JSON que contenga dos campos principales:
-        - `evaluations`: Una lista de objetos, donde cada objeto representa una pregunta evaluada con los campos:
-            - `question_id`: El ID de la pregunta.
-            - `percentage_correct`: El porcentaje de corrección de la respuesta del estudiante (0-100).
-            - `feedback`: El feedback constructivo para la pregunta.
-        - `general_feedback`: Una cadena de texto con el feedback general del quiz.
-
-        ---
-        Detalles del Quiz:
-        Título del Quiz: "{quiz.title}"
-        Instrucciones del Quiz: "{quiz.instruction or 'No se proporcionaron instrucciones.'}"
-        Puntuación Total Posible (calculada de las preguntas): {quiz_total_points_calc}
-
-        Lista de Preguntas y Respuestas del Estudiante a Evaluar:
-        {json.dumps(questions_for_gemini, indent=2, ensure_ascii=False)}
-        ---
-
-        Formato de Salida JSON:
-        {{
-            "evaluations": [
-                {{
-                    "question_id": 1,
-                    "percentage_correct": 85,
-                    "feedback": "Tu respuesta es muy completa pero faltó mencionar el punto clave de X. Buen trabajo."
-                }},
-                {{
-                    "question_id": 2,
-                    "percentage_correct": 100,
-                    "feedback": "¡Correcto! Excelente selección de la opción."
-                }}
-            ],
-            "general_feedback": "¡Buen trabajo en el quiz! Demostraste un buen entendimiento general, especialmente en las preguntas de opción múltiple. Para mejorar aún más, enfócate en desarrollar respuestas más completas para las preguntas de texto."
-        }}
-        """
-        
-        gemini_response_json = {"evaluations": [], "general_feedback": "Feedback general no disponible."}
-        try:
-            response = await model.generate_content_async(prompt, request_options={"timeout": 180})
-            gemini_response_text = response.text.strip()
-            
-            gemini_response_json = json.loads(gemini_response_text)
-            
-            if not isinstance(gemini_response_json, dict) or "evaluations" not in gemini_response_json or "general_feedback" not in gemini_response_json:
-                raise ValueError("La respuesta de Gemini no tiene el formato JSON esperado.")
-            
-        except Exception as e:
-            print(f"Error al generar evaluaciones y feedback general con Gemini: {e}")
-            # Lógica de fallback si Gemini falla, tal como la tienes
-            total_obtained_points_fallback = 0
-            
-            for q_data in questions_for_gemini:
-                question = questions_map[q_data["question_id"]]
-                student_answer = q_data["student_answer"]
-                percentage_correct = 0
-                feedback = "Feedback no disponible."
-
-                if q_data["question_type"] == "multiple option":
-                    if student_answer == question.answer_correct:
-                        percentage_correct = 100
-                        feedback = "¡Muy bien! Esa es la opción correcta."
-                    else:
-                        percentage_correct = 0
-                        feedback = f"Incorrecto. La opción correcta era: '{question.answer_correct}'."
-                elif q_data["question_type"] == "text":
-                    if student_answer and student_answer.lower() == question.answer_correct.lower():
-                        percentage_correct = 100
-                        feedback = "¡Correcto! Tu respuesta es precisa."
-                    else:
-                        feedback = f"Incorrecto. La respuesta esperada era: '{question.answer_correct}'."
-                
-                points_obtained_fallback = int(round((percentage_correct / 100) * question.points))
-                total_obtained_points_fallback += points_obtained_fallback
-                
-                gemini_response_json["evaluations"].append({
-                    "question_id": q_data["question_id"],
-                    "percentage_correct": percentage_correct,
-                    "feedback": feedback
-                })
-            
-            percentage_fallback = (total_obtained_points_fallback / quiz_total_points_calc) * 100 if quiz_total_points_calc > 0 else 0
-            if percentage_fallback == 100:
-                gemini_response_json["general_feedback"] = "¡Felicidades! Has respondido todas las preguntas correctamente y obtenido la máxima puntuación. ¡Excelente!"
-            elif percentage_fallback >= 75:
-                gemini_response_json["general_feedback"] = "Excelente trabajo, has demostrado un gran conocimiento en general. Sigue así."
-            elif percentage_fallback >= 50:
-                gemini_response_json["general_feedback"] = "Buen esfuerzo en el quiz. Hay áreas de oportunidad para mejorar, sigue practicando."
-            else:
-                gemini_response_json["general_feedback"] = "Necesitas repasar algunos conceptos clave. No te desanimes, ¡sigue practicando para mejorar tus habilidades!"
-
         total_obtained_points = 0
         output_question_students = []
 
@@ -308,12 +342,14 @@ class QuizService:
 
             student_points_for_question = 0
             question_feedback_message = "Feedback no disponible."
+            grading_source = GRADING_SOURCE_FALLBACK
             
             if evaluation:
                 percentage_correct = evaluation.get("percentage_correct", 0)
                 percentage_correct = max(0, min(100, int(percentage_correct)))
                 student_points_for_question = int(round((percentage_correct / 100) * question.points))
                 question_feedback_message = evaluation.get("feedback", question_feedback_message)
+                grading_source = evaluation.get("source", GRADING_SOURCE_LLM)
             else:
                 # Lógica de fallback para preguntas individuales
                 student_answer = ""
@@ -348,6 +384,7 @@ class QuizService:
                     type="submitted_multiple_option",
                     option_select=q_sub_data.answer_submitted.option_select
                 )
+                option_deltas[(q_sub_data.question_id, q_sub_data.answer_submitted.option_select)] += 1
             db.add(submitted_answer_instance)
             await db.flush() # Necesario para obtener el ID de 'submitted_answer_instance'
 
@@ -360,7 +397,8 @@ class QuizService:
                 id_answer_submitted=submitted_answer_instance.id,
                 points_obtained=student_points_for_question,
                 feedback_automated=question_feedback_message,
-                feedback_teacher=None
+                feedback_teacher=None,
+                grading_source=grading_source
             )
             db.add(question_student)
 
@@ -369,14 +407,20 @@ class QuizService:
                 "obtained_points": student_points_for_question
             })
             
-        # 6. Actualizar Quiz_Student con puntos y feedback general
+        # 6. Actualizar Quiz_Student con puntos y feedback general (con FEEDBACK_LAZY queda
+        # en NULL hasta que se consulte el resultado)
         quiz_student.points_obtained = total_obtained_points
-        quiz_student.feedback_general_automated = gemini_response_json.get("general_feedback", "Feedback general no disponible.")
+        if settings.FEEDBACK_LAZY:
+            quiz_student.feedback_general_automated = None
+        else:
+            quiz_student.feedback_general_automated = gemini_response_json.get("general_feedback", "Feedback general no disponible.")
 
-        print(quiz_student.feedback_general_automated, "---------------------------------")
+        await AnswerDistributionService.apply_deltas(db, submission_data.quiz_id, option_deltas)
 
         # 7. Confirmar la transacción
-        await db.commit() # Confirmar todos los cambios en la base de datos
+        if commit:
+            await db.commit() # Confirmar todos los cambios en la base de datos
+            QuizService.invalidate_after_submission(submission_data.quiz_id, quiz.id_classroom, total_points_changed)
 
         return {
             "quiz_id": quiz_student.id_quiz,
@@ -396,12 +440,97 @@ class QuizService:
             if not isinstance(q_id, int) or q_id <= 0:
                 raise ValueError("Todos los IDs de quiz deben ser enteros positivos.")
         
-        result = await db.execute(
-            select(Quiz).filter(Quiz.id.in_(quiz_ids))
+        async def load() -> List[QuizBasicOutput]:
+            result = await db.execute(
+                select(Quiz).filter(Quiz.id.in_(quiz_ids))
+            )
+            quizzes_db = result.scalars().all()
+            return [QuizBasicOutput.model_validate(quiz) for quiz in quizzes_db]
+
+        return await read_cache.get_or_load((CACHE_QUIZ_LIST, tuple(sorted(set(quiz_ids)))), load)
+
+    @staticmethod
+    async def _load_quiz_detail_json(db: AsyncSession, quiz_id: int) -> Optional[bytes]:
+        quiz = await QuizService.get_quiz_with_details_by_id(db, quiz_id)
+        return quiz.model_dump_json().encode("utf-8") if quiz else None
+
+    @staticmethod
+    async def get_quiz_detail_json(db: AsyncSession, quiz_id: int) -> Optional[bytes]:
+        """
+        Detalle del quiz ya serializado a JSON desde la caché de lectura: cuando
+        todo el aula lo abre a la vez se consulta y serializa una sola vez.
+        """
+        return await read_cache.get_or_load(
+            (CACHE_QUIZ_DETAIL, quiz_id), lambda: QuizService._load_quiz_detail_json(db, quiz_id)
         )
-        quizzes_db = result.scalars().all()
-        
-        return [QuizBasicOutput.model_validate(quiz) for quiz in quizzes_db]
+
+    @staticmethod
+    async def _load_classroom_quizzes(db: AsyncSession, classroom_id: int) -> List[QuizBasicOutput]:
+        result = await db.execute(select(Quiz).where(Quiz.id_classroom == classroom_id).order_by(Quiz.id))
+        return [QuizBasicOutput.model_validate(quiz) for quiz in result.scalars().all()]
+
+    @staticmethod
+    async def prewarm_quiz(db: AsyncSession, quiz_id: int, classroom_id: int, ttl_s: float) -> bool:
+        """
+        Carga en la caché de lectura lo que pedirá el aula al empezar el quiz (el
+        detalle serializado y la lista de quizzes del aula) y lee las filas de
+        quiz_students de esos quizzes para que sus páginas queden en los buffers
+        de Postgres. Retorna False si el quiz ya no existe.
+        """
+        detail = await QuizService._load_quiz_detail_json(db, quiz_id)
+        if detail is None:
+            return False
+        read_cache.set((CACHE_QUIZ_DETAIL, quiz_id), detail, ttl_s)
+        classroom_quizzes = await QuizService._load_classroom_quizzes(db, classroom_id)
+        read_cache.set((CACHE_CLASSROOM_QUIZZES, classroom_id), classroom_quizzes, ttl_s)
+        await db.execute(
+            select(func.count(Quiz_Student.id_student)).where(Quiz_Student.id_quiz.in_([quiz.id for quiz in classroom_quizzes]))
+        )
+        return True
+
+    @staticmethod
+    def invalidate_quiz_cache(quiz_id: Optional[int] = None, classroom_id: Optional[int] = None) -> None:
+        """
+        Descarta lo que cambia al crear o editar quizzes; se llama después del
+        commit. Sin 'classroom_id' se descartan las listas de todas las aulas.
+        """
+        if quiz_id is not None:
+            read_cache.invalidate((CACHE_QUIZ_DETAIL, quiz_id))
+        if classroom_id is not None:
+            read_cache.invalidate((CACHE_CLASSROOM_QUIZZES, classroom_id))
+        else:
+            read_cache.invalidate_namespace(CACHE_CLASSROOM_QUIZZES)
+        read_cache.invalidate_namespace(CACHE_QUIZ_LIST)
+
+    @staticmethod
+    def index_created_quiz(created_quiz: Dict[str, Any], quiz_data: QuizCreateInput) -> None:
+        """
+        Agrega al índice de casi-duplicados las preguntas de un quiz de
+        create_full_quiz; se llama después del commit para no indexar IDs revertidos.
+        """
+        question_index.add(
+            [q["question_id"] for q in created_quiz["questions"]],
+            [q_data.statement for q_data in quiz_data.questions]
+        )
+
+    @staticmethod
+    def invalidate_after_submission(quiz_id: int, classroom_id: Optional[int], total_points_changed: bool = True) -> None:
+        """Descarta lo que cambia con una entrega ya confirmada"""
+        QuizService.invalidate_quiz_results(quiz_id, classroom_id)
+        if total_points_changed:
+            # El detalle y las listas en caché muestran el total del quiz
+            QuizService.invalidate_quiz_cache(quiz_id, classroom_id)
+
+    @staticmethod
+    def invalidate_quiz_results(quiz_id: int, classroom_id: Optional[int]) -> None:
+        """
+        Descarta lo que depende de los puntajes (análisis de ítems del quiz y de su
+        aula, y el ranking del quiz); se llama tras cada entrega o recalificación.
+        """
+        read_cache.invalidate((CACHE_ITEM_ANALYSIS, "quiz", quiz_id))
+        if classroom_id is not None:
+            read_cache.invalidate((CACHE_ITEM_ANALYSIS, "classroom", classroom_id))
+        read_cache.invalidate((CACHE_LEADERBOARD, quiz_id))
 
     
     @staticmethod
@@ -619,37 +748,24 @@ class QuizService:
             if not isinstance(student_id, int) or student_id <= 0:
                 raise ValueError("El ID del estudiante debe ser un entero positivo.")
 
-            result = await db.execute(
-                select(Quiz)
-                .where(Quiz.id_classroom == classroom_id)
-                .options(joinedload(Quiz.quiz_students)) # Eliminado .and_() aquí
+            # Los quizzes del aula son iguales para todos los estudiantes y salen de la caché;
+            # por estudiante solo se consultan sus intentos
+            quizzes = await read_cache.get_or_load(
+                (CACHE_CLASSROOM_QUIZZES, classroom_id), lambda: QuizService._load_classroom_quizzes(db, classroom_id)
             )
-            quizzes_db = result.scalars().unique().all()
-
-            quizzes_output: List[QuizWithAttemptStatusOutput] = []
-            for quiz_db in quizzes_db:
-                student_has_attemped = False
-                # Iterar sobre las relaciones cargadas para verificar el student_id
-                if quiz_db.quiz_students:
-                    for qs in quiz_db.quiz_students:
-                        if qs.id_student == student_id:
-                            student_has_attemped = True
-                            break # Romper el bucle una vez que se encuentre
-                
-                quizzes_output.append(
-                    QuizWithAttemptStatusOutput(
-                        id=quiz_db.id,
-                        title=quiz_db.title,
-                        instruction=quiz_db.instruction,
-                        total_points=quiz_db.total_points,
-                        start_time=quiz_db.start_time,
-                        end_time=quiz_db.end_time,
-                        created_at=quiz_db.created_at,
-                        updated_at=quiz_db.updated_at,
-                        student_has_attemped=student_has_attemped
-                    )
+            if not quizzes:
+                return []
+            attempted = set((await db.execute(
+                select(Quiz_Student.id_quiz).where(
+                    Quiz_Student.id_student == student_id,
+                    Quiz_Student.id_quiz.in_([quiz.id for quiz in quizzes])
                 )
-            return quizzes_output
+            )).scalars().all())
+
+            return [
+                QuizWithAttemptStatusOutput(**quiz.model_dump(), student_has_attemped=quiz.id in attempted)
+                for quiz in quizzes
+            ]
         except Exception as e:
             raise e
         
@@ -678,6 +794,34 @@ class QuizService:
         except Exception as e:
             # Captura cualquier excepción para una gestión centralizada en el servicio
             raise e
+
+    @staticmethod
+    async def get_quiz_grading_stats(db: AsyncSession, quiz_id: int) -> Optional[QuizGradingStatsOutput]:
+        """Cuántas respuestas del quiz se calificaron localmente, con el LLM o con el fallback"""
+        quiz_exists = (await db.execute(select(Quiz.id).filter_by(id=quiz_id))).scalar_one_or_none()
+        if quiz_exists is None:
+            return None
+
+        result = await db.execute(
+            select(Question_Student.grading_source, func.count())
+            .join(Question, Question_Student.id_question == Question.id)
+            .where(Question.quiz_id == quiz_id)
+            .group_by(Question_Student.grading_source)
+        )
+        counts = {source: count for source, count in result.all()}
+        known = sum(count for source, count in counts.items() if source is not None)
+        return QuizGradingStatsOutput(
+            quiz_id=quiz_id,
+            answers=sum(counts.values()),
+            local_answers=counts.get(GRADING_SOURCE_LOCAL, 0),
+            llm_answers=counts.get(GRADING_SOURCE_LLM, 0),
+            fallback_answers=counts.get(GRADING_SOURCE_FALLBACK, 0),
+            unknown_answers=counts.get(None, 0),
+            local_rate=round(counts.get(GRADING_SOURCE_LOCAL, 0) / known, 4) if known else 0.0,
+            high_threshold=settings.PREGRADE_HIGH_THRESHOLD,
+            low_threshold=settings.PREGRADE_LOW_THRESHOLD,
+            max_local_rate=settings.PREGRADE_MAX_LOCAL_RATE,
+        )
         
      
     # @staticmethod
@@ -0,0 +1,446 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, case, cast, func, literal, or_, update, Numeric
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config.settings import get_settings
+from core.ai.llm_provider import get_llm_provider, OPERATION_GRADE
+from core.ai.prompt_builder import PromptBuilder
+from core.ai.response_schema import grading_response_schema
+from core.metrics import metrics
+from core.quiz.pregrader import LexicalPreGrader, GRADING_SOURCE_LOCAL, GRADING_SOURCE_LLM
+from core.quiz.quiz_service import QuizService
+from db.database import AsyncSessionLocal
+from db.models.quiz import Quiz, Quiz_Student, Question, Question_Student, Base_Multiple_Option, Submitted_Text, Submitted_Multiple_Option
+from schemas.quiz import QuestionAnswerKeyUpdateInput, QuestionAnswerKeyUpdateOutput, RegradeJobOutput
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Qué se recalcula de cada pregunta
+REGRADE_MODE_FULL = "full"        # Cambió la respuesta correcta: se vuelve a calificar cada respuesta
+REGRADE_MODE_RESCALE = "rescale"  # Solo cambiaron los puntos: se escalan los obtenidos
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+metrics.describe("regrade_jobs_total", "Trabajos de recalificación por estado final")
+metrics.describe("regrade_rows_total", "Respuestas recalificadas por método (sql, rescale, local, llm o failed)")
+metrics.describe("regrade_job_seconds", "Duración de los trabajos de recalificación")
+metrics.describe("regrade_rows_per_second", "Respuestas por segundo del último trabajo de recalificación")
+
+_SUBMITTED_TEXTS = Submitted_Text.__table__
+_SUBMITTED_OPTIONS = Submitted_Multiple_Option.__table__
+
+
+def _normalized_sql(column):
+    """Minúsculas, sin puntuación y con los espacios colapsados (como normalize_statement, salvo las tildes)"""
+    text = func.regexp_replace(func.lower(func.coalesce(column, "")), r"[^\w\s]", " ", "g")
+    return func.btrim(func.regexp_replace(text, r"\s+", " ", "g"))
+
+
+@dataclass
+class RegradeJob:
+    """Estado y progreso de una recalificación"""
+    id: str
+    quiz_id: int
+    modes: Dict[int, str]
+    old_points: Dict[int, int] = field(default_factory=dict)
+    status: str = JOB_QUEUED
+    phase: Optional[str] = None
+    total_rows: int = 0
+    processed_rows: int = 0
+    rows_by_method: Dict[str, int] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    # Referencia a la tarea en curso para que no la recoja el recolector de basura
+    task: Optional[asyncio.Task] = field(default=None, repr=False, compare=False)
+
+    def count(self, method: str, rows: int) -> None:
+        if rows:
+            self.rows_by_method[method] = self.rows_by_method.get(method, 0) + rows
+            metrics.inc("regrade_rows_total", rows, method=method)
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "quiz_id": self.quiz_id,
+            "question_ids": sorted(self.modes),
+            "status": self.status,
+            "phase": self.phase,
+            "total_rows": self.total_rows,
+            "processed_rows": self.processed_rows,
+            "rows_by_method": dict(self.rows_by_method),
+            "elapsed_s": round(elapsed, 3) if elapsed is not None else None,
+            "rows_per_second": round(self.processed_rows / elapsed, 1) if elapsed else None,
+            "error": self.error,
+        }
+
+
+class RegradeService:
+    """
+    Recalificación en lote de las respuestas ya guardadas cuando cambia la
+    respuesta correcta o los puntos de una pregunta.
+
+    Todo se calcula antes de escribir y se aplica en una sola transacción corta:
+    las respuestas de opción múltiple y las de texto idénticas a la respuesta
+    correcta (normalizadas) con un único UPDATE; el resto de las de texto pasa
+    por la pre-calificación léxica y, las ambiguas, por el LLM en lotes, y se
+    escriben con un UPDATE por clave primaria en bloque; si solo cambiaron los
+    puntos, los obtenidos se escalan con otro UPDATE. Al final los puntos de
+    cada estudiante en el quiz se re-agregan con un UPDATE ... GROUP BY. Los
+    trabajos de un mismo quiz se ejecutan de a uno.
+    """
+
+    _jobs: "OrderedDict[str, RegradeJob]" = OrderedDict()
+    _quiz_locks: Dict[int, asyncio.Lock] = {}
+
+    @staticmethod
+    def start(quiz_id: int, modes: Dict[int, str], old_points: Optional[Dict[int, int]] = None) -> RegradeJob:
+        """Encola la recalificación de las preguntas 'modes' ({question_id: modo}) en segundo plano"""
+        job = RegradeJob(id=uuid.uuid4().hex, quiz_id=quiz_id, modes=dict(modes), old_points=dict(old_points or {}))
+        RegradeService._jobs[job.id] = job
+        while len(RegradeService._jobs) > settings.REGRADE_MAX_JOBS:
+            oldest_id, oldest = next(iter(RegradeService._jobs.items()))
+            if oldest.status in (JOB_QUEUED, JOB_RUNNING):
+                break
+            RegradeService._jobs.pop(oldest_id)
+        job.task = asyncio.get_running_loop().create_task(RegradeService._run(job))
+        return job
+
+    @staticmethod
+    async def update_answer_key(db: AsyncSession, question_id: int, data: QuestionAnswerKeyUpdateInput) -> Optional[QuestionAnswerKeyUpdateOutput]:
+        """
+        Cambia la respuesta correcta y/o los puntos de una pregunta, actualiza el
+        total del quiz y lanza la recalificación de sus respuestas: completa si
+        cambió la respuesta correcta, solo de escala si cambiaron los puntos.
+        Retorna None si la pregunta no existe.
+        """
+        if data.answer_correct is None and data.points is None:
+            raise ValueError("Envía 'answer_correct' o 'points'.")
+        if data.answer_correct is not None and not data.answer_correct.strip():
+            raise ValueError("La respuesta correcta no puede estar vacía.")
+
+        question = (await db.execute(select(Question).filter_by(id=question_id))).scalar_one_or_none()
+        if question is None:
+            return None
+        key_changed = data.answer_correct is not None and data.answer_correct != question.answer_correct
+        if key_changed:
+            # En opción múltiple la nueva respuesta debe ser una de las opciones: si no, la
+            # recalificación completa dejaría en 0 todas las respuestas de la pregunta
+            options_json = (await db.execute(
+                select(Base_Multiple_Option.options).where(Base_Multiple_Option.id == question.id_answer)
+            )).scalar_one_or_none()
+            if options_json is not None:
+                try:
+                    options = json.loads(options_json)
+                except json.JSONDecodeError:
+                    options = []
+                if data.answer_correct not in options:
+                    raise ValueError(f"La respuesta correcta '{data.answer_correct}' no es una de las opciones de la pregunta: {options}.")
+        old_points = question.points
+        points_changed = data.points is not None and data.points != old_points
+        if key_changed:
+            question.answer_correct = data.answer_correct
+        if points_changed:
+            question.points = data.points
+        await db.flush()
+
+        quiz_total = (await db.execute(
+            select(func.coalesce(func.sum(Question.points), 0)).where(Question.quiz_id == question.quiz_id)
+        )).scalar_one()
+        classroom_id = (await db.execute(
+            update(Quiz).where(Quiz.id == question.quiz_id).values(total_points=quiz_total).returning(Quiz.id_classroom)
+        )).scalar_one()
+        await db.commit()
+        QuizService.invalidate_quiz_cache(question.quiz_id, classroom_id)
+
+        job = None
+        if key_changed:
+            job = RegradeService.start(question.quiz_id, {question_id: REGRADE_MODE_FULL})
+        elif points_changed:
+            job = RegradeService.start(question.quiz_id, {question_id: REGRADE_MODE_RESCALE}, {question_id: old_points})
+        return QuestionAnswerKeyUpdateOutput(
+            question_id=question_id,
+            answer_correct=question.answer_correct,
+            points=question.points,
+            quiz_total_points=quiz_total,
+            regrade_job=RegradeJobOutput(**job.as_dict()) if job else None,
+        )
+
+    @staticmethod
+    async def regrade_quiz(db: AsyncSession, quiz_id: int, question_ids: Optional[List[int]] = None) -> Optional[RegradeJob]:
+        """
+        Recalifica por completo las respuestas de las preguntas indicadas del quiz
+        (todas si no se indican). Retorna None si el quiz no existe.
+        """
+        quiz_exists = (await db.execute(select(Quiz.id).filter_by(id=quiz_id))).scalar_one_or_none()
+        if quiz_exists is None:
+            return None
+        stmt = select(Question.id).where(Question.quiz_id == quiz_id)
+        if question_ids:
+            stmt = stmt.where(Question.id.in_(question_ids))
+        found = (await db.execute(stmt)).scalars().all()
+        missing = set(question_ids or []) - set(found)
+        if missing:
+            raise ValueError(f"Las preguntas {sorted(missing)} no pertenecen al quiz {quiz_id}.")
+        if not found:
+            raise ValueError(f"El quiz {quiz_id} no tiene preguntas.")
+        return RegradeService.start(quiz_id, {qid: REGRADE_MODE_FULL for qid in found})
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[RegradeJob]:
+        return RegradeService._jobs.get(job_id)
+
+    @staticmethod
+    async def _run(job: RegradeJob) -> None:
+        lock = RegradeService._quiz_locks.setdefault(job.quiz_id, asyncio.Lock())
+        async with lock:
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            try:
+                await RegradeService._regrade(job)
+                job.status = JOB_COMPLETED
+            except Exception as e:
+                logger.error(f"Fallo la recalificación {job.id} del quiz {job.quiz_id}: {e}", exc_info=True)
+                job.status = JOB_FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                job.phase = None
+                elapsed = job.finished_at - job.started_at
+                metrics.inc("regrade_jobs_total", status=job.status)
+                metrics.observe("regrade_job_seconds", elapsed)
+                if elapsed > 0:
+                    metrics.set("regrade_rows_per_second", round(job.processed_rows / elapsed, 1))
+
+    @staticmethod
+    async def _regrade(job: RegradeJob) -> None:
+        full_ids = [qid for qid, mode in job.modes.items() if mode == REGRADE_MODE_FULL]
+        rescale_ids = [qid for qid, mode in job.modes.items() if mode == REGRADE_MODE_RESCALE]
+
+        async with AsyncSessionLocal() as db:
+            job.phase = "counting"
+            job.total_rows = (await db.execute(
+                select(func.count()).select_from(Question_Student).where(Question_Student.id_question.in_(list(job.modes)))
+            )).scalar_one()
+            quiz = (await db.execute(select(Quiz).filter_by(id=job.quiz_id))).scalar_one_or_none()
+            if quiz is None:
+                raise ValueError(f"Quiz con ID {job.quiz_id} no encontrado.")
+
+            # Lectura y calificación de las respuestas de texto sin escribir nada todavía
+            job.phase = "grading_text"
+            text_rows = await RegradeService._pending_text_rows(db, full_ids) if full_ids else []
+        text_updates = await RegradeService._grade_text_rows(job, quiz, text_rows)
+
+        async with AsyncSessionLocal() as db:
+            job.phase = "writing"
+            if full_ids:
+                sql_rows = await RegradeService._update_exact_rows(db, full_ids)
+                job.count("sql", sql_rows)
+                job.processed_rows += sql_rows
+                if text_updates:
+                    await db.execute(update(Question_Student), text_updates)
+            if rescale_ids:
+                rescaled = await RegradeService._rescale_rows(db, rescale_ids, job.old_points)
+                job.count("rescale", rescaled)
+                job.processed_rows += rescaled
+            job.phase = "aggregating"
+            await RegradeService._reaggregate(db, job.quiz_id)
+            await db.commit()
+        QuizService.invalidate_quiz_results(job.quiz_id, quiz.id_classroom)
+        logger.info(f"Recalificación {job.id} del quiz {job.quiz_id}: {job.processed_rows}/{job.total_rows} respuestas {job.rows_by_method}")
+
+    @staticmethod
+    def _text_source(question_ids: List[int]):
+        return (
+            select(Question_Student.id_student, Question_Student.id_question, Question_Student.id_answer_submitted)
+            .join(Question, Question.id == Question_Student.id_question)
+            .join(_SUBMITTED_TEXTS, _SUBMITTED_TEXTS.c.id == Question_Student.id_answer_submitted)
+            .where(Question_Student.id_question.in_(question_ids))
+        )
+
+    @staticmethod
+    async def _pending_text_rows(db, question_ids: List[int]) -> List[Any]:
+        """Respuestas de texto que no coinciden exactamente con la respuesta correcta"""
+        stmt = (
+            RegradeService._text_source(question_ids)
+            .add_columns(_SUBMITTED_TEXTS.c.answer_written, Question.statement, Question.answer_correct, Question.points)
+            .where(_normalized_sql(_SUBMITTED_TEXTS.c.answer_written) != _normalized_sql(Question.answer_correct))
+        )
+        return (await db.execute(stmt)).all()
+
+    @staticmethod
+    async def _update_exact_rows(db, question_ids: List[int]) -> int:
+        """
+        Un solo UPDATE para las respuestas de opción múltiple (100% si la opción es
+        la correcta, 0% si no) y las de texto idénticas a la respuesta correcta.
+        """
+        is_option = _SUBMITTED_OPTIONS.c.id.isnot(None)
+        option_correct = and_(is_option, _SUBMITTED_OPTIONS.c.option_select == Question.answer_correct)
+        text_exact = and_(
+            _SUBMITTED_TEXTS.c.id.isnot(None),
+            _normalized_sql(_SUBMITTED_TEXTS.c.answer_written) == _normalized_sql(Question.answer_correct),
+        )
+        source = (
+            select(
+                Question_Student.id_student,
+                Question_Student.id_question,
+                Question_Student.id_answer_submitted,
+                case((or_(option_correct, text_exact), Question.points), else_=0).label("points"),
+                case(
+                    (option_correct, literal("¡Muy bien! Esa es la opción correcta.")),
+                    (is_option, func.concat("Incorrecto. La opción correcta era: '", Question.answer_correct, "'.")),
+                    else_=literal("¡Correcto! Tu respuesta coincide con la respuesta esperada."),
+                ).label("feedback"),
+            )
+            .join(Question, Question.id == Question_Student.id_question)
+            .outerjoin(_SUBMITTED_OPTIONS, _SUBMITTED_OPTIONS.c.id == Question_Student.id_answer_submitted)
+            .outerjoin(_SUBMITTED_TEXTS, _SUBMITTED_TEXTS.c.id == Question_Student.id_answer_submitted)
+            .where(Question_Student.id_question.in_(question_ids), or_(is_option, text_exact))
+            .subquery()
+        )
+        result = await db.execute(
+            update(Question_Student)
+            .where(
+                Question_Student.id_student == source.c.id_student,
+                Question_Student.id_question == source.c.id_question,
+                Question_Student.id_answer_submitted == source.c.id_answer_submitted,
+            )
+            .values(points_obtained=source.c.points, feedback_automated=source.c.feedback, grading_source=GRADING_SOURCE_LOCAL)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount or 0
+
+    @staticmethod
+    async def _grade_text_rows(job: RegradeJob, quiz: Quiz, rows: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Califica las respuestas de texto restantes: primero la pre-calificación
+        léxica de todas a la vez y las ambiguas con el LLM en lotes de
+        REGRADE_LLM_BATCH_SIZE. Las que el LLM no pudo calificar quedan igual.
+        Retorna los valores a escribir por clave primaria.
+        """
+        if not rows:
+            return []
+        updates: List[Dict[str, Any]] = []
+
+        def row_update(row, percentage: int, feedback: str, source: str) -> Dict[str, Any]:
+            return {
+                "id_student": row.id_student,
+                "id_question": row.id_question,
+                "id_answer_submitted": row.id_answer_submitted,
+                "points_obtained": int(round((percentage / 100) * row.points)),
+                "feedback_automated": feedback,
+                "grading_source": source,
+            }
+
+        items = [
+            {
+                "question_id": index,
+                "statement": row.statement,
+                "correct_answer": row.answer_correct,
+                "question_type": "text",
+                "student_answer": row.answer_written,
+                "max_points": row.points,
+            }
+            for index, row in enumerate(rows, start=1)
+        ]
+        if settings.PREGRADE_ENABLED:
+            local, pending = LexicalPreGrader.pregrade(items, quiz_id=quiz.id)
+        else:
+            local, pending = [], items
+        for evaluation in local:
+            updates.append(row_update(rows[evaluation["question_id"] - 1], evaluation["percentage_correct"], evaluation["feedback"], GRADING_SOURCE_LOCAL))
+        job.count("local", len(local))
+        job.processed_rows += len(local)
+
+        batch_size = max(1, settings.REGRADE_LLM_BATCH_SIZE)
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+        async def grade_batch(batch: List[Dict[str, Any]]) -> None:
+            prompt = PromptBuilder.grading_prompt(quiz.title, quiz.instruction, sum(item["max_points"] for item in batch), batch)
+            try:
+                response = await get_llm_provider().generate(
+                    [prompt],
+                    operation=OPERATION_GRADE,
+                    temperature=0.5,
+                    response_schema=grading_response_schema(general_feedback=False),
+                    system_instruction=PromptBuilder.grading_system_instruction(general_feedback=False),
+                    timeout=180,
+                    tags={"classroom_id": quiz.id_classroom, "question_ids": [item["question_id"] for item in batch]},
+                )
+                evaluations = {e.get("question_id"): e for e in json.loads(response.text).get("evaluations", []) if isinstance(e, dict)}
+            except Exception as e:
+                logger.warning(f"Fallo la recalificación con el LLM de {len(batch)} respuestas: {e}")
+                evaluations = {}
+            graded = 0
+            for item in batch:
+                evaluation = evaluations.get(item["question_id"])
+                if evaluation is None:
+                    continue
+                percentage = max(0, min(100, int(evaluation.get("percentage_correct", 0))))
+                updates.append(row_update(rows[item["question_id"] - 1], percentage, evaluation.get("feedback", "Feedback no disponible."), GRADING_SOURCE_LLM))
+                graded += 1
+            job.count("llm", graded)
+            job.count("failed", len(batch) - graded)
+            job.processed_rows += len(batch)
+
+        await asyncio.gather(*(grade_batch(batch) for batch in batches))
+        return updates
+
+    @staticmethod
+    async def _rescale_rows(db, question_ids: List[int], old_points: Dict[int, int]) -> int:
+        """Escala los puntos obtenidos al nuevo puntaje de cada pregunta con un solo UPDATE"""
+        scalable = {qid: points for qid, points in old_points.items() if qid in question_ids and points}
+        if not scalable:
+            return 0
+        old = case(*((Question_Student.id_question == qid, points) for qid, points in scalable.items()))
+        result = await db.execute(
+            update(Question_Student)
+            .where(Question_Student.id_question == Question.id, Question.id.in_(list(scalable)))
+            .values(points_obtained=func.round(cast(Question_Student.points_obtained, Numeric) * Question.points / old))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount or 0
+
+    @staticmethod
+    async def _reaggregate(db, quiz_id: int) -> None:
+        """
+        Recalcula quiz_students.points_obtained del quiz con un UPDATE ... GROUP BY.
+        Con FEEDBACK_LAZY, el feedback general de quien cambió de puntaje se borra
+        para que se vuelva a generar la próxima vez que se consulte.
+        """
+        totals = (
+            select(Question_Student.id_student, func.sum(Question_Student.points_obtained).label("total"))
+            .join(Question, Question.id == Question_Student.id_question)
+            .where(Question.quiz_id == quiz_id)
+            .group_by(Question_Student.id_student)
+            .subquery()
+        )
+        values = {Quiz_Student.points_obtained: totals.c.total}
+        if settings.FEEDBACK_LAZY:
+            values[Quiz_Student.feedback_general_automated] = case(
+                (Quiz_Student.points_obtained != totals.c.total, None),
+                else_=Quiz_Student.feedback_general_automated,
+            )
+        await db.execute(
+            update(Quiz_Student)
+            .where(Quiz_Student.id_quiz == quiz_id, Quiz_Student.id_student == totals.c.id_student)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
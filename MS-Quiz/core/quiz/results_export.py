@@ -0,0 +1,209 @@
+import csv
+import io
+import logging
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config.settings import get_settings
+from core.metrics import metrics
+from db.database import AsyncSessionLocal
+from db.models.quiz import Quiz, Quiz_Student, Question, Question_Student, Answer_Submitted, Submitted_Text, Submitted_Multiple_Option
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT_CSV = "csv"
+EXPORT_FORMAT_PARQUET = "parquet"
+EXPORT_MEDIA_TYPES = {
+    EXPORT_FORMAT_CSV: "text/csv; charset=utf-8",
+    EXPORT_FORMAT_PARQUET: "application/vnd.apache.parquet",
+}
+
+# Columnas exportadas, en orden: (nombre, tipo de Arrow)
+EXPORT_COLUMNS = [
+    ("classroom_id", "int64"),
+    ("quiz_id", "int64"),
+    ("quiz_title", "string"),
+    ("quiz_total_points", "int64"),
+    ("student_id", "int64"),
+    ("quiz_points_obtained", "int64"),
+    ("question_id", "int64"),
+    ("statement", "string"),
+    ("answer_type", "string"),
+    ("answer_submitted", "string"),
+    ("answer_correct", "string"),
+    ("question_points", "int64"),
+    ("points_obtained", "int64"),
+    ("grading_source", "string"),
+    ("feedback", "string"),
+]
+
+metrics.describe("results_export_rows_total", "Filas exportadas de resultados por formato")
+metrics.describe("results_export_seconds", "Duración de las exportaciones de resultados")
+
+_SUBMITTED_TEXTS = Submitted_Text.__table__
+_SUBMITTED_OPTIONS = Submitted_Multiple_Option.__table__
+
+
+class _ChunkSink:
+    """Archivo de solo escritura que acumula lo escrito hasta que se retira con take()"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ResultsExporter:
+    """
+    Exportación de resultados (quiz x estudiante x pregunta) en CSV o Parquet.
+
+    Las filas se leen con un cursor del servidor (db.stream con yield_per) y se
+    serializan por lotes de EXPORT_BATCH_ROWS a medida que llegan: cada lote es
+    un fragmento CSV o un row group de Parquet que se envía enseguida, así la
+    memoria no depende del tamaño del aula. La cabecera (CSV) o la primera
+    parte del archivo se envía antes de ejecutar la consulta.
+    """
+
+    @staticmethod
+    def _rows_query(quiz_id: Optional[int] = None, classroom_id: Optional[int] = None):
+        stmt = (
+            select(
+                Quiz.id_classroom.label("classroom_id"),
+                Quiz.id.label("quiz_id"),
+                Quiz.title.label("quiz_title"),
+                Quiz.total_points.label("quiz_total_points"),
+                Question_Student.id_student.label("student_id"),
+                Quiz_Student.points_obtained.label("quiz_points_obtained"),
+                Question.id.label("question_id"),
+                Question.statement,
+                Answer_Submitted.type.label("answer_type"),
+                func.coalesce(_SUBMITTED_TEXTS.c.answer_written, _SUBMITTED_OPTIONS.c.option_select).label("answer_submitted"),
+                Question.answer_correct,
+                Question.points.label("question_points"),
+                Question_Student.points_obtained,
+                Question_Student.grading_source,
+                Question_Student.feedback_automated.label("feedback"),
+            )
+            .select_from(Question_Student)
+            .join(Question, Question.id == Question_Student.id_question)
+            .join(Quiz, Quiz.id == Question.quiz_id)
+            .outerjoin(Quiz_Student, (Quiz_Student.id_quiz == Quiz.id) & (Quiz_Student.id_student == Question_Student.id_student))
+            .outerjoin(Answer_Submitted, Answer_Submitted.id == Question_Student.id_answer_submitted)
+            .outerjoin(_SUBMITTED_TEXTS, _SUBMITTED_TEXTS.c.id == Question_Student.id_answer_submitted)
+            .outerjoin(_SUBMITTED_OPTIONS, _SUBMITTED_OPTIONS.c.id == Question_Student.id_answer_submitted)
+            .order_by(Quiz.id, Question_Student.id_student, Question.id)
+        )
+        if quiz_id is not None:
+            stmt = stmt.where(Quiz.id == quiz_id)
+        if classroom_id is not None:
+            stmt = stmt.where(Quiz.id_classroom == classroom_id)
+        return stmt
+
+    @staticmethod
+    async def validate(db: AsyncSession, export_format: str, quiz_id: Optional[int] = None, classroom_id: Optional[int] = None) -> bool:
+        """
+        Se verifica antes de empezar la respuesta, porque después ya no se puede
+        cambiar el código HTTP. Retorna False si el quiz o el aula no tienen quizzes.
+        """
+        if export_format not in EXPORT_MEDIA_TYPES:
+            raise ValueError(f"Formato no soportado: {export_format}. Usa {' o '.join(EXPORT_MEDIA_TYPES)}.")
+        if export_format == EXPORT_FORMAT_PARQUET:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError("La exportación a Parquet requiere el paquete 'pyarrow'.")
+        stmt = select(Quiz.id).limit(1)
+        if quiz_id is not None:
+            stmt = stmt.where(Quiz.id == quiz_id)
+        if classroom_id is not None:
+            stmt = stmt.where(Quiz.id_classroom == classroom_id)
+        return (await db.execute(stmt)).scalar_one_or_none() is not None
+
+    @staticmethod
+    async def _row_batches(quiz_id: Optional[int], classroom_id: Optional[int]) -> AsyncIterator[List[Any]]:
+        """
+        Lotes de filas desde un cursor del servidor. Usa su propia sesión: la de la
+        dependencia get_db se cierra antes de que termine de enviarse la respuesta.
+        """
+        batch_rows = settings.EXPORT_BATCH_ROWS
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                ResultsExporter._rows_query(quiz_id, classroom_id).execution_options(yield_per=batch_rows)
+            )
+            async for rows in result.partitions(batch_rows):
+                yield rows
+
+    @staticmethod
+    async def _csv_chunks(batches: AsyncIterator[List[Any]]) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([name for name, _ in EXPORT_COLUMNS])
+        # BOM para que Excel reconozca el UTF-8
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+        async for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            metrics.inc("results_export_rows_total", len(rows), format=EXPORT_FORMAT_CSV)
+            yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    async def _parquet_chunks(batches: AsyncIterator[List[Any]]) -> AsyncIterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(name, getattr(pa, arrow_type)()) for name, arrow_type in EXPORT_COLUMNS])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+        try:
+            yield sink.take()
+            async for rows in batches:
+                columns = list(zip(*rows))
+                writer.write_batch(pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+                metrics.inc("results_export_rows_total", len(rows), format=EXPORT_FORMAT_PARQUET)
+                yield sink.take()
+        finally:
+            writer.close()
+        # El pie del archivo (metadatos de los row groups) se escribe al cerrar
+        yield sink.take()
+
+    @staticmethod
+    async def stream(export_format: str, quiz_id: Optional[int] = None, classroom_id: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Contenido del archivo por fragmentos, para StreamingResponse"""
+        started = time.monotonic()
+        batches = ResultsExporter._row_batches(quiz_id, classroom_id)
+        chunks = ResultsExporter._csv_chunks(batches) if export_format == EXPORT_FORMAT_CSV else ResultsExporter._parquet_chunks(batches)
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            logger.error(f"Fallo la exportación de resultados (quiz={quiz_id}, aula={classroom_id}): {e}", exc_info=True)
+            raise
+        finally:
+            metrics.observe("results_export_seconds", time.monotonic() - started)
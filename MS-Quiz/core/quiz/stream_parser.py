@@ -0,0 +1,85 @@
+import json
+import re
+import logging
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_QUESTIONS_ARRAY_RE = re.compile(r'"questions"\s*:\s*\[')
+
+
+class IncrementalQuestionParser:
+    """
+    Parser incremental para la respuesta en streaming de Gemini.
+
+    Recibe fragmentos de texto a medida que llegan y devuelve cada objeto del
+    arreglo "questions" en cuanto su JSON está completo, sin esperar al resto
+    de la respuesta. El texto completo queda disponible en 'buffer' para el
+    procesamiento final.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.malformed = 0
+        self._pos: Optional[int] = None # Posición de escaneo dentro del arreglo (None = aún no encontrado)
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start: Optional[int] = None
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """Indica si ya se cerró el arreglo de preguntas"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Agrega un fragmento y retorna las preguntas que quedaron completas con él.
+        """
+        self.buffer += chunk
+        if self._done:
+            return []
+
+        if self._pos is None:
+            match = _QUESTIONS_ARRAY_RE.search(self.buffer)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        completed = []
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._obj_start = i
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0 and char == "]":
+                    self._done = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and char == "}" and self._obj_start is not None:
+                    raw_question = buffer[self._obj_start:i + 1]
+                    self._obj_start = None
+                    try:
+                        completed.append(json.loads(raw_question))
+                    except json.JSONDecodeError as e:
+                        self.malformed += 1
+                        logger.warning(f"Pregunta mal formada en el streaming de Gemini: {e}")
+            i += 1
+
+        self._pos = i
+        return completed
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config.settings import get_settings
+from core.metrics import metrics
+from core.quiz.grading_scheduler import GradingScheduler
+from core.quiz.quiz_service import QuizService
+from db.database import AsyncSessionLocal
+from db.models.quiz import Quiz, Submission_Intake
+from schemas.quiz import QuizSubmissionInput
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+SUBMISSION_QUEUED = "queued"
+SUBMISSION_PROCESSING = "processing"
+SUBMISSION_GRADED = "graded"
+SUBMISSION_FAILED = "failed"
+
+metrics.describe("submission_intake_total", "Entregas asíncronas por estado alcanzado (queued, graded, retried o failed)")
+metrics.describe("submission_queue_depth", "Entregas en cola pendientes de calificar por aula")
+metrics.describe("submission_in_flight", "Entregas que se están calificando por aula")
+metrics.describe("submission_grading_seconds", "Duración de la calificación de cada entrega asíncrona por prioridad")
+metrics.describe("submission_queue_lag_seconds", "Espera entre la recepción de una entrega y el inicio de su calificación por aula")
+
+
+class SubmissionIntakeService:
+    """
+    Recepción de entregas en el journal 'submission_intakes'.
+
+    La entrega se guarda tal cual con un solo INSERT y se responde enseguida con
+    su ID; la calificación (que puede llamar al LLM) la hacen los workers de
+    SubmissionWorkerPool. Como el journal está en Postgres, una entrega aceptada
+    no se pierde si el proceso se reinicia antes de calificarla.
+    """
+
+    @staticmethod
+    async def enqueue(db: AsyncSession, submission_data: QuizSubmissionInput) -> Optional[Submission_Intake]:
+        """Guarda la entrega en la cola. Retorna None si el quiz no existe"""
+        quiz = (await db.execute(
+            select(Quiz.id_classroom, Quiz.end_time).where(Quiz.id == submission_data.quiz_id)
+        )).first()
+        if quiz is None:
+            return None
+
+        intake = Submission_Intake(
+            quiz_id=submission_data.quiz_id,
+            student_id=submission_data.student_id,
+            classroom_id=quiz.id_classroom,
+            priority=GradingScheduler.priority_for(submission_data),
+            deadline=quiz.end_time,
+            payload=submission_data.model_dump_json(),
+            status=SUBMISSION_QUEUED,
+        )
+        db.add(intake)
+        await db.commit()
+        metrics.inc("submission_intake_total", status=SUBMISSION_QUEUED)
+        submission_workers.notify()
+        return intake
+
+    @staticmethod
+    async def get_status(db: AsyncSession, submission_id: int) -> Optional[Dict[str, Any]]:
+        intake = await db.get(Submission_Intake, submission_id)
+        if intake is None:
+            return None
+        return {
+            "submission_id": intake.id,
+            "quiz_id": intake.quiz_id,
+            "student_id": intake.student_id,
+            "status": intake.status,
+            "classroom_id": intake.classroom_id,
+            "priority": intake.priority,
+            "attempts": intake.attempts,
+            "last_error": intake.last_error,
+            "next_attempt_at": intake.next_attempt_at if intake.status == SUBMISSION_QUEUED else None,
+            "result": json.loads(intake.result) if intake.result else None,
+            "created_at": intake.created_at,
+            "updated_at": intake.updated_at,
+        }
+
+
+class SubmissionWorkerPool:
+    """
+    Pool de SUBMISSION_WORKERS tareas que califican las entregas en cola.
+
+    Cada worker toma la siguiente entrega en el orden de GradingScheduler con
+    FOR UPDATE SKIP LOCKED (varias instancias del servicio pueden compartir la
+    cola sin tomar la misma) y la califica con
+    QuizService.process_student_submission en la misma transacción que la marca
+    como 'graded'. Un ValueError (quiz o pregunta inválidos) la
+    marca 'failed' sin reintentos; cualquier otro error la devuelve a la cola
+    con espera exponencial hasta SUBMISSION_MAX_ATTEMPTS. Las entregas que
+    quedaron en 'processing' por un worker caído vuelven a la cola pasados
+    SUBMISSION_LOCK_TIMEOUT_S segundos.
+    """
+
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # Aulas con gauges publicados, para dejarlos en 0 cuando se vacía su cola
+        self._reported_classrooms: Set[Optional[int]] = set()
+
+    def start(self) -> None:
+        if self._tasks or settings.SUBMISSION_WORKERS <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [loop.create_task(self._worker(index)) for index in range(settings.SUBMISSION_WORKERS)]
+        self._tasks.append(loop.create_task(self._maintenance_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._wakeup = None
+
+    def notify(self) -> None:
+        """Despierta a los workers tras encolar una entrega"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _wait_for_work(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=settings.SUBMISSION_POLL_INTERVAL_S)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Worker de entregas {index}: {e}", exc_info=True)
+                processed = False
+            if not processed:
+                await self._wait_for_work()
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            try:
+                await self.requeue_stale()
+                await self.refresh_queue_metrics()
+            except Exception as e:
+                logger.error(f"Fallo el mantenimiento de la cola de entregas: {e}", exc_info=True)
+            await asyncio.sleep(settings.SCHEDULER_METRICS_INTERVAL_S)
+
+    async def refresh_queue_metrics(self) -> None:
+        """Publica por aula las entregas en cola y las que se están calificando"""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Submission_Intake.classroom_id, Submission_Intake.status, func.count())
+                .where(Submission_Intake.status.in_((SUBMISSION_QUEUED, SUBMISSION_PROCESSING)))
+                .group_by(Submission_Intake.classroom_id, Submission_Intake.status)
+            )).all()
+        counts = {(classroom_id, status): count for classroom_id, status, count in rows}
+        classrooms = {classroom_id for classroom_id, _ in counts} | self._reported_classrooms
+        for classroom_id in classrooms:
+            metrics.set("submission_queue_depth", counts.get((classroom_id, SUBMISSION_QUEUED), 0), classroom_id=classroom_id)
+            metrics.set("submission_in_flight", counts.get((classroom_id, SUBMISSION_PROCESSING), 0), classroom_id=classroom_id)
+        self._reported_classrooms = {classroom_id for classroom_id, _ in counts}
+
+    @staticmethod
+    async def requeue_stale() -> int:
+        """Devuelve a la cola las entregas bloqueadas por un worker que no terminó"""
+        cutoff = datetime.now() - timedelta(seconds=settings.SUBMISSION_LOCK_TIMEOUT_S)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Submission_Intake)
+                .where(Submission_Intake.status == SUBMISSION_PROCESSING, Submission_Intake.locked_at < cutoff)
+                .values(status=SUBMISSION_QUEUED, locked_at=None, next_attempt_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        if result.rowcount:
+            logger.warning(f"{result.rowcount} entregas bloqueadas volvieron a la cola")
+        return result.rowcount
+
+    @staticmethod
+    async def _claim(db: AsyncSession) -> Optional[Submission_Intake]:
+        now = datetime.now()
+        next_id = GradingScheduler.next_submission_query(now).scalar_subquery()
+        claimed = (await db.execute(
+            update(Submission_Intake)
+            .where(Submission_Intake.id == next_id)
+            .values(
+                status=SUBMISSION_PROCESSING,
+                attempts=Submission_Intake.attempts + 1,
+                locked_at=now,
+                updated_at=now,
+            )
+            .returning(
+                Submission_Intake.id, Submission_Intake.payload, Submission_Intake.attempts,
+                Submission_Intake.created_at, Submission_Intake.classroom_id, Submission_Intake.priority,
+            )
+            .execution_options(synchronize_session=False)
+        )).first()
+        await db.commit()
+        return claimed
+
+    @staticmethod
+    async def run_once() -> bool:
+        """Califica la siguiente entrega en cola. Retorna False si no había ninguna"""
+        async with AsyncSessionLocal() as db:
+            claimed = await SubmissionWorkerPool._claim(db)
+        if claimed is None:
+            return False
+
+        intake_id, payload, attempts, created_at, classroom_id, priority = claimed
+        if attempts == 1:
+            metrics.observe("submission_queue_lag_seconds", (datetime.now() - created_at).total_seconds(), classroom_id=classroom_id)
+        started = time.monotonic()
+        try:
+            submission = QuizSubmissionInput(**json.loads(payload))
+            async with AsyncSessionLocal() as db:
+                result = await QuizService.process_student_submission(db, submission, commit=False)
+                # Las respuestas y el estado se guardan en la misma transacción:
+                # una entrega 'graded' nunca queda sin sus respuestas ni al revés, y
+                # si el proceso cae antes del commit se vuelve a calificar desde cero
+                await db.execute(
+                    update(Submission_Intake)
+                    .where(Submission_Intake.id == intake_id)
+                    .values(status=SUBMISSION_GRADED, result=json.dumps(result, default=str), last_error=None, locked_at=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            QuizService.invalidate_after_submission(submission.quiz_id, classroom_id)
+            metrics.inc("submission_intake_total", status=SUBMISSION_GRADED)
+        except ValueError as e:
+            await SubmissionWorkerPool._mark_failed(intake_id, str(e))
+        except Exception as e:
+            logger.error(f"Fallo la calificación de la entrega {intake_id} (intento {attempts}): {e}", exc_info=True)
+            if attempts >= settings.SUBMISSION_MAX_ATTEMPTS:
+                await SubmissionWorkerPool._mark_failed(intake_id, str(e))
+            else:
+                await SubmissionWorkerPool._retry_later(intake_id, attempts, str(e))
+        finally:
+            metrics.observe("submission_grading_seconds", time.monotonic() - started, priority=priority)
+        return True
+
+    @staticmethod
+    async def _mark_failed(intake_id: int, error: str) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Submission_Intake)
+                .where(Submission_Intake.id == intake_id)
+                .values(status=SUBMISSION_FAILED, last_error=error, locked_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        metrics.inc("submission_intake_total", status=SUBMISSION_FAILED)
+
+    @staticmethod
+    async def _retry_later(intake_id: int, attempts: int, error: str) -> None:
+        delay_s = min(settings.SUBMISSION_RETRY_BASE_S * 2 ** (attempts - 1), settings.SUBMISSION_RETRY_MAX_S)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Submission_Intake)
+                .where(Submission_Intake.id == intake_id)
+                .values(
+                    status=SUBMISSION_QUEUED,
+                    last_error=error,
+                    locked_at=None,
+                    next_attempt_at=datetime.now() + timedelta(seconds=delay_s),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        metrics.inc("submission_intake_total", status="retried")
+
+
+submission_workers = SubmissionWorkerPool()
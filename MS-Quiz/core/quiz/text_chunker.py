@@ -0,0 +1,77 @@
+import re
+from typing import List
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?¿¡])\s+")
+
+
+class TextChunker:
+    """
+    Divide documentos largos en secciones de tamaño acotado para generar
+    preguntas por partes (map-reduce).
+    """
+
+    @staticmethod
+    def _split_oversized(block: str, max_chars: int) -> List[str]:
+        """Parte un bloque demasiado grande por párrafos, luego por oraciones y en último caso por caracteres"""
+        if len(block) <= max_chars:
+            return [block]
+
+        pieces = []
+        for splitter in (_PARAGRAPH_RE, _SENTENCE_RE):
+            parts = [p for p in splitter.split(block) if p.strip()]
+            if len(parts) > 1:
+                for part in parts:
+                    pieces.extend(TextChunker._split_oversized(part, max_chars))
+                return pieces
+
+        return [block[i:i + max_chars] for i in range(0, len(block), max_chars)]
+
+    @staticmethod
+    def split_sections(blocks: List[str], max_chars: int, max_sections: int) -> List[str]:
+        """
+        Agrupa bloques consecutivos (páginas o párrafos) en secciones.
+
+        Args:
+            blocks: Páginas o párrafos del documento, en orden
+            max_chars: Tamaño objetivo máximo de cada sección
+            max_sections: Número máximo de secciones; si se supera, se agrupan
+                secciones vecinas para acotar el número de llamadas al modelo
+
+        Returns:
+            Lista de secciones en el orden del documento
+        """
+        units = []
+        for block in blocks:
+            if block and block.strip():
+                units.extend(TextChunker._split_oversized(block.strip(), max_chars))
+
+        sections: List[str] = []
+        current: List[str] = []
+        current_len = 0
+        for unit in units:
+            if current and current_len + len(unit) > max_chars:
+                sections.append("\n\n".join(current))
+                current, current_len = [], 0
+            current.append(unit)
+            current_len += len(unit) + 2
+        if current:
+            sections.append("\n\n".join(current))
+
+        if max_sections > 0 and len(sections) > max_sections:
+            # Reparto uniforme de secciones contiguas en max_sections grupos
+            grouped = []
+            per_group, remainder = divmod(len(sections), max_sections)
+            start = 0
+            for i in range(max_sections):
+                end = start + per_group + (1 if i < remainder else 0)
+                grouped.append("\n\n".join(sections[start:end]))
+                start = end
+            sections = grouped
+
+        return sections
+
+    @staticmethod
+    def split_text(text: str, max_chars: int, max_sections: int) -> List[str]:
+        """Divide un texto libre en secciones usando los párrafos como bloques"""
+        return TextChunker.split_sections(_PARAGRAPH_RE.split(text or ""), max_chars, max_sections)
@@ -1,3 +1,6 @@
+import logging
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.future import select
@@ -5,6 +8,7 @@ from sqlalchemy.future import select
 from config.settings import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
 
@@ -31,6 +35,21 @@ async def init_db():
         except Exception as e: # ¡Cambia 'except:' por 'except Exception as e:'!
             print(f"No se pudo crear las tablas. Error: {e}") # Imprime el error real
 
+    # Los modelos importan Base desde este módulo, por eso se importan aquí.
+    # Cada cambio va en su propia transacción para que un fallo no deshaga los demás;
+    # el código necesita estas columnas e índices, así que si alguno falla no se arranca
+    from db.models.quiz import SCHEMA_UPGRADES
+    failed = 0
+    for statement in SCHEMA_UPGRADES:
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(statement))
+        except Exception:
+            failed += 1
+            logger.error(f"No se pudo aplicar el cambio de esquema: {statement.splitlines()[0]}", exc_info=True)
+    if failed:
+        raise RuntimeError(f"Fallaron {failed} de {len(SCHEMA_UPGRADES)} cambios de esquema; revisa el log.")
+
 async def get_db():
     """
     Generador de dependencia para obtener una sesión de base de datos
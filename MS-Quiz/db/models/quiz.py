@@ -1,10 +1,23 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Computed, Index, SmallInteger, text
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.ext.declarative import declared_attr, as_declarative
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from db.database import Base # Asumo que 'db.database' es donde tienes tu 'Base'
 
+# Configuración de búsqueda de texto completo del banco de preguntas
+SEARCH_TS_CONFIG = "spanish"
+
+# Enunciado con más peso (A) que la respuesta correcta (B); Postgres lo mantiene al insertar o actualizar
+QUESTION_SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(statement, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(answer_correct, '')), 'B')"
+)
+
+# Fila de cada entrega en la cola del scheduler: su aula, o una fila común para las que no tienen.
+# Debe coincidir con la expresión de los índices para que Postgres los use
+SUBMISSION_LANE_SQL = "COALESCE(classroom_id, -1)"
+
 # --- Modelos de Entidades ---
 
 class Quiz(Base):
@@ -46,6 +59,11 @@ class Quiz_Student(Base):
     quiz = relationship("Quiz", back_populates="quiz_students")
     # 'id_student' es una FK de otro microservicio, no necesita relación ORM explícita aquí.
 
+    __table_args__ = (
+        # Ranking del quiz: filtra por quiz y da las filas en orden de puntaje (Index Only Scan tras VACUUM)
+        Index("ix_quiz_students_leaderboard", id_quiz, points_obtained.desc().nulls_last(), id_student),
+    )
+
 class Question(Base):
     """
     Modelo para almacenar las preguntas de un quiz.
@@ -54,7 +72,7 @@ class Question(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     # Se añade quiz_id para la relación con Quiz, necesario para que 'questions' en Quiz funcione.
-    quiz_id = Column(Integer, ForeignKey("quizzes.id")) 
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), index=True)
     id_answer = Column(Integer, ForeignKey("answer_bases.id"), nullable=True) # FK a Answer_Base (tabla base de la herencia unida)
     statement = Column(Text, nullable=False)
     answer_correct = Column(Text, nullable=True) # Mantenido según tu diagrama
@@ -75,6 +93,14 @@ class Question(Base):
     # 'students': List<Student> - id_student de otro microservicio, no se mapea aquí directamente.
     # 'comp_option': List<Competence_Question> - No se ha definido un modelo para Competence_Question.
 
+    # Vector de búsqueda del banco de preguntas (columna generada, solo lectura; no se carga con la pregunta)
+    search_vector = deferred(Column(TSVECTOR, Computed(QUESTION_SEARCH_VECTOR_SQL, persisted=True)))
+
+    __table_args__ = (
+        Index("ix_questions_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_questions_competences_id", "competences_id", postgresql_using="gin"),
+    )
+
 class Question_Student(Base):
     """
     Modelo para la relación de la respuesta de un estudiante a una pregunta.
@@ -88,6 +114,7 @@ class Question_Student(Base):
     feedback_automated = Column(Text, nullable=True)
     feedback_teacher = Column(Text, nullable=True)
     points_obtained = Column(Integer, default=0)
+    grading_source = Column(String(16), nullable=True) # "local", "llm" o "fallback"; NULL si se calificó antes de registrarlo
     
     # Relaciones
     question = relationship("Question", back_populates="students")
@@ -192,4 +219,79 @@ class Submitted_Multiple_Option(Answer_Submitted):
     __mapper_args__ = {
         'polymorphic_identity': 'submitted_multiple_option',
         'inherit_condition': (id == Answer_Submitted.id) # Condición de unión
-    }
\ No newline at end of file
+    }
+
+class Option_Answer_Count(Base):
+    """
+    Cuántos estudiantes eligieron cada opción de una pregunta de opción múltiple.
+    Se actualiza en la misma transacción que cada entrega (suma la opción nueva y
+    resta la anterior si el estudiante vuelve a enviar); la PK empieza por quiz_id
+    para leer la distribución de todo un quiz con un solo rango del índice.
+    """
+    __tablename__ = "option_answer_counts"
+
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True)
+    id_question = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    option_select = Column(Text, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class Submission_Intake(Base):
+    """
+    Journal de entregas recibidas por /submissions: se guardan con un solo INSERT
+    antes de calificarlas y los workers las toman de aquí (status: queued,
+    processing, graded o failed).
+    """
+    __tablename__ = "submission_intakes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    quiz_id = Column(Integer, nullable=False, index=True) # Sin FK: la entrega se acepta aunque el quiz se valide al calificar
+    student_id = Column(Integer, nullable=False, index=True)
+    classroom_id = Column(Integer, nullable=True, index=True) # Para repartir los workers entre aulas
+    priority = Column(SmallInteger, nullable=False, default=2) # 0: solo opción múltiple, 1: texto corto, 2: texto largo
+    deadline = Column(DateTime, nullable=True) # end_time del quiz al recibir la entrega
+    payload = Column(Text, nullable=False) # QuizSubmissionInput en JSON
+    status = Column(String(16), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    result = Column(Text, nullable=True) # QuizSubmissionOutput en JSON cuando se califica
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now)
+    locked_at = Column(DateTime, nullable=True) # Cuándo la tomó un worker (para recuperar las de un worker caído)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        # Solo las pendientes, en el orden en que las toman los workers
+        Index("ix_submission_intakes_queued", "next_attempt_at", "id", postgresql_where=(status == "queued")),
+        # Cabeza de la cola de cada aula (GradingScheduler) y entregas que se están calificando por aula
+        Index("ix_submission_intakes_lane_queue", text(SUBMISSION_LANE_SQL), "priority", "deadline", "id",
+              postgresql_where=(status == "queued")),
+        Index("ix_submission_intakes_lane_processing", text(SUBMISSION_LANE_SQL), postgresql_where=(status == "processing")),
+    )
+
+
+# Cambios de esquema para bases creadas antes de que existieran estas columnas e índices
+# (create_all no altera tablas existentes). Deben ser idempotentes: se ejecutan en cada arranque.
+SCHEMA_UPGRADES = [
+    f"ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({QUESTION_SEARCH_VECTOR_SQL}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_questions_search_vector ON questions USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_questions_competences_id ON questions USING gin (competences_id)",
+    "CREATE INDEX IF NOT EXISTS ix_questions_quiz_id ON questions (quiz_id)",
+    "ALTER TABLE question_students ADD COLUMN IF NOT EXISTS grading_source VARCHAR(16)",
+    "ALTER TABLE submission_intakes ADD COLUMN IF NOT EXISTS classroom_id INTEGER",
+    "ALTER TABLE submission_intakes ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT 2",
+    "ALTER TABLE submission_intakes ADD COLUMN IF NOT EXISTS deadline TIMESTAMP WITHOUT TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_submission_intakes_classroom_id ON submission_intakes (classroom_id)",
+    f"CREATE INDEX IF NOT EXISTS ix_submission_intakes_lane_queue ON submission_intakes (({SUBMISSION_LANE_SQL}), priority, deadline, id) WHERE status = 'queued'",
+    f"CREATE INDEX IF NOT EXISTS ix_submission_intakes_lane_processing ON submission_intakes (({SUBMISSION_LANE_SQL})) WHERE status = 'processing'",
+    "CREATE INDEX IF NOT EXISTS ix_quiz_students_leaderboard ON quiz_students (id_quiz, points_obtained DESC NULLS LAST, id_student)",
+    # Contadores de opciones para las entregas anteriores a la tabla (solo si está vacía)
+    """INSERT INTO option_answer_counts (quiz_id, id_question, option_select, count)
+    SELECT q.quiz_id, qs.id_question, smo.option_select, count(*)
+    FROM question_students qs
+    JOIN questions q ON q.id = qs.id_question
+    JOIN submitted_multiple_options smo ON smo.id = qs.id_answer_submitted
+    WHERE q.quiz_id IS NOT NULL AND smo.option_select IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM option_answer_counts)
+    GROUP BY q.quiz_id, qs.id_question, smo.option_select""",
+]
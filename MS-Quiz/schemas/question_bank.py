@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from schemas.quiz import AnswerBaseDetailOutput
+
+
+class QuestionBankItemOutput(BaseModel):
+    """Pregunta existente encontrada en el banco de preguntas."""
+    id: int = Field(..., description="ID de la pregunta.")
+    quiz_id: int = Field(..., description="ID del quiz al que pertenece.")
+    classroom_id: int = Field(..., description="ID del aula del quiz.")
+    statement: str = Field(..., description="Enunciado de la pregunta.")
+    answer_correct: Optional[str] = Field(None, description="Respuesta correcta.")
+    points: int = Field(..., description="Puntos de la pregunta en su quiz original.")
+    answer_base: AnswerBaseDetailOutput = Field(..., description="Formato de respuesta y opciones.")
+    competences_id: List[int] = Field([], description="IDs de competencias asociadas.")
+    rank: Optional[float] = Field(None, description="Relevancia respecto a la búsqueda (solo si se envió 'q').")
+
+
+class QuestionBankPageOutput(BaseModel):
+    """Página de resultados del banco de preguntas con paginación por cursor."""
+    items: List[QuestionBankItemOutput] = Field(..., description="Preguntas de la página, de mayor a menor relevancia.")
+    next_cursor: Optional[str] = Field(None, description="Cursor para pedir la página siguiente; null si no hay más.")
+
+
+class QuestionSimilarItemOutput(QuestionBankItemOutput):
+    """Pregunta existente casi idéntica al enunciado consultado."""
+    similarity: float = Field(..., description="Similitud de Jaccard estimada (0 a 1) entre los enunciados.")
+
+
+class QuestionSimilarOutput(BaseModel):
+    """Preguntas casi idénticas a un enunciado."""
+    items: List[QuestionSimilarItemOutput] = Field(..., description="Preguntas de mayor a menor similitud.")
+    index_ready: bool = Field(..., description="False mientras el índice aún se carga al arrancar: los resultados pueden estar incompletos.")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 
 # Esquemas de QuestionOption
@@ -213,6 +213,14 @@ class QuizGenerationOutput(BaseModel):
     end_time: str = Field(..., description="Fecha y hora de fin del quiz en formato ISO 8601 con zona horaria Z (UTC).")
     questions: List[QuestionOutput] = Field(..., description="Lista de preguntas generadas para el quiz.")
 
+class QuizVariantOutput(BaseModel):
+    variant: int = Field(..., description="Número de la variante (desde 1).")
+    questions: List[QuestionOutput] = Field(..., description="Preguntas de la variante, con los mismos puntos y competencias por posición que las demás.")
+
+class QuizVariantsGenerationOutput(QuizGenerationOutput):
+    variants: List[QuizVariantOutput] = Field(default_factory=list, description="Variantes generadas cuando 'variants' > 1; 'questions' es la variante 1.")
+    reused_question_ids: List[int] = Field(default_factory=list, description="IDs de las preguntas tomadas del banco cuando 'bank_first' está activo.")
+
 # -----------------------------
 class CompetenceInput(BaseModel):
     id: int = Field(..., description="ID único de la competencia.")
@@ -373,4 +381,175 @@ class StudentQuizResultOutput(BaseModel):
     points_obtained: int = Field(..., description="Puntos obtenidos por el estudiante en el quiz.")
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class QuizGradingStatsOutput(BaseModel):
+    """
+    Cómo se calificaron las respuestas de un quiz: localmente (pre-calificación),
+    con el LLM o con el fallback cuando el LLM falló.
+    """
+    quiz_id: int = Field(..., description="ID del quiz.")
+    answers: int = Field(..., description="Respuestas calificadas del quiz.")
+    local_answers: int = Field(..., description="Respuestas calificadas localmente.")
+    llm_answers: int = Field(..., description="Respuestas calificadas por el LLM.")
+    fallback_answers: int = Field(..., description="Respuestas calificadas con el fallback.")
+    unknown_answers: int = Field(..., description="Respuestas calificadas antes de registrar el origen.")
+    local_rate: float = Field(..., description="Proporción de respuestas calificadas localmente (sobre las de origen conocido).")
+    high_threshold: float = Field(..., description="Umbral de puntaje léxico para calificar como correcta.")
+    low_threshold: float = Field(..., description="Umbral de puntaje léxico para calificar como incorrecta.")
+    max_local_rate: float = Field(..., description="Proporción máxima de respuestas de texto calificadas localmente por entrega.")
+
+
+class QuestionAnswerKeyUpdateInput(BaseModel):
+    """
+    Corrección de la respuesta correcta o de los puntos de una pregunta ya
+    respondida; las respuestas guardadas se recalifican en segundo plano.
+    """
+    answer_correct: Optional[str] = Field(None, description="Nueva respuesta correcta.")
+    points: Optional[int] = Field(None, ge=1, description="Nuevo puntaje de la pregunta.")
+
+
+class RegradeInput(BaseModel):
+    question_ids: Optional[List[int]] = Field(None, description="Preguntas del quiz a recalificar (todas si no se envía).")
+
+
+class RegradeJobOutput(BaseModel):
+    """Estado y progreso de una recalificación en lote."""
+    job_id: str = Field(..., description="ID del trabajo de recalificación.")
+    quiz_id: int = Field(..., description="ID del quiz.")
+    question_ids: List[int] = Field(..., description="Preguntas que se recalifican.")
+    status: str = Field(..., description="queued, running, completed o failed.")
+    phase: Optional[str] = Field(None, description="Fase actual mientras el trabajo corre.")
+    total_rows: int = Field(..., description="Respuestas guardadas de esas preguntas.")
+    processed_rows: int = Field(..., description="Respuestas ya procesadas.")
+    rows_by_method: Dict[str, int] = Field(..., description="Respuestas por método: sql, rescale, local, llm o failed (el LLM no las calificó y quedaron igual).")
+    elapsed_s: Optional[float] = Field(None, description="Segundos desde que empezó el trabajo.")
+    rows_per_second: Optional[float] = Field(None, description="Respuestas procesadas por segundo.")
+    error: Optional[str] = Field(None, description="Error si el trabajo falló.")
+
+
+class QuestionAnswerKeyUpdateOutput(BaseModel):
+    question_id: int = Field(..., description="ID de la pregunta.")
+    answer_correct: str = Field(..., description="Respuesta correcta vigente.")
+    points: int = Field(..., description="Puntaje vigente.")
+    quiz_total_points: int = Field(..., description="Puntaje total del quiz tras el cambio.")
+    regrade_job: Optional[RegradeJobOutput] = Field(None, description="Recalificación iniciada (None si no cambió nada).")
+
+
+class QuizImportErrorOutput(BaseModel):
+    line: int = Field(..., description="Línea del archivo (en CSV, la fila de la pregunta; en NDJSON, la del quiz).")
+    key: Optional[str] = Field(None, description="Clave del quiz en el archivo ('key' en NDJSON, 'quiz_key' en CSV).")
+    error: str = Field(..., description="Descripción del error.")
+
+
+class QuizImportItemOutput(BaseModel):
+    key: Optional[str] = Field(None, description="Clave del quiz en el archivo.")
+    line: int = Field(..., description="Primera línea del quiz en el archivo.")
+    quiz_id: int = Field(..., description="ID del quiz creado.")
+
+
+class QuizImportOutput(BaseModel):
+    """Resultado de una importación masiva de quizzes."""
+    rows_read: int = Field(..., description="Preguntas leídas del archivo.")
+    quizzes_imported: int = Field(..., description="Quizzes creados.")
+    questions_imported: int = Field(..., description="Preguntas creadas.")
+    quizzes_rejected: int = Field(..., description="Quizzes no creados por errores de validación o de carga.")
+    quizzes: List[QuizImportItemOutput] = Field(default_factory=list, description="Quizzes creados con su clave y línea en el archivo.")
+    errors: List[QuizImportErrorOutput] = Field(default_factory=list, description="Errores por línea (hasta IMPORT_MAX_ERRORS).")
+    errors_truncated: bool = Field(False, description="True si hubo más errores de los reportados.")
+    elapsed_s: Optional[float] = Field(None, description="Duración de la importación en segundos.")
+    rows_per_second: Optional[float] = Field(None, description="Preguntas procesadas por segundo.")
+
+
+class SubmissionAcceptedOutput(BaseModel):
+    """Entrega guardada en el journal; se califica en segundo plano."""
+    submission_id: int = Field(..., description="ID de la entrega para consultar su estado.")
+    status: str = Field(..., description="Estado inicial ('queued').")
+    status_url: str = Field(..., description="Ruta para consultar el estado de la entrega.")
+
+
+class SubmissionStatusOutput(BaseModel):
+    submission_id: int = Field(..., description="ID de la entrega.")
+    quiz_id: int = Field(..., description="ID del quiz.")
+    student_id: int = Field(..., description="ID del estudiante.")
+    status: str = Field(..., description="queued, processing, graded o failed.")
+    classroom_id: Optional[int] = Field(None, description="Aula del quiz (la cola se reparte por aula).")
+    priority: int = Field(..., description="0: solo opción múltiple, 1: texto corto, 2: texto largo.")
+    attempts: int = Field(..., description="Intentos de calificación realizados.")
+    last_error: Optional[str] = Field(None, description="Error del último intento fallido.")
+    next_attempt_at: Optional[datetime] = Field(None, description="Cuándo se reintentará si está en cola.")
+    result: Optional[QuizSubmissionOutput] = Field(None, description="Resultado de la calificación cuando el estado es 'graded'.")
+    created_at: Optional[datetime] = Field(None, description="Cuándo se recibió la entrega.")
+    updated_at: Optional[datetime] = Field(None, description="Último cambio de estado.")
+
+
+class OptionCountOutput(BaseModel):
+    option: str = Field(..., description="Texto de la opción.")
+    count: int = Field(..., description="Estudiantes que la eligieron.")
+    percentage: float = Field(..., description="Porcentaje sobre las respuestas de la pregunta.")
+
+
+class QuestionAnswerDistributionOutput(BaseModel):
+    question_id: int = Field(..., description="ID de la pregunta de opción múltiple.")
+    total_answers: int = Field(..., description="Estudiantes que respondieron la pregunta.")
+    options: List[OptionCountOutput] = Field([], description="Opciones en el orden definido, incluidas las no elegidas.")
+
+
+class QuizAnswerDistributionOutput(BaseModel):
+    quiz_id: int = Field(..., description="ID del quiz.")
+    questions: List[QuestionAnswerDistributionOutput] = Field([], description="Distribución de cada pregunta de opción múltiple.")
+
+
+class OptionItemAnalysisOutput(BaseModel):
+    option: str = Field(..., description="Texto de la opción.")
+    is_correct: bool = Field(..., description="Si es la respuesta correcta.")
+    count: int = Field(..., description="Estudiantes que la eligieron.")
+    proportion: float = Field(..., description="Proporción de elección sobre quienes respondieron.")
+    discrimination: Optional[float] = Field(None, description="Proporción en el grupo superior menos en el inferior (negativa en un buen distractor).")
+
+
+class QuestionItemAnalysisOutput(BaseModel):
+    question_id: int = Field(..., description="ID de la pregunta.")
+    quiz_id: int = Field(..., description="ID del quiz de la pregunta.")
+    students: int = Field(..., description="Estudiantes que la respondieron.")
+    max_points: int = Field(..., description="Puntaje máximo de la pregunta.")
+    mean_points: Optional[float] = Field(None, description="Puntaje medio obtenido.")
+    difficulty: Optional[float] = Field(None, description="Índice de dificultad (p-value): proporción media del puntaje, 1 = fácil.")
+    discrimination: Optional[float] = Field(None, description="Correlación punto-biserial corregida con el resto del quiz.")
+    distractor_efficiency: Optional[float] = Field(None, description="Fracción de distractores funcionales (solo opción múltiple).")
+    options: Optional[List[OptionItemAnalysisOutput]] = Field(None, description="Análisis por opción (solo opción múltiple).")
+
+
+class QuizReliabilityOutput(BaseModel):
+    quiz_id: int = Field(..., description="ID del quiz.")
+    students: int = Field(..., description="Estudiantes con al menos una respuesta.")
+    questions: int = Field(..., description="Preguntas del quiz.")
+    complete_students: int = Field(..., description="Estudiantes que respondieron todas las preguntas (base del alfa).")
+    mean_score: Optional[float] = Field(None, description="Puntaje total medio.")
+    std_score: Optional[float] = Field(None, description="Desviación estándar del puntaje total.")
+    cronbach_alpha: Optional[float] = Field(None, description="Alfa de Cronbach del quiz.")
+
+
+class ItemAnalysisOutput(BaseModel):
+    scope: str = Field(..., description="'quiz' o 'classroom'.")
+    scope_id: int = Field(..., description="ID del quiz o del aula.")
+    students: int = Field(..., description="Estudiantes con respuestas en el alcance.")
+    questions: List[QuestionItemAnalysisOutput] = Field([], description="Análisis de cada pregunta.")
+    quizzes: List[QuizReliabilityOutput] = Field([], description="Confiabilidad y resumen de cada quiz.")
+    elapsed_ms: float = Field(..., description="Duración del cálculo (cuando no salió de la caché).")
+
+
+class LeaderboardEntryOutput(BaseModel):
+    student_id: int = Field(..., description="ID del estudiante.")
+    points_obtained: Optional[int] = Field(None, description="Puntos obtenidos en el quiz.")
+    rank: int = Field(..., description="Posición con RANK(): los empates comparten posición y dejan huecos (1, 1, 3).")
+    dense_rank: int = Field(..., description="Posición con DENSE_RANK(): los empates comparten posición sin huecos (1, 1, 2).")
+    percentile: float = Field(..., description="Porcentaje del resto de estudiantes con menos puntos.")
+
+
+class LeaderboardOutput(BaseModel):
+    quiz_id: int = Field(..., description="ID del quiz.")
+    total_students: int = Field(..., description="Estudiantes con entrega en el quiz.")
+    student: Optional[LeaderboardEntryOutput] = Field(None, description="Posición del estudiante consultado (solo alrededor de un estudiante).")
+    entries: List[LeaderboardEntryOutput] = Field([], description="Filas del ranking en orden de puntaje.")
@@ -0,0 +1,99 @@
+"""
+Compara la generación de quizzes desde PDF en modo "raw" (PDF completo a Gemini)
+contra el modo "text" (texto extraído localmente en el pool de procesos).
+
+Reporta bytes enviados, tokens de entrada y latencia de punta a punta.
+
+Uso (desde la carpeta MS-Quiz):
+    python scripts/benchmark_pdf_modes.py ruta/al/documento.pdf --runs 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+from core.ai.llm_provider import get_llm_provider
+from core.pdf.pdf_extractor import PDFExtractor, shutdown_process_pool
+from core.quiz.quiz_generator import QuizGenerator, PDF_MODES
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("benchmark_pdf_modes")
+settings = get_settings()
+
+DEFAULT_INPUT = {
+    "classroom_id": 1,
+    "num_question": 5,
+    "point_max": 20,
+    "competences": [
+        {"id": 1, "name": "Comprensión lectora", "description": "Entiende las ideas principales del texto"},
+        {"id": 2, "name": "Pensamiento crítico", "description": "Evalúa argumentos y evidencias"}
+    ],
+    "type_question": {"textuales": True, "inferenciales": True, "críticas": True}
+}
+
+
+def _upload_bytes(contents) -> int:
+    total = 0
+    for part in contents:
+        if isinstance(part, dict):
+            total += len(part["data"])
+        else:
+            total += len(part.encode("utf-8"))
+    return total
+
+
+async def run_benchmark(pdf_path: str, runs: int, input_data: dict):
+    with open(pdf_path, "rb") as f:
+        pdf_content = f.read()
+
+    provider = get_llm_provider()
+    params = QuizGenerator._validate_generation_input(input_data)
+    prompt = QuizGenerator._build_generation_prompt(params)
+
+    # Tiempo de extracción aislado (incluye el arranque del pool en la primera vuelta)
+    start = time.perf_counter()
+    pages = await PDFExtractor.extract_pages(pdf_content)
+    logger.info(f"Extracción: {len(pages)} páginas en {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    results = {}
+    for pdf_mode in PDF_MODES:
+        contents = await QuizGenerator.build_pdf_contents(prompt, pdf_content, pdf_mode)
+        token_count = await provider.count_tokens(contents)
+
+        latencies = []
+        for i in range(runs):
+            start = time.perf_counter()
+            await QuizGenerator.create_quiz_from_pdf(pdf_content, {**input_data, "pdf_mode": pdf_mode})
+            latencies.append(time.perf_counter() - start)
+            logger.info(f"[{pdf_mode}] corrida {i + 1}/{runs}: {latencies[-1]:.2f} s")
+
+        results[pdf_mode] = {
+            "upload_bytes": _upload_bytes(contents),
+            "input_tokens": token_count,
+            "latency_p50_s": round(statistics.median(latencies), 2),
+            "latency_max_s": round(max(latencies), 2),
+        }
+
+    print(json.dumps(results, indent=2))
+    shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de modos de generación desde PDF")
+    parser.add_argument("pdf_path", help="Ruta del PDF a utilizar")
+    parser.add_argument("--runs", type=int, default=3, help="Corridas por modo")
+    parser.add_argument("--input", help="JSON con los parámetros de generación (opcional)")
+    args = parser.parse_args()
+
+    input_data = json.loads(args.input) if args.input else DEFAULT_INPUT
+    asyncio.run(run_benchmark(args.pdf_path, args.runs, input_data))
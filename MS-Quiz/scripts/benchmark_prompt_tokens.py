@@ -0,0 +1,166 @@
+"""
+Compara los tokens de entrada de los prompts "legacy" y "compact" para
+generación y calificación.
+
+Uso (desde la carpeta MS-Quiz):
+    python scripts/benchmark_prompt_tokens.py
+    python scripts/benchmark_prompt_tokens.py --questions 15 --quality
+
+Por defecto solo cuenta tokens (count_tokens del proveedor configurado; con
+LLM_PROVIDER=stub es una aproximación de ~4 caracteres por token). Con
+--quality además llama al modelo con ambas codificaciones y reporta las
+preguntas inválidas de la generación y la diferencia media de porcentajes en la
+calificación. Con LLM_CASSETTE_MODE=record esas llamadas quedan grabadas como
+casos de regresión que luego se reproducen con replay.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+from core.ai.llm_provider import get_llm_provider, OPERATION_GENERATE_TEXT, OPERATION_GRADE
+from core.ai.prompt_builder import PromptBuilder, PROMPT_ENCODING_COMPACT, PROMPT_ENCODING_LEGACY
+from core.ai.response_schema import quiz_response_schema, grading_response_schema
+from core.quiz.quiz_generator import QuizGenerator
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("benchmark_prompt_tokens")
+settings = get_settings()
+
+SAMPLE_COMPETENCES = [
+    {"id": 1, "name": "Comprensión lectora", "description": "Entiende las ideas principales y secundarias del texto"},
+    {"id": 2, "name": "Pensamiento crítico", "description": "Evalúa argumentos, evidencias y puntos de vista"},
+    {"id": 3, "name": "Inferencia", "description": "Deduce información implícita a partir del contexto"},
+    {"id": 4, "name": "Vocabulario", "description": "Reconoce el significado de palabras según el contexto"},
+    # Repetidas a propósito: suele llegar así desde el orquestador
+    {"id": 2, "name": "Pensamiento crítico", "description": "Evalúa argumentos, evidencias y puntos de vista"},
+    {"id": 5, "name": "Inferencia", "description": "Deduce información implícita a partir del contexto"},
+]
+
+
+def sample_generation_params(num_question: int) -> dict:
+    current_time = datetime.now()
+    return {
+        "classroom_id": 1,
+        "num_question": num_question,
+        "point_max": 20,
+        "competences": SAMPLE_COMPETENCES,
+        "enabled_question_types": ["textuales", "inferenciales", "críticas"],
+        "text": "La fotosíntesis y el ciclo del carbono",
+        "current_time": current_time,
+        "end_time": current_time + timedelta(hours=1),
+        "operation": OPERATION_GENERATE_TEXT,
+    }
+
+
+def sample_grading_questions(num_question: int) -> list:
+    questions = []
+    for i in range(num_question):
+        multiple = i % 2 == 1
+        questions.append({
+            "question_id": 100 + i,
+            "statement": f"¿Cuál es el papel de la clorofila en la etapa {i + 1} de la fotosíntesis?",
+            "correct_answer": "Absorber la luz" if multiple else "La clorofila absorbe la energía luminosa que impulsa la fotosíntesis.",
+            "question_type": "multiple option" if multiple else "text",
+            "student_answer": "Absorber la luz" if multiple else "Capta la luz del sol para producir energía química.",
+            "max_points": 2,
+        })
+    return questions
+
+
+def build_prompts(encoding: str, num_question: int) -> dict:
+    settings.PROMPT_ENCODING = encoding
+    grading_questions = sample_grading_questions(num_question)
+    return {
+        "generation": (
+            PromptBuilder.generation_system_instruction(),
+            PromptBuilder.generation_prompt(sample_generation_params(num_question)),
+        ),
+        "grading": (
+            PromptBuilder.grading_system_instruction(),
+            PromptBuilder.grading_prompt(
+                "Quiz de fotosíntesis", "Responde con tus palabras.",
+                sum(q["max_points"] for q in grading_questions), grading_questions
+            ),
+        ),
+    }
+
+
+async def count(provider, system_instruction, prompt) -> dict:
+    prompt_tokens = await provider.count_tokens([prompt])
+    system_tokens = await provider.count_tokens([system_instruction]) if system_instruction else 0
+    return {
+        "chars": len(prompt) + len(system_instruction or ""),
+        "system_tokens": system_tokens,
+        "prompt_tokens": prompt_tokens,
+        "total_tokens": system_tokens + prompt_tokens,
+    }
+
+
+async def check_quality(provider, prompts: dict, num_question: int) -> dict:
+    params = sample_generation_params(num_question)
+    system_instruction, prompt = prompts["generation"]
+    response = await provider.generate(
+        [prompt], operation=OPERATION_GENERATE_TEXT, response_schema=quiz_response_schema(),
+        system_instruction=system_instruction, tags={"classroom_id": 1, "num_question": num_question},
+    )
+    generated = QuizGenerator._extract_and_fix_json(response.text).get("questions", [])
+    _, invalid = QuizGenerator._validate_questions(generated, params)
+
+    system_instruction, prompt = prompts["grading"]
+    question_ids = [q["question_id"] for q in sample_grading_questions(num_question)]
+    response = await provider.generate(
+        [prompt], operation=OPERATION_GRADE, temperature=0.5, response_schema=grading_response_schema(),
+        system_instruction=system_instruction, tags={"classroom_id": 1, "question_ids": question_ids},
+    )
+    evaluations = {e["question_id"]: e["percentage_correct"] for e in json.loads(response.text).get("evaluations", [])}
+    return {
+        "generated_questions": len(generated),
+        "invalid_questions": len(invalid),
+        "graded_questions": len(evaluations),
+        "grades": evaluations,
+    }
+
+
+async def run_benchmark(num_question: int, quality: bool):
+    provider = get_llm_provider()
+    results = {}
+    for encoding in (PROMPT_ENCODING_LEGACY, PROMPT_ENCODING_COMPACT):
+        prompts = build_prompts(encoding, num_question)
+        results[encoding] = {name: await count(provider, *parts) for name, parts in prompts.items()}
+        if quality:
+            results[encoding]["quality"] = await check_quality(provider, prompts, num_question)
+
+    for name in ("generation", "grading"):
+        legacy = results[PROMPT_ENCODING_LEGACY][name]["total_tokens"]
+        compact = results[PROMPT_ENCODING_COMPACT][name]
+        compact["reduction_total_pct"] = round(100 * (1 - compact["total_tokens"] / legacy), 1) if legacy else None
+        compact["reduction_variable_pct"] = round(100 * (1 - compact["prompt_tokens"] / legacy), 1) if legacy else None
+
+    if quality:
+        legacy_grades = results[PROMPT_ENCODING_LEGACY]["quality"].pop("grades")
+        compact_grades = results[PROMPT_ENCODING_COMPACT]["quality"].pop("grades")
+        common = set(legacy_grades) & set(compact_grades)
+        results["grading_mean_abs_diff_pct"] = (
+            round(sum(abs(legacy_grades[i] - compact_grades[i]) for i in common) / len(common), 2) if common else None
+        )
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokens por prompt: codificación legacy vs compact")
+    parser.add_argument("--questions", type=int, default=10, help="Preguntas a generar / calificar")
+    parser.add_argument("--quality", action="store_true", help="Llamar al modelo y comparar la calidad de ambas codificaciones")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.questions, args.quality))
@@ -0,0 +1,115 @@
+"""
+Benchmark reproducible de la generación de quizzes usando cassettes.
+
+1. Grabar (llama a Gemini una vez por petición distinta):
+    python scripts/benchmark_replay.py --record --text "Fotosíntesis"
+2. Reproducir con la latencia original (latencia y throughput de punta a punta):
+    python scripts/benchmark_replay.py --text "Fotosíntesis" --runs 20 --concurrency 4
+3. Reproducir sin esperar al modelo (solo el costo de nuestro parseo y post-proceso):
+    python scripts/benchmark_replay.py --text "Fotosíntesis" --runs 200 --fast
+
+Con --pdf se usa create_quiz_from_pdf en lugar de create_quiz_from_text.
+El servicio completo (incluida la calificación de process_student_submission)
+graba y reproduce igual con LLM_CASSETTE_MODE=record|replay|replay_fast.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+from core.ai.cassette import CassetteProvider, CASSETTE_MODE_RECORD, CASSETTE_MODE_REPLAY, CASSETTE_MODE_REPLAY_FAST
+from core.ai.llm_provider import GeminiProvider, StubProvider, LLM_PROVIDER_STUB, set_llm_provider
+from core.pdf.pdf_extractor import shutdown_process_pool
+from core.quiz.quiz_generator import QuizGenerator
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("benchmark_replay")
+settings = get_settings()
+
+DEFAULT_INPUT = {
+    "classroom_id": 1,
+    "num_question": 5,
+    "point_max": 20,
+    "competences": [
+        {"id": 1, "name": "Comprensión lectora", "description": "Entiende las ideas principales del texto"},
+        {"id": 2, "name": "Pensamiento crítico", "description": "Evalúa argumentos y evidencias"}
+    ],
+    "type_question": {"textuales": True, "inferenciales": True, "críticas": True}
+}
+
+
+async def run_benchmark(args, input_data: dict):
+    if args.record:
+        mode = CASSETTE_MODE_RECORD
+    else:
+        mode = CASSETTE_MODE_REPLAY_FAST if args.fast else CASSETTE_MODE_REPLAY
+    inner = StubProvider() if settings.LLM_PROVIDER == LLM_PROVIDER_STUB else GeminiProvider()
+    provider = CassetteProvider(inner, mode, args.cassette_dir)
+    set_llm_provider(provider)
+
+    pdf_content = None
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_content = f.read()
+
+    async def generate_once() -> float:
+        start = time.perf_counter()
+        if pdf_content is not None:
+            await QuizGenerator.create_quiz_from_pdf(pdf_content, input_data)
+        else:
+            await QuizGenerator.create_quiz_from_text(input_data)
+        return time.perf_counter() - start
+
+    runs = 1 if args.record else args.runs
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited() -> float:
+        async with semaphore:
+            return await generate_once()
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    latencies = await asyncio.gather(*(limited() for _ in range(runs)))
+    wall_s = time.perf_counter() - wall_start
+    cpu_s = time.process_time() - cpu_start
+
+    result = {
+        "mode": mode,
+        "runs": runs,
+        "concurrency": args.concurrency,
+        "latency_p50_s": round(statistics.median(latencies), 4),
+        "latency_max_s": round(max(latencies), 4),
+        "throughput_quizzes_per_s": round(runs / wall_s, 2),
+        "cpu_ms_per_quiz": round(cpu_s * 1000 / runs, 2),
+        "model_seconds": round(provider.stats["model_seconds"], 2),
+        "llm_calls_recorded": provider.stats["recorded"],
+        "llm_calls_replayed": provider.stats["replayed"],
+    }
+    print(json.dumps(result, indent=2))
+    shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de generación con cassettes de LLM")
+    parser.add_argument("--pdf", help="PDF a utilizar (si no se indica se genera desde texto)")
+    parser.add_argument("--text", default="Fotosíntesis", help="Tema para la generación desde texto")
+    parser.add_argument("--input", help="JSON con los parámetros de generación (opcional)")
+    parser.add_argument("--runs", type=int, default=10, help="Generaciones a reproducir")
+    parser.add_argument("--concurrency", type=int, default=1, help="Generaciones simultáneas")
+    parser.add_argument("--record", action="store_true", help="Grabar cassettes llamando al proveedor real")
+    parser.add_argument("--fast", action="store_true", help="Reproducir sin la latencia original")
+    parser.add_argument("--cassette-dir", default=settings.LLM_CASSETTE_DIR, help="Carpeta de cassettes")
+    args = parser.parse_args()
+
+    input_data = json.loads(args.input) if args.input else {**DEFAULT_INPUT, "text": args.text}
+    asyncio.run(run_benchmark(args, input_data))
@@ -0,0 +1,116 @@
+"""
+Importación masiva de quizzes desde la línea de comandos (mismo proceso que POST /quiz/import).
+
+Uso (desde la carpeta MS-Quiz):
+    python scripts/import_quizzes.py quizzes.ndjson
+    python scripts/import_quizzes.py preguntas.csv --format csv
+
+Benchmark con datos sintéticos (filas/s de COPY contra create_full_quiz, que hace
+un flush por pregunta, sobre los primeros --orm-quizzes quizzes):
+    python scripts/import_quizzes.py --synthetic 2000 --questions 10 --orm-quizzes 50
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+from core.quiz.bulk_import import QuizImporter, IMPORT_FORMATS, IMPORT_FORMAT_CSV, IMPORT_FORMAT_NDJSON
+from core.quiz.quiz_service import QuizService
+from db.database import AsyncSessionLocal, init_db
+from schemas.quiz import QuizCreateInput
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("import_quizzes")
+settings = get_settings()
+
+
+def synthetic_quiz(index: int, questions: int, classroom_id: int) -> dict:
+    return {
+        "key": f"sintetico-{index}",
+        "classroom_id": classroom_id,
+        "title": f"Quiz sintético {index}",
+        "instruction": "Responde todas las preguntas.",
+        "questions": [
+            {
+                "statement": f"Pregunta {position + 1} del quiz sintético {index}: ¿qué describe el concepto {index * questions + position}?",
+                "answer_correct": "B" if position % 2 else f"Respuesta de referencia {position}",
+                "points": 2,
+                "answer_base": {"type": "base_multiple_option", "options": ["A", "B", "C", "D"]} if position % 2 else {"type": "base_text"},
+                "competences_id": [1, 2],
+            }
+            for position in range(questions)
+        ],
+    }
+
+
+async def run_orm_baseline(quizzes: list) -> float:
+    """Filas/s creando los quizzes uno por uno con create_full_quiz"""
+    started = time.monotonic()
+    rows = 0
+    async with AsyncSessionLocal() as db:
+        for quiz in quizzes:
+            data = {key: value for key, value in quiz.items() if key != "key"}
+            quiz_data = QuizCreateInput(**data)
+            created = await QuizService.create_full_quiz(db, quiz_data)
+            await db.commit()
+            QuizService.index_created_quiz(created, quiz_data)
+            rows += len(data["questions"])
+    return rows / (time.monotonic() - started)
+
+
+async def main(args):
+    await init_db()
+    if args.synthetic:
+        quizzes = [synthetic_quiz(index, args.questions, args.classroom_id) for index in range(args.synthetic)]
+        stream = io.BytesIO("\n".join(json.dumps(quiz, ensure_ascii=False) for quiz in quizzes).encode("utf-8"))
+        import_format = IMPORT_FORMAT_NDJSON
+    else:
+        quizzes = []
+        stream = open(args.path, "rb")
+        import_format = args.format or (IMPORT_FORMAT_CSV if args.path.lower().endswith(".csv") else IMPORT_FORMAT_NDJSON)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            report = await QuizImporter.import_file(db, stream, import_format)
+    finally:
+        stream.close()
+
+    print(f"Filas leídas:          {report.rows_read}")
+    print(f"Quizzes importados:    {report.quizzes_imported} ({report.questions_imported} preguntas)")
+    print(f"Quizzes rechazados:    {report.quizzes_rejected}")
+    print(f"Tiempo:                {report.elapsed_s} s ({report.rows_per_second} filas/s)")
+    for error in report.errors[:args.show_errors]:
+        print(f"  línea {error.line} [{error.key or '-'}]: {error.error}")
+    if report.errors_truncated or len(report.errors) > args.show_errors:
+        print("  ...")
+
+    if args.synthetic and args.orm_quizzes:
+        orm_rate = await run_orm_baseline(quizzes[:args.orm_quizzes])
+        print(f"create_full_quiz:      {orm_rate:.1f} filas/s ({args.orm_quizzes} quizzes)")
+        if report.rows_per_second:
+            print(f"Aceleración COPY:      {report.rows_per_second / orm_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importación masiva de quizzes (COPY + INSERT ... SELECT)")
+    parser.add_argument("path", nargs="?", help="Archivo NDJSON o CSV")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Formato del archivo (por defecto según la extensión)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Importa N quizzes sintéticos en lugar de un archivo")
+    parser.add_argument("--questions", type=int, default=10, help="Preguntas por quiz sintético")
+    parser.add_argument("--classroom-id", type=int, default=1, help="Aula de los quizzes sintéticos")
+    parser.add_argument("--orm-quizzes", type=int, default=0, help="Quizzes sintéticos a crear también con create_full_quiz para comparar")
+    parser.add_argument("--show-errors", type=int, default=20, help="Errores a mostrar")
+    args = parser.parse_args()
+    if not args.path and not args.synthetic:
+        parser.error("Indica un archivo o --synthetic N.")
+    asyncio.run(main(args))